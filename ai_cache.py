@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""Pluggable cache for AI answers.
+
+Replaces `st.cache_data` on ai_call so that a streamed answer can be written
+back once the stream has finished and so that answers survive restarts and
+are shared between replicas. Two backends share one interface
+(get / set / stats / clear):
+
+- SQLiteCache (default): on-disk, size-bounded LRU with TTL; with
+  multiprocess=True writes are serialised with an fcntl file lock. A hit
+  is read-only: its access time is queued in memory (only when the stored
+  one is older than TOUCH_INTERVAL) and written by the next set, which is
+  also where eviction runs.
+- MemoryCache: in-process LRU with TTL.
+
+Configuration (env): BGGOVAI_CACHE=sqlite|memory, BGGOVAI_CACHE_PATH,
+BGGOVAI_CACHE_TTL (s), BGGOVAI_CACHE_MAX_ENTRIES, BGGOVAI_CACHE_MULTIPROCESS.
+A malformed number falls back to the default. RESPONSES is built from these
+on first use, not at import.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: rely on SQLite's own locking
+    fcntl = None
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "ai_responses.sqlite3")
+DEFAULT_TTL = 900.0
+DEFAULT_MAX_ENTRIES = 5000
+TOUCH_INTERVAL = 60.0       # s; LRU order is only this precise, hits in between queue nothing
+
+_WS = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    return _WS.sub(" ", (text or "").casefold()).strip()
+
+
+def cache_key(system: str, user: str, model: str) -> str:
+    # (system prompt hash, normalised context, model): near-identical questions share an entry.
+    system_hash = hashlib.sha256((system or "").encode("utf-8")).hexdigest()
+    h = hashlib.sha256()
+    for part in (system_hash, normalize(user), model):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class _Counters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+
+    def add(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def as_dict(self) -> Dict[str, int]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "sets": self.sets, "evictions": self.evictions,
+                "hit_rate": (self.hits / total) if total else 0.0}
+
+
+class MemoryCache:
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.counters = _Counters()
+        self._data: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] < time.monotonic():
+                del self._data[key]
+                item = None
+            if item is not None:
+                self._data.move_to_end(key)
+        self.counters.add("misses" if item is None else "hits")
+        return None if item is None else item[1]
+
+    def set(self, key: str, value: str) -> None:
+        evicted = 0
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                evicted += 1
+        self.counters.add("sets")
+        if evicted:
+            self.counters.add("evictions", evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries = len(self._data)
+        return {"backend": "memory", "entries": entries, **self.counters.as_dict()}
+
+
+class SQLiteCache:
+    def __init__(self, path: str = DEFAULT_PATH, ttl: float = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, multiprocess: bool = True):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.multiprocess = multiprocess and fcntl is not None
+        self.counters = _Counters()
+        self._local = threading.local()
+        self._thread_lock = threading.Lock()
+        self._touched: Dict[str, float] = {}      # key -> access time not yet written
+        self._touch_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._write() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS entries ("
+                       "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+
+    def _db(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads.
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _write(self):
+        db = self._db()
+        with self._thread_lock:
+            lock_file = None
+            if self.multiprocess:
+                lock_file = open(self.path + ".lock", "a")
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                db.execute("BEGIN IMMEDIATE")
+                try:
+                    yield db
+                    db.execute("COMMIT")
+                except BaseException:
+                    db.execute("ROLLBACK")
+                    raise
+            finally:
+                if lock_file is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    lock_file.close()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        row = self._db().execute("SELECT value, expires, accessed FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < now:
+            self.counters.add("misses")
+            return None
+        if now - row[2] >= TOUCH_INTERVAL:
+            with self._touch_lock:
+                self._touched[key] = now
+        self.counters.add("hits")
+        return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._touch_lock:
+            touched, self._touched = self._touched, {}
+        with self._write() as db:
+            if touched:
+                db.executemany("UPDATE entries SET accessed = ? WHERE key = ?", [(t, k) for k, t in touched.items()])
+            db.execute("INSERT OR REPLACE INTO entries (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                       (key, value, now + self.ttl, now))
+            db.execute("DELETE FROM entries WHERE expires < ?", (now,))
+            over = db.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+            if over > 0:
+                db.execute("DELETE FROM entries WHERE key IN "
+                           "(SELECT key FROM entries ORDER BY accessed LIMIT ?)", (over,))
+        self.counters.add("sets")
+        if over > 0:
+            self.counters.add("evictions", over)
+
+    def clear(self) -> None:
+        with self._touch_lock:
+            self._touched.clear()
+        with self._write() as db:
+            db.execute("DELETE FROM entries")
+
+    def stats(self) -> Dict[str, float]:
+        entries = self._db().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {"backend": "sqlite", "entries": entries, **self.counters.as_dict()}
+
+
+def _setting(name: str, default, cast):
+    # A malformed value means the default rather than a cache (and app) that fails to start.
+    try:
+        return cast(os.getenv(name, "").strip() or default)
+    except ValueError:
+        return default
+
+
+def from_env():
+    backend = os.getenv("BGGOVAI_CACHE", "sqlite").strip().lower()
+    ttl = _setting("BGGOVAI_CACHE_TTL", DEFAULT_TTL, float)
+    max_entries = _setting("BGGOVAI_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES, int)
+    if backend == "sqlite":
+        try:
+            return SQLiteCache(
+                os.getenv("BGGOVAI_CACHE_PATH", DEFAULT_PATH),
+                ttl=ttl,
+                max_entries=max_entries,
+                multiprocess=os.getenv("BGGOVAI_CACHE_MULTIPROCESS", "1") not in ("0", "false", "no"),
+            )
+        except (OSError, sqlite3.Error):
+            pass  # read-only or unavailable disk: stay in memory
+    return MemoryCache(ttl=ttl, max_entries=max_entries)
+
+
+class LazyCache:
+    """The process-wide cache, built by `factory` on first use: importing this module creates no files."""
+
+    def __init__(self, factory=from_env):
+        self._factory = factory
+        self._cache = None
+        self._lock = threading.Lock()
+
+    def backend(self):
+        if self._cache is None:
+            with self._lock:
+                if self._cache is None:
+                    self._cache = self._factory()
+        return self._cache
+
+    def __getattr__(self, name: str):
+        return getattr(self.backend(), name)
+
+
+RESPONSES = LazyCache()
@@ -1,17 +1,21 @@
 # -*- coding: utf-8 -*-
 import os
-from dataclasses import dataclass
-from datetime import datetime
-from typing import List, Tuple, Optional
+from typing import Optional
 
+import numpy as np
 import streamlit as st
-import pandas as pd
 
-# OpenAI SDK v1+
-try:
-    from openai import OpenAI
-except Exception:
-    OpenAI = None
+import core
+import metrics
+import warmup
+from core import (
+    DEFAULT_MODEL, PROJECTION_YEARS, SYSTEM_PROMPT,
+    bn, budget_model, budget_tree, classify_intent, compensation, detect_policy, legal_passages, passage_text, pct,
+    scenario, sources_for, tree_rollup, vat_band, vat_sensitivity,
+)
+from data_loader import LOADER
+from ai_cache import RESPONSES
+from singleflight import FLIGHTS
 
 st.set_page_config(
     page_title="BGGOVAI интелигентен съветник",
@@ -22,73 +26,8 @@ st.set_page_config(
 
 APP_TITLE = "BGGOVAI интелигентен съветник"
 APP_SUBTITLE = "Демо прототип • за всеки гражданин и организация • прозрачни цели и източници"
-DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
-
-OFFICIAL_SOURCES = [
-    ("Министерство на финансите", "https://www.minfin.bg/"),
-    ("Българска народна банка", "https://www.bnb.bg/"),
-    ("Национален статистически институт", "https://www.nsi.bg/"),
-    ("НАП", "https://nra.bg/"),
-    ("НОИ", "https://www.nssi.bg/"),
-    ("Агенция по вписванията / Търговски регистър", "https://portal.registryagency.bg/"),
-    ("Електронно управление", "https://egov.bg/"),
-    ("Народно събрание", "https://www.parliament.bg/"),
-    ("Държавен вестник", "https://dv.parliament.bg/"),
-    ("Министерство на правосъдието", "https://www.justice.government.bg/"),
-]
-
-# ---- DEMO macro indicators (EUR based) ----
-@dataclass
-class DemoMacro:
-    inflation: float
-    growth: float
-    unemployment: float
-    consumption: float
-    real_income: float
-    aic_bg: float
-    aic_eu: float
-
-DEMO_MACRO = DemoMacro(
-    inflation=0.038,
-    growth=0.027,
-    unemployment=0.046,
-    consumption=0.021,
-    real_income=0.032,
-    aic_bg=72.0,
-    aic_eu=100.0,
-)
-
-@dataclass
-class DemoBudget:
-    gdp: float
-    debt: float
-    revenues: List[Tuple[str, float]]
-    expenditures: List[Tuple[str, float]]
-
-DEMO_BUDGET = DemoBudget(
-    gdp=110.0,   # млрд. €
-    debt=35.0,   # млрд. €
-    revenues=[
-        ("ДДС", 11.5),
-        ("Акцизи", 3.2),
-        ("Подоходни данъци", 4.8),
-        ("Корпоративни данъци", 3.0),
-        ("Осигуровки", 9.2),
-        ("Еврофондове и други", 4.5),
-    ],
-    expenditures=[
-        ("Пенсии", 10.8),
-        ("Здравеопазване", 5.5),
-        ("Образование", 4.6),
-        ("Отбрана", 3.8),
-        ("Инфраструктура", 4.2),
-        ("Социални разходи", 2.2),
-        ("Администрация", 2.0),
-        ("Лихви", 1.1),
-    ],
-)
 
-st.markdown("""
+PAGE_CSS = """
 <style>
 body { background: #f6f8fb; }
 .header {
@@ -114,127 +53,132 @@ body { background: #f6f8fb; }
   font-size:12px;
 }
 </style>
-""", unsafe_allow_html=True)
+"""
 
-st.markdown(f"""
+@st.cache_resource(show_spinner=False)
+def page_chrome() -> str:
+    # Built once per process; each rerun only re-sends the finished markup.
+    return PAGE_CSS + f"""
 <div class="header">
 <h2>{APP_TITLE}</h2>
 <p>{APP_SUBTITLE}</p>
 </div>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(page_chrome(), unsafe_allow_html=True)
 # ----------------------------
 # Helpers
 # ----------------------------
-def pct(x: float, d: int = 2) -> str:
-    return f"{x*100:.{d}f}%"
-
-def bn(x: float, d: int = 2) -> str:
-    return f"{x:.{d}f} млрд. €"
-
-def light(val: float, green: float, yellow: float) -> str:
-    if val <= green:
-        return "🟩"
-    if val <= yellow:
-        return "🟨"
-    return "🟥"
-
-def overall_status(lights: list[str]) -> str:
-    if "🟥" in lights:
-        return "🟥 Под риск"
-    if "🟨" in lights:
-        return "🟨 На ръба"
-    return "🟩 Устойчиво"
-
-def classify_intent(q: str) -> str:
-    t = (q or "").lower()
-    if any(k in t for k in ["бюдж", "дефиц", "дълг", "ддс", "пенс", "разход", "приход", "бвп", "инфлац", "безработ", "aic", "потреблен", "реалн доход", "растеж"]):
-        return "FISCAL"
-    if any(k in t for k in ["мол", "управител", "еоод", "оод", "а4", "търговски регист", "агенция по вписвания"]):
-        return "ADMIN"
-    if any(k in t for k in ["закон", "чл", "ал.", "параграф", "гражданств", "натурализ", "държавен вестник", "проектозакон"]):
-        return "LEGAL"
-    return "GENERAL"
-
-def detect_policy(q: str) -> str:
-    t = (q or "").lower()
-    if "ддс" in t and any(k in t for k in ["ресторан", "9", "9%"]):
-        return "VAT_REST_9"
-    if "пенс" in t and any(k in t for k in ["10", "10%"]):
-        return "PENSIONS_10"
-    if any(k in t for k in ["инвест", "капекс", "инфраструкт", "образован", "здравеопаз"]):
-        return "INVEST"
-    return "BASE"
-
-def apply_policy(rev_df: pd.DataFrame, exp_df: pd.DataFrame, policy: str, intensity: float) -> tuple[pd.DataFrame, pd.DataFrame, str]:
-    r = rev_df.copy()
-    e = exp_df.copy()
-    notes = []
-    if policy == "VAT_REST_9":
-        # DEMO: -0.35 bn EUR VAT revenue at 100%
-        delta = -0.35 * intensity
-        r.loc[r["Категория"] == "ДДС", "Сума (млрд. €)"] += delta
-        notes.append(f"ДДС 9% за ресторанти: {delta:+.2f} млрд. € (DEMO, {intensity*100:.0f}%)")
-    elif policy == "PENSIONS_10":
-        mult = 1.0 + 0.10 * intensity
-        e.loc[e["Категория"] == "Пенсии", "Сума (млрд. €)"] *= mult
-        notes.append(f"Пенсии +10%: x{mult:.3f} (DEMO, {intensity*100:.0f}%)")
-    elif policy == "INVEST":
-        e.loc[e["Категория"] == "Инфраструктура", "Сума (млрд. €)"] += 0.60 * intensity
-        e.loc[e["Категория"].isin(["Образование", "Здравеопазване"]), "Сума (млрд. €)"] += 0.15 * intensity
-        notes.append(f"Инвестиции: +капекс/обр./здр. (DEMO, {intensity*100:.0f}%)")
-    return r, e, " • ".join(notes) if notes else "Няма разпозната фискална мярка (DEMO)."
-
-def compute_budget(rev_df: pd.DataFrame, exp_df: pd.DataFrame) -> tuple[float, float, float]:
-    rev = float(rev_df["Сума (млрд. €)"].sum())
-    exp = float(exp_df["Сума (млрд. €)"].sum())
-    deficit = exp - rev
-    return rev, exp, deficit
-
-def state_of_nation(def_pct: float, debt_pct: float) -> tuple[str, list[tuple[str, str, str]]]:
-    m = DEMO_MACRO
-    infl_l = light(m.inflation, 0.03, 0.05)
-    growth_l = "🟩" if m.growth >= 0.03 else ("🟨" if m.growth >= 0.015 else "🟥")
-    unemp_l = light(m.unemployment, 0.05, 0.07)
-    cons_l = "🟩" if m.consumption >= 0.02 else ("🟨" if m.consumption >= 0.008 else "🟥")
-    rincome_l = "🟩" if m.real_income >= 0.03 else ("🟨" if m.real_income >= 0.012 else "🟥")
-    aic_l = "🟩" if m.aic_bg >= 80 else ("🟨" if m.aic_bg >= 72 else "🟥")
-    def_l = light(abs(def_pct), 0.03, 0.045)
-    debt_l = light(debt_pct, 0.60, 0.70)
-
-    chips = [
-        ("Инфлация", infl_l, f"{m.inflation*100:.1f}%"),
-        ("Растеж", growth_l, f"{m.growth*100:.1f}%"),
-        ("Безработица", unemp_l, f"{m.unemployment*100:.1f}%"),
-        ("Потребление", cons_l, f"{m.consumption*100:.1f}%"),
-        ("Реални доходи", rincome_l, f"{m.real_income*100:.1f}%"),
-        ("AIC", aic_l, f"{m.aic_bg:.0f}/{m.aic_eu:.0f}"),
-        ("Дефицит", def_l, f"{def_pct*100:.2f}%"),
-        ("Дълг", debt_l, f"{debt_pct*100:.2f}%"),
-    ]
-    status = overall_status([x[1] for x in chips])
-    return status, chips
+@st.cache_resource(show_spinner=False)
+def detail_frames(policy: str, intensity: float, version: str, horizon: int):
+    # pandas is imported only when someone opens the details view.
+    import pandas as pd
+    sc = scenario(policy, intensity, version, horizon)
+    rev_df, exp_df = sc.frames()
+    paths = pd.DataFrame({"Дълг": sc.debt_path * 100, "Дефицит": sc.deficit_path * 100},
+                         index=np.arange(1, sc.horizon + 1))
+    return rev_df, exp_df, paths
+
+@st.cache_resource(show_spinner=False)
+def sweep_curves(version: str):
+    import pandas as pd
+    steps = np.linspace(0.0, 1.0, 101)
+    model = budget_model(version)
+    sweep = model.sweep(model.policies, steps)
+    return pd.DataFrame((sweep["deficit_pct"] * 100).T, columns=model.policies, index=steps * 100)
+
+def render_sensitivity(sens, intensity: float):
+    # altair/pandas load only here; the grid itself is cached in core and only missing cells are computed.
+    import altair as alt
+    import pandas as pd
+    from sensitivity import LABELS, PARAMS
+
+    st.markdown("#### Чувствителност на ефекта (data.json)")
+    c = st.columns(3)
+    x = c[0].selectbox("Ос X", PARAMS, index=PARAMS.index("passthrough"), format_func=LABELS.get)
+    ys = [p for p in PARAMS if p != x]
+    y = c[1].selectbox("Ос Y", ys, index=ys.index("elasticity") if "elasticity" in ys else 0, format_func=LABELS.get)
+    z = c[2].selectbox("Трети параметър", [p for p in PARAMS if p not in (x, y)], format_func=LABELS.get)
+    ranges = {}
+    for p, n in ((x, 200), (y, 200)):
+        lo, hi = sens.span(p)
+        ranges[p] = (*st.slider(f"Обхват: {LABELS[p]}", lo, hi, (lo, hi), (hi - lo) / 100, format="%.3f"), n)
+    ranges[z] = (None, None, 50)
+    grid = sens.grid(ranges)
+    zi = st.slider(LABELS[z], 0, len(grid.axes[2]) - 1, int(np.searchsorted(grid.axes[2], sens.base[z])),
+                   format="%d", help=f"{grid.axes[2][0]:.3f} … {grid.axes[2][-1]:.3f}")
+    st.caption(f"{grid.values.size:,} клетки ({LABELS[z]} = {grid.axes[2][zi]:.3f}); "
+               f"нови при тази заявка: {grid.computed:,}".replace(",", " "))
+    plane = grid.slice2d(zi)
+    sx, sy = max(1, len(grid.axes[0]) // 60), max(1, len(grid.axes[1]) // 60)
+    gx, gy = np.meshgrid(grid.axes[0][::sx], grid.axes[1][::sy], indexing="ij")
+    heat = pd.DataFrame({"x": gx.ravel(), "y": gy.ravel(), "v": plane[::sx, ::sy].ravel() * intensity})
+    st.altair_chart(alt.Chart(heat).mark_rect().encode(
+        x=alt.X("x:O", title=LABELS[x], axis=alt.Axis(format=".2f", labelOverlap=True)),
+        y=alt.Y("y:O", title=LABELS[y], sort="descending", axis=alt.Axis(format=".2f", labelOverlap=True)),
+        color=alt.Color("v:Q", title="млрд. €", scale=alt.Scale(scheme="redyellowgreen")),
+        tooltip=[alt.Tooltip("x:Q", format=".3f"), alt.Tooltip("y:Q", format=".3f"), alt.Tooltip("v:Q", format="+.4f")],
+    ), use_container_width=True)
+
+    rows = [(LABELS[p], lo * intensity, hi * intensity) for p, lo, hi in sens.tornado()]
+    bars = pd.DataFrame(rows, columns=["Параметър", "Песимистичен/нисък", "Оптимистичен/висок"])
+    st.markdown("#### Кой параметър влияе най-много (tornado, останалите на Base)")
+    st.altair_chart(alt.Chart(bars).mark_bar().encode(
+        y=alt.Y("Параметър:N", sort=None, title=None),
+        x=alt.X("Песимистичен/нисък:Q", title="Ефект (млрд. €)"),
+        x2="Оптимистичен/висок:Q",
+    ) + alt.Chart(pd.DataFrame({"base": [sens.base_impact() * intensity]})).mark_rule(color="black").encode(x="base:Q"),
+        use_container_width=True)
 
 def render_sources(hint: str):
     st.markdown("### Източници (официални)")
-    hint = (hint or "").lower()
-    items = OFFICIAL_SOURCES
-    if any(k in hint for k in ["закон", "чл", "ал", "гражданств", "държавен вестник", "проектозакон"]):
-        names = {"Народно събрание", "Държавен вестник", "Министерство на правосъдието"}
-        items = [x for x in OFFICIAL_SOURCES if x[0] in names]
-    elif any(k in hint for k in ["мол", "управител", "еоод", "оод", "търговски регист", "а4"]):
-        names = {"Агенция по вписванията / Търговски регистър", "Електронно управление", "Министерство на правосъдието"}
-        items = [x for x in OFFICIAL_SOURCES if x[0] in names]
-    elif any(k in hint for k in ["бюджет", "дефиц", "дълг", "инфлац", "безработ", "бвп", "aic"]):
-        names = {"Министерство на финансите", "Българска народна банка", "Национален статистически институт"}
-        items = [x for x in OFFICIAL_SOURCES if x[0] in names]
-    for name, url in items:
+    for name, url in sources_for(hint):
         st.markdown(f"- [{name}]({url})")
 
 # ----------------------------
-# Base frames (EUR)
+# Settings (st.secrets, then env)
 # ----------------------------
-rev_base = pd.DataFrame(DEMO_BUDGET.revenues, columns=["Категория", "Сума (млрд. €)"])
-exp_base = pd.DataFrame(DEMO_BUDGET.expenditures, columns=["Категория", "Сума (млрд. €)"])
+def setting(name: str, default: Optional[str] = None) -> Optional[str]:
+    val = None
+    try:
+        val = st.secrets.get(name, None)
+    except Exception:
+        val = None
+    if not val:
+        val = os.getenv(name, "").strip() or None
+    return val or default
+
+def ai_streaming_enabled() -> bool:
+    return hasattr(st, "write_stream") and setting("OPENAI_STREAM", "1").lower() not in ("0", "false", "no", "off")
+
+@st.cache_resource(show_spinner=False)
+def metrics_server(port: int):
+    # One /metrics endpoint per process, shared by all sessions.
+    return metrics.serve(port)
+
+def render_timings(request: dict):
+    rows = ["| Етап | ms | |", "|---|---:|---|"]
+    for s in request["stages"]:
+        extra = ", ".join(f"{k}={v}" for k, v in s.items() if k not in ("stage", "depth", "ms"))
+        rows.append(f"| {'&nbsp;&nbsp;' * 2 * s['depth']}{s['stage']} | {s['ms']:.2f} | {extra} |")
+    rows.append(f"| **общо** | **{request['total_ms']:.2f}** | |")
+    st.markdown("\n".join(rows))
+    summary = metrics.REGISTRY.summary()
+    seen = dict.fromkeys(s["stage"] for s in request["stages"])
+    st.caption(" • ".join(
+        f"{name}: p50 {summary[name]['p50'] * 1000:.2f} / p95 {summary[name]['p95'] * 1000:.2f} / "
+        f"p99 {summary[name]['p99'] * 1000:.2f} ms"
+        for name in seen if name in summary))
+
+@st.cache_resource(show_spinner=False)
+def cache_warmer() -> warmup.Warmer:
+    # One per process: warms the validated topics now and again on every new data version.
+    return warmup.start(setting)
+
+metrics_port = setting("BGGOVAI_METRICS_PORT")
+if metrics_port:
+    metrics_server(int(metrics_port))
+warmer = cache_warmer()
 
 # ----------------------------
 # Main interaction (chat)
@@ -243,41 +187,72 @@ check_sources = st.toggle("Провери източници", value=True)
 show_details = st.toggle("Покажи детайли", value=False)
 
 q = st.chat_input("Напиши въпрос…")
+if q:
+    st.session_state["q"] = q
+# chat_input only returns the text on the submitting run; keep it for slider reruns.
+q = st.session_state.get("q")
 if not q:
     st.stop()
 
+# Re-stats budget.json/data.json at most once a second; a new version changes every cache key below.
+ds = core.dataset()
+trace = metrics.begin("request", data=ds.version)
 intent = classify_intent(q)
+trace.attrs["intent"] = intent
+intensity, horizon = 1.0, core.DEFAULT_HORIZON     # what-if sliders (FISCAL only); the AI fallback reads them
 tab_result, tab_ai = st.tabs(["Резултат", "ИИ анализ"])
-with tab_result:
+with tab_result, metrics.stage("render_result"):
     if intent == "FISCAL":
         st.markdown("### What-if")
         intensity_pct = st.slider("Колко % от мярката влиза тази година (DEMO)", 0, 100, 100, 5)
         intensity = intensity_pct / 100.0
+        horizon = st.slider("Хоризонт на прогнозата (години)", 1, PROJECTION_YEARS, 10)
 
         policy = detect_policy(q)
-        rev_df, exp_df, note = apply_policy(rev_base, exp_base, policy, intensity)
-
-        total_rev, total_exp, deficit = compute_budget(rev_df, exp_df)
-        def_pct = deficit / DEMO_BUDGET.gdp
-        debt_pct = DEMO_BUDGET.debt / DEMO_BUDGET.gdp
-
-        status, chips = state_of_nation(def_pct, debt_pct)
+        trace.attrs["policy"] = policy
+        with metrics.stage("scenario"):
+            sc = scenario(policy, intensity, ds.version, horizon)
+        note = sc.note
+        def_pct, debt_pct = sc.def_pct, sc.debt_pct
+        status, chips = sc.status, sc.chips
 
         st.markdown("## Състояние на държавата")
         st.write(status)
 
         cols = st.columns(4)
-        cols[0].metric("БВП", bn(DEMO_BUDGET.gdp))
+        cols[0].metric("БВП", bn(ds.budget.gdp))
         cols[1].metric("Дефицит", pct(def_pct))
         cols[2].metric("Дълг", pct(debt_pct))
-        cols[3].metric("AIC", f"{DEMO_MACRO.aic_bg:.0f}/{DEMO_MACRO.aic_eu:.0f}")
+        cols[3].metric("AIC", f"{ds.macro.aic_bg:.0f}/{ds.macro.aic_eu:.0f}")
 
         for n, l, v in chips:
             st.markdown(f"<span class='badge'><b>{n}</b> {l} {v}</span>", unsafe_allow_html=True)
 
         st.info(note)
 
+        plan = compensation(policy, intensity, ds.version)
+        if plan.measures:
+            st.markdown(f"#### Компенсиращи мерки за {bn(plan.gap)} (без вдигане на ставки, DEMO)")
+            st.dataframe({"Категория": [c for _, c, _ in plan.measures],
+                          "Промяна (млрд. €)": [d for _, _, d in plan.measures]},
+                         use_container_width=True, hide_index=True)
+            if not plan.feasible:
+                st.warning(f"Лостовете стигат за {bn(plan.closed)}; остават {bn(plan.gap - plan.closed)} над 3%.")
+
+        band = vat_band(ds.version) if policy == "VAT_REST_9" else None
+        if band is not None:
+            band = band.scaled(intensity)
+            st.markdown("#### Несигурност на ефекта (Monte Carlo, data.json)")
+            bcols = st.columns(3)
+            bcols[0].metric("P5", bn(band.p5, 3))
+            bcols[1].metric("P50", bn(band.p50, 3))
+            bcols[2].metric("P95", bn(band.p95, 3))
+            st.caption(f"{band.n:,} сценария между Optimistic и Pessimistic пресетите".replace(",", " "))
+            if show_details:
+                render_sensitivity(vat_sensitivity(ds.version), intensity)
+
         if show_details:
+            rev_df, exp_df, paths = detail_frames(policy, intensity, ds.version, horizon)
             left, right = st.columns(2)
             with left:
                 st.subheader("Приходи")
@@ -286,6 +261,18 @@ with tab_result:
                 st.subheader("Разходи")
                 st.dataframe(exp_df, use_container_width=True, hide_index=True)
 
+            if budget_tree(ds.version).depth.max() > 1:
+                rollup = tree_rollup(policy, intensity, ds.version)
+                if rollup is not None:
+                    st.subheader("Разходи по министерства")
+                    st.bar_chart({core.AMOUNT_COL: rollup["exp"]})
+
+            st.subheader("Прогноза на дълга (% от БВП)")
+            st.line_chart(paths)
+
+            st.subheader("Дефицит според интензитета (% от БВП)")
+            st.line_chart(sweep_curves(ds.version))
+
         if check_sources:
             render_sources(q)
 
@@ -324,6 +311,13 @@ with tab_result:
 
 Провери винаги в Държавен вестник и Народното събрание.
 """)
+        found = legal_passages(q)
+        if found:
+            st.markdown("### Намерени текстове (локален индекс)")
+            for p in found:
+                with st.expander(f"{p.article} — {p.title}"):
+                    st.write(passage_text(p))
+                    st.caption(f"{p.source} • BM25 {p.score:.2f}")
         if check_sources:
             render_sources(q)
 
@@ -331,117 +325,50 @@ with tab_result:
         st.info("Нефискална тема – финансови сметки не се показват.")
         if check_sources:
             render_sources(q)
-# ----------------------------
-# OpenAI (v1+) helpers
-# ----------------------------
-def get_openai_client() -> Optional["OpenAI"]:
-    if OpenAI is None:
-        return None
-    key = None
-    try:
-        key = st.secrets.get("OPENAI_API_KEY", None)
-    except Exception:
-        key = None
-    if not key:
-        key = os.getenv("OPENAI_API_KEY", "").strip() or None
-    if not key:
-        return None
-    try:
-        return OpenAI(api_key=key)
-    except Exception:
-        return None
-
-@st.cache_data(ttl=900, show_spinner=False)
-def ai_call(system: str, user: str, model: str) -> str:
-    client = get_openai_client()
-    if client is None:
-        return "⚠️ AI модулът не е активен (липсва OPENAI_API_KEY или openai пакет)."
-    try:
-        resp = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user},
-            ],
-            temperature=0.2,
-        )
-        return (resp.choices[0].message.content or "").strip()
-    except Exception as e:
-        return f"❌ AI повикването не мина: {e}"
-
-SYSTEM_PROMPT = """
-Ти си BGGOVAI — интелигентен съветник за България (DEMO).
-
-Отговаряй на български, ясно и практично.
-
-Фискални цели:
-- дефицит ≤ 3% от БВП
-- държавен дълг ≤ 60% от БВП
-- максимално бързо догонване по AIC (ЕС=100)
-- без повишаване на данъчните ставки
-
-Ако дадена мярка влошава дефицита или дълга:
-предложи компенсиращи решения без да се вдигат ставки
-(ефективност, приоритизация, дигитализация, растеж).
-
-Право:
-- не измисляй членове и алинеи
-- ако няма точен текст, дай рамка и посочи Държавен вестник, НС, МП
-
-Администрация:
-- дай стъпки, документи, институции
-- ако не си сигурен за такси или срокове – кажи да се проверят
-
-Формат:
-1) Резюме
-2) Анализ
-3) Ефект върху хората и бизнеса
-4) Рискове
-5) Какво да се провери + източници
-"""
-
 # ----------------------------
 # AI tab
 # ----------------------------
-with tab_ai:
+with tab_ai, metrics.stage("render_ai"):
     st.markdown("### ИИ анализ")
 
-    model = None
-    try:
-        model = st.secrets.get("OPENAI_MODEL", None)
-    except Exception:
-        model = None
-    model = model or os.getenv("OPENAI_MODEL", DEFAULT_MODEL)
+    model = setting("OPENAI_MODEL", DEFAULT_MODEL)
 
-    context = f"Въпрос: {q}\n\n"
+    context = core.build_context(q, check_sources)
+    # Past OPENAI_DEADLINE (or on an upstream error): the computed numbers as a template answer, not cached.
+    fallback = lambda why: core.fallback_answer(q, intensity, horizon, check_sources, why)  # noqa: E731
 
-    if intent == "FISCAL":
-        rev_df, exp_df, note = apply_policy(rev_base, exp_base, detect_policy(q), 1.0)
-        total_rev, total_exp, deficit = compute_budget(rev_df, exp_df)
-        def_pct = deficit / DEMO_BUDGET.gdp
-        debt_pct = DEMO_BUDGET.debt / DEMO_BUDGET.gdp
-
-        context += (
-            f"DEMO макро и бюджет:\n"
-            f"- БВП: {DEMO_BUDGET.gdp:.1f} млрд. €\n"
-            f"- Дълг: {DEMO_BUDGET.debt:.1f} млрд. € ({debt_pct*100:.2f}%)\n"
-            f"- Приходи: {total_rev:.2f} млрд. €\n"
-            f"- Разходи: {total_exp:.2f} млрд. €\n"
-            f"- Дефицит: {deficit:.2f} млрд. € ({def_pct*100:.2f}%)\n"
-            f"- AIC: {DEMO_MACRO.aic_bg:.0f}/{DEMO_MACRO.aic_eu:.0f}\n"
-            f"- Инфлация: {DEMO_MACRO.inflation*100:.1f}% | Растеж: {DEMO_MACRO.growth*100:.1f}% | Безработица: {DEMO_MACRO.unemployment*100:.1f}%\n"
-            f"- Потребление: {DEMO_MACRO.consumption*100:.1f}% | Реални доходи: {DEMO_MACRO.real_income*100:.1f}%\n"
-            f"Бележка: {note}\n"
-        )
-
-    if check_sources:
-        context += "\nОфициални източници:\n" + "\n".join([f"- {n}: {u}" for n, u in OFFICIAL_SOURCES])
-
-    with st.spinner("BGGOVAI анализира…"):
-        result = ai_call(SYSTEM_PROMPT, context, model)
-
-    st.write(result)
+    if ai_streaming_enabled():
+        result = st.write_stream(core.ai_stream(SYSTEM_PROMPT, context, model, setting, fallback))
+    else:
+        with st.spinner("BGGOVAI анализира…"):
+            result = core.ai_call(SYSTEM_PROMPT, context, model, setting, fallback)
+        st.write(result)
 
     if show_details:
         st.markdown("#### Контекст към ИИ")
         st.code(context, language="text")
+        cs = RESPONSES.stats()
+        st.caption(f"Кеш ({cs['backend']}): {cs['entries']} записа • попадения {cs['hits']} • пропуски {cs['misses']} • изхвърлени {cs['evictions']}")
+        fs = FLIGHTS.stats()
+        st.caption(f"Обединени еднакви заявки: {fs['coalesced']} • водещи {fs['leaders']} • в момента {fs['in_flight']}")
+        up = metrics.REGISTRY.summary().get("ai_upstream")
+        if up:
+            reg = metrics.REGISTRY
+            fallbacks = reg.counter("ai_fallbacks_total", reason="deadline") + reg.counter("ai_fallbacks_total", reason="error")
+            hedge_rate = reg.counter("ai_hedges_total") / max(1, reg.counter("ai_first_attempts_total"))
+            st.caption(f"ИИ upstream: p95 {up['p95']:.2f} s / p99 {up['p99']:.2f} s • хеджирани {hedge_rate:.0%} "
+                       f"(печелят {reg.counter('ai_hedge_wins_total'):.0f}) • резервни отговори {fallbacks:.0f}")
+        ws = warmer.stats()
+        if ws["mode"] != "off" and ws.get("tasks"):
+            st.caption(f"Предварително загряване ({'тече' if ws['running'] else 'готово'}, данни {ws['version']}): "
+                       f"{ws['done']}/{ws['tasks']} задачи • ИИ отговори {ws['ai']} • неуспешни {ws['failed']} • "
+                       f"{ws['seconds']:.1f} s")
+
+request = metrics.finish(trace)
+if show_details:
+    with tab_result:
+        with st.expander("Време по етапи (тази заявка)"):
+            render_timings(request)
+        st.caption(f"Данни: {ds.label} • версия {ds.version} • " + " • ".join(os.path.basename(f) for f in ds.files))
+        if LOADER.last_error:
+            st.warning(f"Последното презареждане на данните е неуспешно (ползва се версия {ds.version}): {LOADER.last_error}")
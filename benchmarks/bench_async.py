@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""Async AI executor vs. sequential calls, against the local stub with injected latency.
+
+    python benchmarks/bench_async.py [--latency 0.2 --jitter 0.2 --concurrency 16]
+
+1) One answer as five sections: sequential sum vs. parallel (slowest section).
+2) The question corpus with AI: sequential blocking calls vs. concurrent fan-out.
+3) Token bucket: N immediate requests at rate R take ~(N - burst) / R seconds.
+Caches are fresh in-memory instances so every call reaches the stub.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import core  # noqa: E402
+import llm  # noqa: E402
+from ai_cache import MemoryCache  # noqa: E402
+from bench_router import load_corpus  # noqa: E402
+from llm_async import SECTIONS, AsyncLLM, TokenBucket, section_prompt  # noqa: E402
+from stub_llm import StubServer  # noqa: E402
+
+MODEL = "stub-model"
+
+
+async def sections_parallel(config, context: str) -> float:
+    async with AsyncLLM(config, concurrency=len(SECTIONS), rate=1000, burst=len(SECTIONS), cache=MemoryCache()) as ex:
+        t = time.perf_counter()
+        await ex.answer_sections(core.SYSTEM_PROMPT, context, MODEL)
+        return time.perf_counter() - t
+
+
+async def batch_concurrent(config, contexts, concurrency: int) -> float:
+    async with AsyncLLM(config, concurrency=concurrency, rate=1000, burst=concurrency, cache=MemoryCache()) as ex:
+        t = time.perf_counter()
+        out = [r async for r in ex.run_batch(contexts, lambda c: ex.complete(core.SYSTEM_PROMPT, c, MODEL))]
+        assert len(out) == len(contexts)
+        return time.perf_counter() - t
+
+
+async def bucket_time(n: int, rate: float, burst: int) -> float:
+    bucket = TokenBucket(rate, burst)
+    t = time.perf_counter()
+    await asyncio.gather(*(bucket.acquire() for _ in range(n)))
+    return time.perf_counter() - t
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--latency", type=float, default=0.2)
+    ap.add_argument("--jitter", type=float, default=0.2)
+    ap.add_argument("--concurrency", type=int, default=16)
+    args = ap.parse_args()
+
+    with StubServer(latency=args.latency, jitter=args.jitter) as srv:
+        config = llm.ClientConfig(api_key="stub", base_url=srv.base_url)
+        client = llm.get_client(config)
+        questions = load_corpus()
+        contexts = [core.build_context(q) for q in questions]
+        print(f"stub latency {args.latency:.2f}s + U(0, {args.jitter:.2f})s")
+
+        t = time.perf_counter()
+        for i in range(1, len(SECTIONS) + 1):
+            llm.complete(client, section_prompt(core.SYSTEM_PROMPT, i), contexts[0], MODEL)
+        seq = time.perf_counter() - t
+        par = asyncio.run(sections_parallel(config, contexts[0]))
+        print(f"5 sections: sequential {seq:.2f}s | parallel {par:.2f}s "
+              f"(bound: max section ≤ {args.latency + args.jitter:.2f}s)")
+
+        t = time.perf_counter()
+        for c in contexts:
+            llm.complete(client, core.SYSTEM_PROMPT, c, MODEL)
+        seq = time.perf_counter() - t
+        conc = asyncio.run(batch_concurrent(config, contexts, args.concurrency))
+        print(f"{len(contexts)} questions: sequential {seq:.2f}s | concurrency {args.concurrency}: {conc:.2f}s "
+              f"({seq / conc:.1f}x)")
+
+    print(f"token bucket 30 requests @ 20/s burst 10: {asyncio.run(bucket_time(30, 20.0, 10)):.2f}s (expected ~1.00s)")
+
+
+if __name__ == "__main__":
+    main()
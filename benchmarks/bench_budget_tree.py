@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""Hierarchical budget store on a synthetic program-level budget: build, edits, policies, roll-ups.
+
+    python benchmarks/bench_budget_tree.py [--ministries 20 --programs 25 --lines 50]
+
+The defaults give 2 sides x 20 ministries x 25 programs x 50 lines = 50,000
+lines. Every edit is timed against the naive alternative of re-summing all
+lines into every level after the change, and checked against it.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from budget_engine import EXP, REV, PolicyOp, PolicySpec  # noqa: E402
+from budget_tree import BudgetTree  # noqa: E402
+
+LIMIT_MS = 10.0
+
+
+def synthetic(ministries: int, programs: int, lines: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for side in (REV, EXP):
+        for m in range(ministries):
+            for p in range(programs):
+                # Program names repeat across ministries, like "Пенсии" or "Заплати" would.
+                amounts = rng.gamma(2.0, 0.5, lines) / 1000
+                rows += [((side, f"{side}-M{m:02d}", f"P{p:02d}", f"L{k:03d}"), float(a)) for k, a in enumerate(amounts)]
+    return rows
+
+
+def naive_totals(tree: BudgetTree) -> np.ndarray:
+    """What a flat model does after each change: re-sum every line into every ancestor."""
+    total = np.zeros(len(tree))
+    for line in np.nonzero(tree.leaf)[0]:
+        p = line
+        while p >= 0:
+            total[p] += tree.amount[line]
+            p = tree._parents[p]
+    return total
+
+
+def naive_rollup(tree: BudgetTree) -> np.ndarray:
+    """Vectorised full re-sum (the best a non-incremental model can do)."""
+    total = tree.amount.copy()
+    for d in range(int(tree.depth.max()), 0, -1):
+        idx = np.nonzero(tree.depth == d)[0]
+        np.add.at(total, tree.parent[idx], total[idx])
+    return total
+
+
+def timed(fn, n: int):
+    times = []
+    for _ in range(n):
+        t = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t) * 1000)
+    return statistics.median(times), max(times)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--ministries", type=int, default=20)
+    ap.add_argument("--programs", type=int, default=25)
+    ap.add_argument("--lines", type=int, default=50)
+    ap.add_argument("-n", type=int, default=200, help="repetitions per edit")
+    args = ap.parse_args()
+
+    rows = synthetic(args.ministries, args.programs, args.lines)
+    t = time.perf_counter()
+    tree = BudgetTree(rows)
+    print(f"build {tree.lines:,} lines / {len(tree):,} nodes     {(time.perf_counter() - t) * 1000:9.1f} ms")
+    base = tree.totals()
+    rng = np.random.default_rng(1)
+    leaves = np.nonzero(tree.leaf)[0]
+    ministry = tree.node((EXP, f"{EXP}-M03"))
+    program = tree.node((EXP, f"{EXP}-M03", "P07"))
+    # Touches "P05" in every ministry on both sides: 2 * ministries groups, 2 * ministries * lines lines.
+    policy = PolicySpec("SYNTH", (
+        PolicyOp(EXP, "P05", "mul", 0.10), PolicyOp(REV, "P05", "mul", -0.05), PolicyOp(EXP, "P11", "add", 0.4),
+    ), "synthetic")
+
+    journal: list = []
+    cases = [
+        ("set_line (random leaf)", lambda: tree.set_line(int(rng.choice(leaves)), float(rng.random()) / 1000, journal)),
+        ("scale program", lambda: tree.scale(program, 1.01, journal)),
+        ("scale ministry", lambda: tree.scale(ministry, 1.01, journal)),
+        ("add to program (pro rata)", lambda: tree.add(program, 0.01, journal)),
+        (f"apply policy ({len(policy.ops)} ops)", lambda: tree.apply(policy, 1.0, journal)),
+        ("apply + revert policy", lambda: (tree.apply(policy, 1.0, journal), tree.revert(journal))),
+    ]
+    naive_py, _ = timed(lambda: naive_totals(tree), 3)
+    naive_np, _ = timed(lambda: naive_rollup(tree), 20)
+    print(f"{'edit':<30} {'median ms':>10} {'max ms':>9}")
+    worst = 0.0
+    for name, fn in cases:
+        med, mx = timed(fn, args.n)
+        worst = max(worst, med)
+        assert np.allclose(tree.total, naive_rollup(tree)), name
+        tree.revert(journal)
+        print(f"{name:<30} {med:10.4f} {mx:9.3f}")
+    assert np.allclose(tree.totals(), base), (tree.totals(), base)
+    print(f"{'naive re-sum, per edit (py)':<30} {naive_py:10.2f}")
+    print(f"{'naive re-sum, per edit (numpy)':<30} {naive_np:10.4f}")
+    print(f"worst median edit {worst:.3f} ms (limit {LIMIT_MS} ms): {'OK' if worst < LIMIT_MS else 'TOO SLOW'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Prompt tokens per question: the old full context vs the token-budgeted one, and the shared prompt prefix.
+
+    python benchmarks/bench_context.py [--budgets 300,600,1000]
+
+Runs benchmarks/questions.jsonl through core.context_blocks. LEGAL questions
+get passages from a small synthetic legal index in a temporary directory
+(see bench_legal.py). "old" is the previous layout: question first, then
+every macro line and the whole source list. "shared prefix" is, for each
+prompt (system + user), the longest prefix it shares with any earlier prompt
+of the corpus. That is the part a provider-side prompt cache can serve.
+Note that OpenAI only caches prompts from 1024 tokens up.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ["BGGOVAI_CACHE"] = "memory"
+TMP = tempfile.mkdtemp(prefix="bggovai-context-")
+os.environ["BGGOVAI_LEGAL_INDEX"] = os.path.join(TMP, "index")
+
+import core  # noqa: E402
+import legal_index  # noqa: E402
+from bench_legal import write_corpus  # noqa: E402
+from bench_router import load_corpus  # noqa: E402
+from context_builder import count_tokens, pack, tokenizer  # noqa: E402
+
+
+def legacy(blocks) -> str:
+    """Old build_context layout: question, then every line of every block."""
+    out = []
+    for b in sorted(blocks, key=lambda b: (not b.required, b.order)):
+        lines = "".join(t + "\n" for t, _ in b.lines)
+        out.append((b.header + "\n" if b.header else "") + lines)
+    return "\n".join(out)
+
+
+def shared_prefix(prompts) -> list:
+    shared = [0]
+    for i in range(1, len(prompts)):
+        common = max(len(os.path.commonprefix([prompts[i], p])) for p in prompts[:i])
+        shared.append(count_tokens(prompts[i][:common]))
+    return shared
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--budgets", default="300,600,1000", help="comma-separated token budgets")
+    args = ap.parse_args()
+    budgets = [int(b) for b in args.budgets.split(",")]
+    try:
+        write_corpus(os.path.join(TMP, "dv"), issues=20, articles=40, words=60)
+        legal_index.INDEX.add([os.path.join(TMP, "dv")])
+
+        corpus = load_corpus()
+        system = count_tokens(core.SYSTEM_PROMPT)
+        rows = [(core.classify_intent(q), core.context_blocks(q)) for q in corpus]
+        old = [legacy(blocks) for _, blocks in rows]
+        print(f"{len(corpus)} questions, system prompt {system} tokens, tokens: {tokenizer()}\n")
+
+        header = f"{'intent':<9} {'n':>3} {'old':>7}" + "".join(f" {f'budget {b}':>11}" for b in budgets)
+        print("mean user-message tokens")
+        print(header)
+        by_intent = defaultdict(list)
+        packed = {b: [pack(blocks, b) for _, blocks in rows] for b in budgets}
+        for i, (intent, _) in enumerate(rows):
+            by_intent[intent].append(i)
+        for intent, idx in sorted(by_intent.items()) + [("all", list(range(len(rows))))]:
+            cells = [statistics.mean(count_tokens(old[i]) for i in idx)]
+            cells += [statistics.mean(packed[b][i].tokens for i in idx) for b in budgets]
+            print(f"{intent:<9} {len(idx):>3} {cells[0]:7.0f}" + "".join(f" {c:11.0f}" for c in cells[1:]))
+
+        total_old = sum(count_tokens(t) for t in old)
+        print("\nsavings vs old (user message | whole prompt incl. system)")
+        for b in budgets:
+            new = sum(p.tokens for p in packed[b])
+            dropped = sum(p.dropped for p in packed[b])
+            print(f"budget {b:>5}: {1 - new / total_old:6.1%} | "
+                  f"{1 - (new + system * len(rows)) / (total_old + system * len(rows)):6.1%}"
+                  f"   ({dropped} relevant lines left out)")
+
+        b = budgets[len(budgets) // 2]
+        for name, users in (("old", old), (f"budget {b}", [p.text for p in packed[b]])):
+            prompts = [core.SYSTEM_PROMPT + "\n" + u for u in users]
+            shared = shared_prefix(prompts)
+            total = sum(count_tokens(p) for p in prompts)
+            print(f"shared prefix, {name:<11}: mean {statistics.mean(shared):5.0f} tokens/prompt "
+                  f"= {sum(shared) / total:5.1%} of prompt tokens")
+    finally:
+        shutil.rmtree(TMP, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
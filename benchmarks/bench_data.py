@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Data layer: per-rerun cost of current(), reload cost, and large tables via the mmap column store.
+
+    python benchmarks/bench_data.py [--rows 2000000]
+
+Works on a temporary copy of budget.json/data.json plus a generated CSV
+extract, so the repo's files and .cache/ are not touched.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import data_loader  # noqa: E402
+
+
+def write_extract(path: str, rows: int) -> None:
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(0)
+    pd.DataFrame({
+        "year": rng.integers(2000, 2025, rows, dtype=np.int32),
+        "region": rng.choice([f"BG{i:03d}" for i in range(28)], rows),
+        "nace": rng.choice(list("ABCDEFGHIJKLMNOPQRS"), rows),
+        "amount": rng.random(rows) * 1e6,
+    }).to_csv(path, index=False)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=2_000_000)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bggovai-data-")
+    try:
+        for name in ("budget.json", "data.json"):
+            shutil.copy(os.path.join(ROOT, name), tmp)
+        path = os.path.join(tmp, "budget.json")
+
+        loader = data_loader.DataLoader(path, store_dir=os.path.join(tmp, "store"))
+        t = time.perf_counter()
+        loader.current()
+        print(f"first load (parse + validate)   {(time.perf_counter() - t) * 1000:8.2f} ms")
+        n = 200_000
+        print(f"current(), throttled           {timeit.timeit(loader.current, number=n) / n * 1e6:8.3f} µs")
+        loader.check_interval = 0
+        print(f"current(), stat every call     {timeit.timeit(loader.current, number=n // 10) / (n // 10) * 1e6:8.3f} µs")
+
+        csv = os.path.join(tmp, "extract.csv")
+        write_extract(csv, args.rows)
+        with open(path, encoding="utf-8") as f:
+            doc = json.load(f)
+        doc["tables"] = {"extract": {"path": "extract.csv",
+                                     "columns": {"year": "int32", "region": "str", "nace": "str", "amount": "float64"}}}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False)
+        t = time.perf_counter()
+        ds = loader.current()
+        print(f"reload with {os.path.getsize(csv) / 1e6:.0f} MB CSV (hash only) {(time.perf_counter() - t) * 1000:8.2f} ms")
+
+        import pandas as pd
+        t = time.perf_counter()
+        df = pd.read_csv(csv)
+        print(f"pandas.read_csv, full table     {(time.perf_counter() - t) * 1000:8.2f} ms")
+        del df
+
+        table = ds.tables["extract"]
+        t = time.perf_counter()
+        table.column("amount")
+        print(f"column store build (once/file)  {(time.perf_counter() - t) * 1000:8.2f} ms")
+        fresh = data_loader.Table("extract", csv, table.dtypes, table.digest, os.path.join(tmp, "store"))
+        t = time.perf_counter()
+        amount = fresh.column("amount")
+        year = fresh.column("year")
+        opened = time.perf_counter() - t
+        t = time.perf_counter()
+        total = float(amount[year == 2020].sum())
+        print(f"open 2 columns (mmap, warm)     {opened * 1000:8.2f} ms")
+        print(f"filter+sum over {len(fresh):,} rows   {(time.perf_counter() - t) * 1000:8.2f} ms  (sum {total:.3e})")
+        print(f"store on disk                   {sum(os.path.getsize(os.path.join(fresh.store, f)) for f in os.listdir(fresh.store)) / 1e6:8.1f} MB "
+              f"vs CSV {os.path.getsize(csv) / 1e6:.1f} MB")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
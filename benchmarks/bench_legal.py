@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""Legal BM25 index on a synthetic Държавен вестник corpus: ingest, cold open, query latency, incremental add.
+
+    python benchmarks/bench_legal.py [--issues 500 --articles 100]
+
+Issues are generated from a Zipf-distributed legal vocabulary (inflected
+forms, so the stemmer has work to do) and written as .txt files to a
+temporary directory together with the index. The repo's legal_index/ is not
+touched.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import legal_index  # noqa: E402
+
+STEMS = """
+закон закона законът законите гражданство гражданството гражданин граждани натурализация натурализацията
+данък данъка данъци данъчна данъчната ставка ставката ставки добавена стойност стойността ресторант ресторанти
+ресторантьорски услуга услуги услугите министър министъра министерство министерството съвет съвета
+държавен държавния вестник вестника обнародване обнародването изменение изменения изменението допълнение
+член чл алинея ал параграф точка срок срока срокове години месеца дни решение решението решения
+заявление заявлението заявления молба молбата молби документи документите удостоверение удостоверения
+право правото права задължение задължения отговорност отговорността наказание наказания глоба глоби
+имущество имуществото собственост собствеността договор договора договори дружество дружеството търговец
+регистър регистъра вписване вписването агенция агенцията орган органа органи общински общината общини
+бюджет бюджета бюджетът приходи разходи дефицит дълг дълга осигуровки осигуровките пенсия пенсии пенсиите
+здравеопазване образование отбрана инфраструктура администрация съд съда съдът съдилища прокуратура жалба жалби
+""".split()
+
+
+def write_corpus(dirname: str, issues: int, articles: int, words: int, seed: int = 0, start: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    ranks = np.arange(1, len(STEMS) + 1)
+    p = 1.0 / ranks ** 1.07
+    p /= p.sum()
+    os.makedirs(dirname, exist_ok=True)
+    for i in range(start, start + issues):
+        lines = [f"ДЪРЖАВЕН ВЕСТНИК, брой {i + 1}"]
+        for a in range(articles):
+            body = " ".join(rng.choice(STEMS, size=rng.integers(words // 2, words * 2), p=p))
+            lines.append(f"Чл. {a + 1}. {body}.")
+        with open(os.path.join(dirname, f"dv-{i + 1:05d}.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+
+
+QUERIES = [
+    "Как се придобива българско гражданство по натурализация?",
+    "ставка на данък добавена стойност за ресторантьорски услуги",
+    "срок за подаване на заявление в агенцията по вписванията",
+    "глоби и наказания по закона",
+    "решение на министерския съвет за бюджета",
+    "жалба срещу решението на органа пред съда",
+    "пенсиите и осигуровките",
+    "вписване на търговец в търговския регистър",
+]
+
+OPEN = "import time, sys; t = time.perf_counter(); import legal_index; ix = legal_index.LegalIndex(sys.argv[1]); " \
+       "ix.refresh(); ix.search('гражданство'); print((time.perf_counter() - t) * 1000)"
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--issues", type=int, default=500)
+    ap.add_argument("--articles", type=int, default=100)
+    ap.add_argument("--words", type=int, default=40, help="mean words per article (uniform 0.5x..2x)")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bggovai-legal-")
+    try:
+        corpus, path = os.path.join(tmp, "dv"), os.path.join(tmp, "index")
+        write_corpus(corpus, args.issues, args.articles, args.words)
+        index = legal_index.LegalIndex(path, check_interval=0)
+        t = time.perf_counter()
+        res = index.add([corpus])
+        took = time.perf_counter() - t
+        print(f"ingest {res['files']} issues / {res['docs']:,} passages   {took:8.2f} s ({res['docs'] / took:,.0f} passages/s)")
+        size = sum(os.path.getsize(os.path.join(r, f)) for r, _, fs in os.walk(path) for f in fs)
+        print(f"index on disk                             {size / 1e6:8.1f} MB")
+
+        cold = [float(subprocess.run([sys.executable, "-c", OPEN, path], cwd=ROOT, capture_output=True,
+                                     text=True, check=True).stdout) for _ in range(3)]
+        print(f"cold start (import + open + 1st query)    {statistics.median(cold):8.1f} ms")
+
+        index.check_interval = legal_index.CHECK_INTERVAL
+        for q in QUERIES:
+            index.search(q)
+        times = []
+        for _ in range(20):
+            for q in QUERIES:
+                t = time.perf_counter()
+                index.search(q, 5)
+                times.append((time.perf_counter() - t) * 1000)
+        times.sort()
+        print(f"query top-5, {len(times)} queries            p50 {times[len(times) // 2]:6.2f} ms  "
+              f"p99 {times[int(len(times) * 0.99)]:6.2f} ms")
+
+        new = os.path.join(tmp, "dv-new")
+        write_corpus(new, 1, args.articles, args.words, seed=1, start=args.issues)
+        t = time.perf_counter()
+        res = index.add([new])
+        print(f"add 1 new issue ({res['docs']} passages), no rebuild {(time.perf_counter() - t) * 1000:8.1f} ms")
+        assert index.search(f"брой {args.issues + 1}", 1), "new segment not searchable"
+        docs, before = index.docs, [index.search(q, 5) for q in QUERIES]
+        t = time.perf_counter()
+        index.compact()
+        print(f"compact 2 segments into 1                 {(time.perf_counter() - t) * 1000:8.1f} ms")
+        assert index.docs == docs and [index.search(q, 5) for q in QUERIES] == before
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
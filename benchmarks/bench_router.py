@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""Micro-benchmark: compiled router vs. the original per-function keyword scans.
+
+    python benchmarks/bench_router.py [--rules 500]
+
+Checks that both give identical answers on the question corpus, then times a
+full routing (intent + policy + sources) per question, uncached, and repeats
+the comparison after adding synthetic rules to show how each scales.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from router import DEFAULTS, RULES, Router, Rule  # noqa: E402
+
+CORPUS = os.path.join(ROOT, "benchmarks", "questions.jsonl")
+
+
+# ---- Original app.py implementations (baseline) ----
+def legacy_classify_intent(q: str) -> str:
+    t = (q or "").lower()
+    if any(k in t for k in ["бюдж", "дефиц", "дълг", "ддс", "пенс", "разход", "приход", "бвп", "инфлац", "безработ", "aic", "потреблен", "реалн доход", "растеж"]):
+        return "FISCAL"
+    if any(k in t for k in ["мол", "управител", "еоод", "оод", "а4", "търговски регист", "агенция по вписвания"]):
+        return "ADMIN"
+    if any(k in t for k in ["закон", "чл", "ал.", "параграф", "гражданств", "натурализ", "държавен вестник", "проектозакон"]):
+        return "LEGAL"
+    return "GENERAL"
+
+
+def legacy_detect_policy(q: str) -> str:
+    t = (q or "").lower()
+    if "ддс" in t and any(k in t for k in ["ресторан", "9", "9%"]):
+        return "VAT_REST_9"
+    if "пенс" in t and any(k in t for k in ["10", "10%"]):
+        return "PENSIONS_10"
+    if any(k in t for k in ["инвест", "капекс", "инфраструкт", "образован", "здравеопаз"]):
+        return "INVEST"
+    return "BASE"
+
+
+def legacy_sources(hint: str) -> str:
+    hint = (hint or "").lower()
+    if any(k in hint for k in ["закон", "чл", "ал", "гражданств", "държавен вестник", "проектозакон"]):
+        return "LEGAL"
+    elif any(k in hint for k in ["мол", "управител", "еоод", "оод", "търговски регист", "а4"]):
+        return "ADMIN"
+    elif any(k in hint for k in ["бюджет", "дефиц", "дълг", "инфлац", "безработ", "бвп", "aic"]):
+        return "FISCAL"
+    return "ALL"
+
+
+def legacy_topic(question: str):
+    q = (question or "").lower()
+    if "мол" in q and ("еоод" in q or "управител" in q or "търговски" in q):
+        return "ADMIN_MOL"
+    if "ддс" in q and ("9" in q or "ресторан" in q or "кетъринг" in q):
+        return "VAT_REST_9"
+    if "гражданств" in q:
+        return "CITIZENSHIP"
+    if ("дефицит" in q or "3%" in q or "дълг" in q or "60%" in q or "aic" in q or "догон" in q or "бюджет" in q):
+        return "FISCAL_TARGETS"
+    return None
+
+
+def legacy_route(q: str):
+    return legacy_classify_intent(q), legacy_detect_policy(q), legacy_sources(q)
+
+
+def linear_route(rules, q: str):
+    # The original approach generalised: one any() scan per rule, in priority order.
+    t = (q or "").lower()
+    out = dict(DEFAULTS)
+    done = set()
+    for r in rules:
+        if r.family in done:
+            continue
+        if all(any(k in t for k in g) for g in r.groups):
+            out[r.family] = r.label
+            done.add(r.family)
+    return out
+
+
+def synthetic_rules(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    alphabet = "абвгдежзийклмнопрстуфхцчшщъьюя"
+    rules = []
+    for i in range(n):
+        words = tuple("".join(rng.choice(alphabet) for _ in range(rng.randint(4, 9))) for _ in range(5))
+        rules.append(Rule("policy", f"SYN_{i}", (words,)))
+    return rules
+
+
+def load_corpus(path: str = CORPUS):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["question"] for line in f if line.strip()]
+
+
+def per_question_us(fn, corpus, repeat: int) -> float:
+    t = min(timeit.repeat(lambda: [fn(q) for q in corpus], number=repeat, repeat=5))
+    return t / (repeat * len(corpus)) * 1e6
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rules", type=int, default=500, help="synthetic rules added for the scaling run")
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+
+    corpus = load_corpus()
+    router = Router(RULES)
+    for q in corpus:
+        r = router.route(q)
+        assert (r.intent, r.policy, r.sources) == legacy_route(q), q
+        assert r.topic == legacy_topic(q), q
+
+    print(f"corpus: {len(corpus)} questions, {len(RULES)} rules")
+    base_legacy = per_question_us(legacy_route, corpus, args.repeat)
+    base_router = per_question_us(router.route, corpus, args.repeat)
+    print(f"  legacy functions : {base_legacy:8.2f} µs/question")
+    print(f"  compiled router  : {base_router:8.2f} µs/question")
+
+    big = RULES + synthetic_rules(args.rules)
+    big_router = Router(big)
+    print(f"with {args.rules} synthetic rules ({len(big)} total)")
+    print(f"  linear any() scan: {per_question_us(lambda q: linear_route(big, q), corpus, args.repeat // 10):8.2f} µs/question")
+    print(f"  compiled router  : {per_question_us(big_router.route, corpus, args.repeat):8.2f} µs/question")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""VAT sensitivity grids: one vectorised pass over a dense 3-D grid, and the cost of zooming / extending.
+
+    python benchmarks/bench_sensitivity.py [--n 200 --n3 50]
+
+Uses the repo's data.json. Every cached answer is checked against a fresh
+full evaluation of the same axes.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import vat_scenarios  # noqa: E402
+from sensitivity import Sensitivity  # noqa: E402
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--n", type=int, default=200, help="points on the passthrough and elasticity axes")
+    ap.add_argument("--n3", type=int, default=50, help="points on the compliance axis")
+    args = ap.parse_args()
+
+    sens = Sensitivity(vat_scenarios.load_module())
+    Sensitivity(sens.module).grid({"passthrough": (None, None, 8), "elasticity": (None, None, 8)})   # warm-up
+    full = {"passthrough": (None, None, args.n), "elasticity": (None, None, args.n), "compliance": (None, None, args.n3)}
+    lo, hi = sens.span("passthrough")
+    mid, quarter = (lo + hi) / 2, (hi - lo) / 4
+    steps = [
+        ("cold, full grid", full),
+        ("same grid again", full),
+        ("zoom x2 on passthrough", {**full, "passthrough": (mid - quarter, mid + quarter, args.n)}),
+        ("zoom x4 on passthrough", {**full, "passthrough": (mid - quarter / 2, mid + quarter / 2, args.n)}),
+        ("pan within zoom", {**full, "passthrough": (mid - quarter / 2 + 0.05, mid + quarter / 2 + 0.05, args.n)}),
+        ("extend passthrough right", {**full, "passthrough": (None, hi + quarter, args.n)}),
+        ("extend elasticity left", {**full, "elasticity": (sens.span("elasticity")[0] - 0.3, None, args.n)}),
+    ]
+    print(f"{'request':<26} {'cells':>11} {'computed':>11} {'ms':>9} {'fresh ms':>9}")
+    for name, ranges in steps:
+        t = time.perf_counter()
+        grid = sens.grid(ranges)
+        took = (time.perf_counter() - t) * 1000
+        t = time.perf_counter()
+        fresh = Sensitivity(sens.module).grid(ranges)
+        fresh_ms = (time.perf_counter() - t) * 1000
+        assert np.array_equal(grid.values, fresh.values), name
+        print(f"{name:<26} {grid.values.size:>11,} {grid.computed:>11,} {took:9.1f} {fresh_ms:9.1f}")
+
+    # Scalar baseline: what evaluating preset-by-preset would cost per cell.
+    module, n = sens.module, 20_000
+    rng = np.random.default_rng(0)
+    cells = rng.random((n, 3))
+    t = time.perf_counter()
+    for a, b, c in cells:
+        vat_scenarios.revenue_impact(module.turnover_bgn, sens.rate_old, sens.rate_new, 0.75, a, -b, c / 10)
+    per_cell = (time.perf_counter() - t) / n
+    size = grid.values.size
+    print(f"scalar loop: {per_cell * 1e6:.2f} µs/cell -> {per_cell * size:.1f} s for {size:,} cells")
+    print(f"cache: {sens.computed:,} cells computed, {sens.reused:,} served from cache")
+
+
+if __name__ == "__main__":
+    main()
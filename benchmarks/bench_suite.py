@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""Benchmark suite for the routing, policy, rendering and AI hot paths, with JSON baselines.
+
+    git stash && python benchmarks/bench_suite.py run -o benchmarks/baselines/baseline.json && git stash pop
+    python benchmarks/bench_suite.py run                          # all cases -> benchmarks/baselines/current.json
+    python benchmarks/bench_suite.py run --only app_rerun,ai_call_stub --quick
+    python benchmarks/bench_suite.py compare                      # baseline.json vs current.json
+
+Each case runs `repeat` passes over its input corpus and records per-operation
+times in µs (median / p95 / min over passes). `compare` checks medians and
+exits with status 1 when any case is slower than the baseline by more than
+--threshold (default 25%), so it can gate CI. Baselines are machine-specific
+and are not committed (benchmarks/baselines/ is git-ignored): record one on
+the host that runs the comparison, from the commit to compare against.
+compare refuses files from different hosts or Python versions and warns
+when one of them is a --quick run.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Benchmarks must not touch the shared on-disk answer cache or a real API key.
+os.environ["BGGOVAI_CACHE"] = "memory"
+os.environ.pop("OPENAI_API_KEY", None)
+os.environ.pop("OPENAI_BASE_URL", None)
+os.environ["BGGOVAI_WARMUP"] = "off"    # cold paths are measured; no background warm-up
+
+import core  # noqa: E402
+from bench_router import load_corpus  # noqa: E402
+from router import ROUTER, route  # noqa: E402
+
+BASELINES = os.path.join(ROOT, "benchmarks", "baselines")
+POLICIES = ("BASE", "VAT_REST_9", "PENSIONS_10", "INVEST")
+INTENSITIES = (0.0, 0.25, 0.5, 0.75, 1.0)
+
+
+# ---- Cases: each returns (ops per pass, callable running one pass) ----
+def case_classify_intent(corpus):
+    def run():
+        route.cache_clear()
+        for q in corpus:
+            core.classify_intent(q)
+    return len(corpus), run
+
+
+def case_route(corpus):
+    def run():
+        for q in corpus:
+            ROUTER.route(q)
+    return len(corpus), run
+
+
+def case_apply_policy(corpus):
+    rev, exp = core.base_frames()
+    grid = [(p, i) for p in POLICIES for i in INTENSITIES]
+
+    def run():
+        for p, i in grid:
+            core.apply_policy(rev, exp, p, i)
+    return len(grid), run
+
+
+def case_compute_budget(corpus):
+    rev, exp = core.base_frames()
+    frames = [core.apply_policy(rev, exp, p, 1.0)[:2] for p in POLICIES]
+
+    def run():
+        for r, e in frames:
+            core.compute_budget(r, e)
+    return len(frames), run
+
+
+def case_state_of_nation(corpus):
+    points = [(d / 100, 0.2 + k / 50) for d in range(-5, 6) for k in range(25)]
+
+    def run():
+        for def_pct, debt_pct in points:
+            core.state_of_nation(def_pct, debt_pct, (3, 0, 10))
+    return len(points), run
+
+
+def case_scenario_cold(corpus):
+    grid = [(p, i) for p in POLICIES for i in INTENSITIES]
+
+    def run():
+        core._scenario.cache_clear()
+        for p, i in grid:
+            core.scenario(p, i)
+    return len(grid), run
+
+
+def case_compensation(corpus):
+    # Uncached solver: one plan per (policy, intensity), and the whole grid in one vectorised pass.
+    comp = core.compensator(core.dataset().version)
+    grid = [(p, i) for p in POLICIES for i in INTENSITIES]
+
+    def run():
+        for p, i in grid:
+            comp.plan(p, i)
+        comp.grid(POLICIES, INTENSITIES)
+    return len(grid) + 1, run
+
+
+def case_build_context(corpus):
+    def run():
+        for q in corpus:
+            core.build_context(q)
+    return len(corpus), run
+
+
+def _app_test(script: str):
+    from streamlit.testing.v1 import AppTest
+    return AppTest.from_file(os.path.join(ROOT, script), default_timeout=60)
+
+
+def case_app_rerun(corpus):
+    # One rerun per question with the details view on (tables + charts), as a user would see it.
+    at = _app_test("app.py").run()
+    at.toggle[1].set_value(True).run()
+    sample = corpus[::5]
+
+    def run():
+        for q in sample:
+            at.chat_input[0].set_value(q).run()
+            assert not at.exception, at.exception
+    return len(sample), run
+
+
+def case_streamlit_app_rerun(corpus):
+    at = _app_test("streamlit_app.py").run()
+    sample = corpus[::5]
+
+    def run():
+        for q in sample:
+            at.text_area[0].set_value(q).run()
+            assert not at.exception, at.exception
+    return len(sample), run
+
+
+def _stub_lookup(srv):
+    env = {"OPENAI_API_KEY": "stub", "OPENAI_BASE_URL": srv.base_url}
+    return lambda name, default=None: env.get(name, default)
+
+
+def case_ai_call_stub(corpus, srv):
+    # Cache misses only: every call carries a fresh user message, so each one is a round trip.
+    lookup = _stub_lookup(srv)
+    context = core.build_context(corpus[0])
+    counter = iter(range(1 << 62))
+
+    def run():
+        for _ in range(10):
+            out = core.ai_call(core.SYSTEM_PROMPT, f"{context}\n#{next(counter)}", "stub-model", lookup)
+            assert out.startswith("1)"), out
+    return 10, run
+
+
+def case_ai_call_cached(corpus, srv):
+    lookup = _stub_lookup(srv)
+    contexts = [core.build_context(q) for q in corpus]
+    for c in contexts:
+        core.ai_call(core.SYSTEM_PROMPT, c, "stub-model", lookup)
+
+    def run():
+        for c in contexts:
+            core.ai_call(core.SYSTEM_PROMPT, c, "stub-model", lookup)
+    return len(contexts), run
+
+
+# name -> (factory, needs stub, passes, quick passes)
+CASES = {
+    "classify_intent": (case_classify_intent, False, 200, 20),
+    "route": (case_route, False, 200, 20),
+    "apply_policy": (case_apply_policy, False, 50, 5),
+    "compute_budget": (case_compute_budget, False, 200, 20),
+    "state_of_nation": (case_state_of_nation, False, 200, 20),
+    "scenario_cold": (case_scenario_cold, False, 20, 3),
+    "compensation": (case_compensation, False, 50, 5),
+    "build_context": (case_build_context, False, 50, 5),
+    "app_rerun": (case_app_rerun, False, 5, 2),
+    "streamlit_app_rerun": (case_streamlit_app_rerun, False, 5, 2),
+    "ai_call_stub": (case_ai_call_stub, True, 20, 3),
+    "ai_call_cached": (case_ai_call_cached, True, 200, 20),
+}
+
+
+# ---- Runner ----
+def percentile(xs, q: float) -> float:
+    xs = sorted(xs)
+    k = (len(xs) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(xs) - 1)
+    return xs[lo] + (xs[hi] - xs[lo]) * (k - lo)
+
+
+def measure(ops: int, fn, passes: int) -> dict:
+    fn()  # warm-up: imports, lazy caches, first Streamlit run
+    per_op = []
+    for _ in range(passes):
+        t = time.perf_counter()
+        fn()
+        per_op.append((time.perf_counter() - t) / ops * 1e6)
+    return {
+        "median_us": round(statistics.median(per_op), 3),
+        "p95_us": round(percentile(per_op, 0.95), 3),
+        "min_us": round(min(per_op), 3),
+        "ops": ops,
+        "passes": passes,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def run_suite(names, quick: bool) -> dict:
+    from stub_llm import StubServer
+
+    corpus = load_corpus()
+    results = {}
+    with StubServer() as srv:
+        for name in names:
+            factory, needs_stub, passes, quick_passes = CASES[name]
+            ops, fn = factory(corpus, srv) if needs_stub else factory(corpus)
+            results[name] = measure(ops, fn, quick_passes if quick else passes)
+            r = results[name]
+            print(f"  {name:<22} {r['median_us']:>12.2f} µs/op  p95 {r['p95_us']:>12.2f}  ({ops} ops x {r['passes']})")
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": f"{platform.system()} {platform.machine()}",
+            "host": platform.node(),
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+
+ENV_KEYS = ("host", "machine", "python")
+
+
+def compare(base: dict, cur: dict, threshold: float) -> int:
+    b, c = base["results"], cur["results"]
+    bm, cm = base["meta"], cur["meta"]
+    differ = [k for k in ENV_KEYS if bm.get(k) != cm.get(k)]
+    if differ:
+        print("baseline and current come from different environments ("
+              + ", ".join(f"{k}: {bm.get(k)} vs {cm.get(k)}" for k in differ)
+              + "); re-record the baseline here", file=sys.stderr)
+        return 2
+    if bm.get("quick") != cm.get("quick"):
+        print("warning: comparing a --quick run with a full run; medians are noisier", file=sys.stderr)
+    print(f"baseline {base['meta'].get('commit')} vs current {cur['meta'].get('commit')}  (threshold +{threshold:.0%})")
+    regressions = 0
+    for name in sorted(set(b) | set(c)):
+        if name not in b or name not in c:
+            print(f"  {name:<22} {'only in ' + ('baseline' if name in b else 'current'):>40}")
+            continue
+        ratio = c[name]["median_us"] / b[name]["median_us"] if b[name]["median_us"] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "REGRESSION"
+            regressions += 1
+        elif ratio < 1 / (1 + threshold):
+            flag = "faster"
+        print(f"  {name:<22} {b[name]['median_us']:>12.2f} -> {c[name]['median_us']:>12.2f} µs  {ratio:6.2f}x  {flag}")
+    print(f"{regressions} regression(s)")
+    return 1 if regressions else 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run", help="run the suite and write a JSON result file")
+    r.add_argument("-o", "--output", default=os.path.join(BASELINES, "current.json"))
+    r.add_argument("--only", default="", help="comma-separated case names (default: all)")
+    r.add_argument("--quick", action="store_true", help="fewer passes, for a smoke run")
+    c = sub.add_parser("compare", help="compare two result files, exit 1 on regressions")
+    c.add_argument("baseline", nargs="?", default=os.path.join(BASELINES, "baseline.json"))
+    c.add_argument("current", nargs="?", default=os.path.join(BASELINES, "current.json"))
+    c.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown of the median, 0.25 = 25%%")
+    args = ap.parse_args()
+
+    if args.cmd == "compare":
+        if not os.path.exists(args.baseline):
+            print(f"no baseline at {args.baseline}: record one on this host first "
+                  f"(bench_suite.py run -o {args.baseline} at the commit to compare against)", file=sys.stderr)
+            return 2
+        with open(args.baseline, encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.current, encoding="utf-8") as f:
+            cur = json.load(f)
+        return compare(base, cur, args.threshold)
+
+    names = [n.strip() for n in args.only.split(",") if n.strip()] or list(CASES)
+    unknown = [n for n in names if n not in CASES]
+    if unknown:
+        ap.error(f"unknown case(s): {', '.join(unknown)}; available: {', '.join(CASES)}")
+    print(f"running {len(names)} case(s)")
+    report = run_suite(names, args.quick)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    print(f"wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
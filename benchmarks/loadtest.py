@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""Load test: N concurrent simulated sessions driving the real app.py against an in-process stub LLM.
+
+    python benchmarks/loadtest.py [--sessions 20 --actions 8 --latency 0.8 --token-delay 0.01 --stream]
+    python benchmarks/loadtest.py --sessions 1,10,40 --json load.json      # one process per session count
+
+Each session is a streamlit.testing AppTest in its own thread, as Streamlit
+runs one script thread per browser session. A session asks questions from
+benchmarks/questions.jsonl, drawn by intent with --mix weights. Between
+questions it moves the intensity slider (FISCAL answers) with probability
+--slider. Every rerun goes through the whole script, including the AI tab.
+Answers come from stub_llm.StubServer with --latency to the first byte and
+--token-delay per token (streamed with --stream).
+
+Reported per run:
+  throughput        reruns/s over the run's wall time
+  rerun latency     p50/p99 per action kind (question, slider) and overall, from the session's side
+  stages            in-app p50/p99 of request, ai_call and ai_upstream (metrics.REGISTRY)
+  memory/session    RSS growth from one warm session to N more held open, divided by N
+  caches            AI answer cache hit rate, coalesced calls, upstream requests, memoised scenario hit rate
+  tail              hedged requests and fallback answers (with --slow-rate/--fail-rate injected at the stub)
+
+All sessions share one process, like one Streamlit replica. The AI cache is in
+memory and starts empty for every run (--warmup: after one warmup.py pass),
+and no real API key is used. AppTest
+waits for a rerun by polling every 1 ms, so with many sessions the harness
+adds some CPU load of its own, and the latencies are a little pessimistic.
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ["BGGOVAI_CACHE"] = "memory"
+os.environ.pop("OPENAI_MODEL", None)
+os.environ["BGGOVAI_WARMUP"] = "off"    # --warmup runs one pass itself, before the clock starts
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import core  # noqa: E402
+import metrics  # noqa: E402
+import warmup  # noqa: E402
+from ai_cache import RESPONSES  # noqa: E402
+from bench_router import load_corpus  # noqa: E402
+from router import route  # noqa: E402
+from stub_llm import StubServer  # noqa: E402
+
+APP = os.path.join(ROOT, "app.py")
+DEFAULT_MIX = "FISCAL=0.5,ADMIN=0.15,LEGAL=0.15,GENERAL=0.2"
+SLIDER = "Колко % от мярката"
+
+
+def share_runtime() -> None:
+    """Let AppTest runs overlap in threads.
+
+    streamlit.testing (1.37) assumes one run at a time. Around every run it
+    installs a process-global mock Runtime and clears it afterwards, and it
+    patches config.get_option. With overlapping runs, one session's teardown
+    pulls the Runtime from under another. Here one Runtime is pinned for the
+    whole process, which is how a real server runs, with st.cache_resource
+    shared by every session. global.appTest is also set once. The same goes
+    for the compiled script: AppTest builds a new ScriptCache, and compiles
+    app.py again, on every run. Concurrent compiles trip a CPython 3.11
+    parser bug ("AST constructor recursion depth mismatch"). A server keeps
+    one ScriptCache, so one is shared here too.
+    """
+    from unittest.mock import MagicMock
+
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner, util
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+    util.config.get_option = util.build_mock_config_get_option({"global.appTest": True})
+    app_test.patch_config_options = lambda overrides: contextlib.nullcontext()
+    script_cache = ScriptCache()
+    local_script_runner.ScriptCache = lambda: script_cache
+    # With a Runtime always present, building AppTests on the main thread warns about a missing ScriptRunContext.
+    logging.getLogger("streamlit.runtime.scriptrunner.script_run_context").addFilter(
+        lambda record: "missing ScriptRunContext" not in record.getMessage())
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024     # peak, Linux units; macOS is bytes
+
+
+def percentile(xs, q: float) -> float:
+    xs = sorted(xs)
+    if not xs:
+        return float("nan")
+    k = (len(xs) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(xs) - 1)
+    return xs[lo] + (xs[hi] - xs[lo]) * (k - lo)
+
+
+def question_pools(mix: str):
+    weights = {k.strip(): float(v) for k, v in (part.split("=") for part in mix.split(","))}
+    pools = defaultdict(list)
+    for q in load_corpus():
+        pools[route(q).intent].append(q)
+    missing = [k for k in weights if not pools.get(k)]
+    if missing:
+        raise SystemExit(f"no questions for intent(s) {', '.join(missing)} in questions.jsonl")
+    return list(weights), list(weights.values()), pools
+
+
+class Session:
+    def __init__(self, sid: int, args, intents, weights, pools):
+        self.rng = random.Random(args.seed * 1000 + sid)
+        self.args, self.intents, self.weights, self.pools = args, intents, weights, pools
+        self.at = AppTest.from_file(APP, default_timeout=args.timeout)
+        self.samples = []       # (kind, intent, seconds)
+        self.errors = 0
+
+    def _run(self, kind: str, intent: str, step) -> None:
+        t = time.perf_counter()
+        step()
+        self.samples.append((kind, intent, time.perf_counter() - t))
+        if self.at.exception:
+            self.errors += 1
+
+    def _slider(self):
+        return next((s for s in self.at.slider if s.label.startswith(SLIDER)), None)
+
+    def run(self, start: threading.Barrier) -> None:
+        self.at.run()
+        start.wait()
+        intent = None
+        for _ in range(self.args.actions):
+            if self.args.think:
+                time.sleep(self.rng.expovariate(1.0 / self.args.think))
+            slider = self._slider()
+            if slider is not None and self.rng.random() < self.args.slider:
+                value = self.rng.choice([v for v in range(0, 101, 5) if v != slider.value])
+                self._run("slider", intent, lambda: slider.set_value(value).run())
+                continue
+            intent = self.rng.choices(self.intents, self.weights)[0]
+            q = self.rng.choice(self.pools[intent])
+            self._run("question", intent, lambda: self.at.chat_input[0].set_value(q).run())
+
+
+def reset_caches() -> None:
+    RESPONSES.clear()
+    core.clear_caches()
+    route.cache_clear()
+    metrics.REGISTRY.reset()
+
+
+def load_run(n: int, args, intents, weights, pools, srv: StubServer) -> dict:
+    # Memory baseline: one warm session that has asked one question per intent (lazy imports, the
+    # OpenAI client and the compiled script are paid), then N more sessions held open.
+    warm = Session(-1, args, intents, weights, pools)
+    warm.at.run()
+    for intent in intents:
+        warm.at.chat_input[0].set_value(pools[intent][0]).run()
+    reset_caches()
+    if args.warmup:
+        warmup.Warmer(workers=warmup.WORKERS, mode="all").run(core.dataset().version)
+        metrics.REGISTRY.reset()
+    upstream0 = srv.requests
+    scen0 = core._scenario.cache_info()
+    rss0 = rss_bytes()
+    sessions = [Session(i, args, intents, weights, pools) for i in range(n)]
+    start = threading.Barrier(n + 1)
+    threads = [threading.Thread(target=s.run, args=(start,), name=f"session-{i}") for i, s in enumerate(sessions)]
+    for th in threads:
+        th.start()
+    start.wait()
+    t0 = time.perf_counter()
+    for th in threads:
+        th.join()
+    wall = time.perf_counter() - t0
+    rss1 = rss_bytes()
+
+    samples = [x for s in sessions for x in s.samples]
+    by_kind = defaultdict(list)
+    for kind, intent, sec in samples:
+        by_kind[kind].append(sec)
+        if kind == "question":
+            by_kind[f"question:{intent}"].append(sec)
+    by_kind["all"] = [sec for _, _, sec in samples]
+    summary = metrics.REGISTRY.summary()
+    hits = metrics.REGISTRY.counter("ai_cache_total", result="hit")
+    misses = metrics.REGISTRY.counter("ai_cache_total", result="miss")
+    scen = core._scenario.cache_info()
+    scen_hits, scen_misses = scen.hits - scen0.hits, scen.misses - scen0.misses
+    return {
+        "sessions": n,
+        "reruns": len(samples),
+        "errors": sum(s.errors for s in sessions),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(samples) / wall, 2),
+        "latency_ms": {k: {"n": len(v), "p50": round(percentile(v, 0.5) * 1000, 1),
+                           "p99": round(percentile(v, 0.99) * 1000, 1)} for k, v in sorted(by_kind.items())},
+        "stages_ms": {k: {"p50": round(summary[k]["p50"] * 1000, 2), "p99": round(summary[k]["p99"] * 1000, 2)}
+                      for k in ("request", "ai_call", "ai_coalesced", "ai_upstream") if k in summary},
+        "memory_per_session_mb": round((rss1 - rss0) / n / 2**20, 2),
+        "rss_mb": round(rss1 / 2**20, 1),
+        "ai_cache_hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+        "ai_coalesced": int(metrics.REGISTRY.counter("ai_coalesced_total", mode="call")
+                            + metrics.REGISTRY.counter("ai_coalesced_total", mode="stream")),
+        "upstream_requests": srv.requests - upstream0,
+        "ai_first_attempts": int(metrics.REGISTRY.counter("ai_first_attempts_total")),
+        "ai_hedges": int(metrics.REGISTRY.counter("ai_hedges_total")),
+        "ai_fallbacks": int(metrics.REGISTRY.counter("ai_fallbacks_total", reason="deadline")
+                            + metrics.REGISTRY.counter("ai_fallbacks_total", reason="error")),
+        "scenario_cache_hit_rate": (round(scen_hits / (scen_hits + scen_misses), 3)
+                                    if scen_hits + scen_misses else None),
+    }
+
+
+def print_run(r: dict) -> None:
+    lat = r["latency_ms"]
+    print(f"\n{r['sessions']} sessions: {r['reruns']} reruns in {r['wall_s']:.1f} s = {r['throughput_rps']:.1f} reruns/s"
+          f"{'  ERRORS ' + str(r['errors']) if r['errors'] else ''}")
+    for k, v in lat.items():
+        print(f"  {k:<20} n {v['n']:>5}   p50 {v['p50']:8.1f} ms   p99 {v['p99']:8.1f} ms")
+    print("  in-app stages: " + " • ".join(f"{k} p50 {v['p50']:.1f} / p99 {v['p99']:.1f} ms"
+                                          for k, v in r["stages_ms"].items()))
+    mem = f"{r['memory_per_session_mb']:.2f} MB"
+    hit = lambda x: "-" if x is None else f"{x:.0%}"  # noqa: E731
+    print(f"  memory/session {mem} (RSS {r['rss_mb']:.0f} MB) • AI cache hits {hit(r['ai_cache_hit_rate'])}"
+          f" • coalesced {r['ai_coalesced']} • upstream {r['upstream_requests']}"
+          f" • scenario cache hits {hit(r['scenario_cache_hit_rate'])}")
+    print(f"  tail: hedged {r['ai_hedges']} of {r['ai_first_attempts']} • fallback answers {r['ai_fallbacks']}")
+
+
+def child(n: int, args) -> dict:
+    intents, weights, pools = question_pools(args.mix)
+    share_runtime()
+    os.environ["OPENAI_STREAM"] = "1" if args.stream else "0"
+    with StubServer(latency=args.latency, token_delay=args.token_delay, jitter=args.jitter, slow_rate=args.slow_rate,
+                    slow=args.slow, fail_rate=args.fail_rate, seed=args.seed) as srv:
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = srv.base_url
+        return load_run(n, args, intents, weights, pools, srv)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sessions", default="20", help="concurrent sessions; comma-separated for several runs")
+    ap.add_argument("--actions", type=int, default=8, help="questions + slider moves per session")
+    ap.add_argument("--mix", default=DEFAULT_MIX, help="intent weights for new questions")
+    ap.add_argument("--slider", type=float, default=0.4, help="chance of a slider move instead of a new question")
+    ap.add_argument("--think", type=float, default=0.0, help="mean think time between actions (s, exponential)")
+    ap.add_argument("--latency", type=float, default=0.8, help="stub: seconds to the first byte")
+    ap.add_argument("--token-delay", type=float, default=0.01, help="stub: seconds per token")
+    ap.add_argument("--jitter", type=float, default=0.2, help="stub: extra uniform latency (s)")
+    ap.add_argument("--slow-rate", type=float, default=0.0, help="stub: share of requests delayed by --slow")
+    ap.add_argument("--slow", type=float, default=5.0, help="stub: extra seconds for a slow request")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="stub: share of requests answered with HTTP 500")
+    ap.add_argument("--stream", action="store_true", help="stream answers (st.write_stream) instead of blocking")
+    ap.add_argument("--warmup", action="store_true", help="run one warmup.py pass before the sessions start")
+    ap.add_argument("--timeout", type=float, default=120.0, help="per-rerun timeout (s)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", default=None, help="also write the results to this file")
+    ap.add_argument("--child", type=int, default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(child(args.child, args)))
+        return
+    print(f"stub: {args.latency:.2f} s + {args.token_delay * 1000:.0f} ms/token (+{args.jitter:.2f} s jitter), "
+          f"{'streaming' if args.stream else 'blocking'}; mix {args.mix}; {args.actions} actions/session")
+    runs = []
+    for n in (int(x) for x in args.sessions.split(",")):
+        # A fresh process per session count: clean caches, and RSS not inflated by the previous run.
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", str(n)] + sys.argv[1:],
+                              capture_output=True, text=True, cwd=ROOT)
+        if proc.returncode:
+            sys.stderr.write(proc.stderr)
+            raise SystemExit(f"run with {n} sessions failed")
+        runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+        print_run(runs[-1])
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "runs": runs}, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
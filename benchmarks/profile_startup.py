@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Cold-start and rerun profile of app.py, each sample in a fresh interpreter.
+
+    python benchmarks/profile_startup.py [--samples 5] [--json out.json]
+
+Per scenario and per fresh process:
+  import_streamlit   `import streamlit` alone (framework floor, not ours)
+  first_run          first script run: app imports + landing page
+  first_answer       run that submits the question (lazy imports land here)
+  rerun              median of later reruns (slider moves)
+  loaded             which heavy packages ended up in sys.modules
+Scenarios run without OPENAI_API_KEY except "ai_tab", which points at the stub.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("numpy", "pandas", "pyarrow", "openai", "httpx")
+QUESTION = "Какъв е ефектът ако върнем ДДС 9% за ресторанти?"
+SCENARIOS = {
+    "landing": {"question": None, "details": False, "ai": False},
+    "fiscal": {"question": QUESTION, "details": False, "ai": False},
+    "fiscal_details": {"question": QUESTION, "details": True, "ai": False},
+    "ai_tab": {"question": QUESTION, "details": False, "ai": True},
+}
+
+
+def child(name: str) -> dict:
+    sc = SCENARIOS[name]
+    sys.path.insert(0, ROOT)
+    os.environ["BGGOVAI_CACHE"] = "memory"
+    os.environ.pop("OPENAI_API_KEY", None)
+    os.environ["OPENAI_STREAM"] = "0"
+    os.environ["BGGOVAI_WARMUP"] = "off"
+    t = time.perf_counter()
+    import streamlit  # noqa: F401
+    from streamlit.testing.v1 import AppTest
+    out = {"import_streamlit": time.perf_counter() - t}
+    already = {m for m in HEAVY if m in sys.modules}
+
+    srv = None
+    if sc["ai"]:
+        from stub_llm import StubServer
+        srv = StubServer().start()
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ["OPENAI_BASE_URL"] = srv.base_url
+
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    t = time.perf_counter()
+    at.run()
+    out["first_run"] = time.perf_counter() - t
+    if sc["question"]:
+        if sc["details"]:
+            at.toggle[1].set_value(True)
+        t = time.perf_counter()
+        at.chat_input[0].set_value(sc["question"]).run()
+        out["first_answer"] = time.perf_counter() - t
+        reruns = []
+        for k in range(6):
+            t = time.perf_counter()
+            at.slider[0].set_value(100 - 5 * (k % 2 + 1)).run()
+            reruns.append(time.perf_counter() - t)
+        out["rerun"] = statistics.median(reruns)
+    assert not at.exception, at.exception
+    if srv is not None:
+        srv.stop()
+    out["loaded"] = sorted(m for m in HEAVY if m in sys.modules and m not in already)
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--samples", type=int, default=5)
+    ap.add_argument("--json", default=None, help="also write the medians to this file")
+    ap.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.child)))
+        return
+
+    report = {}
+    print(f"{'scenario':<16}{'streamlit':>11}{'first run':>11}{'1st answer':>12}{'rerun':>9}   loaded by the app")
+    for name in SCENARIOS:
+        samples = []
+        for _ in range(args.samples):
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", name],
+                                  capture_output=True, text=True, check=True, cwd=ROOT)
+            samples.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+        row = {k: statistics.median(s[k] for s in samples)
+               for k in ("import_streamlit", "first_run", "first_answer", "rerun") if k in samples[0]}
+        row["loaded"] = samples[0]["loaded"]
+        report[name] = row
+        ms = lambda k: f"{row[k] * 1000:.0f} ms" if k in row else "-"  # noqa: E731
+        print(f"{name:<16}{ms('import_streamlit'):>11}{ms('first_run'):>11}{ms('first_answer'):>12}{ms('rerun'):>9}"
+              f"   {', '.join(row['loaded']) or '-'}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""Array-backed budget model for fast what-if sweeps.
+
+Budget categories are stored as NumPy vectors and every policy is a short
+list of sparse add/multiply operations on those vectors, so thousands of
+(policy, intensity) combinations are evaluated in a single broadcast.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+REV = "rev"
+EXP = "exp"
+
+
+@dataclass(frozen=True)
+class PolicyOp:
+    side: str          # REV or EXP
+    category: str
+    kind: str          # "add" (млрд. € at 100%) or "mul" (relative change at 100%)
+    coef: float
+
+
+@dataclass(frozen=True)
+class PolicySpec:
+    name: str
+    ops: Tuple[PolicyOp, ...]
+    note: str          # format fields: delta, mult, pct
+
+
+POLICIES: Dict[str, PolicySpec] = {
+    "VAT_REST_9": PolicySpec(
+        "VAT_REST_9",
+        # DEMO: -0.35 bn EUR VAT revenue at 100%
+        (PolicyOp(REV, "ДДС", "add", -0.35),),
+        "ДДС 9% за ресторанти: {delta:+.2f} млрд. € (DEMO, {pct:.0f}%)",
+    ),
+    "PENSIONS_10": PolicySpec(
+        "PENSIONS_10",
+        (PolicyOp(EXP, "Пенсии", "mul", 0.10),),
+        "Пенсии +10%: x{mult:.3f} (DEMO, {pct:.0f}%)",
+    ),
+    "INVEST": PolicySpec(
+        "INVEST",
+        (
+            PolicyOp(EXP, "Инфраструктура", "add", 0.60),
+            PolicyOp(EXP, "Образование", "add", 0.15),
+            PolicyOp(EXP, "Здравеопазване", "add", 0.15),
+        ),
+        "Инвестиции: +капекс/обр./здр. (DEMO, {pct:.0f}%)",
+    ),
+    "BASE": PolicySpec("BASE", (), "Няма разпозната фискална мярка (DEMO)."),
+}
+
+
+@dataclass
+class BudgetModel:
+    gdp: float
+    debt: float
+    rev_names: List[str]
+    exp_names: List[str]
+    rev: np.ndarray
+    exp: np.ndarray
+    specs: Dict[str, PolicySpec] = field(default_factory=lambda: dict(POLICIES))
+
+    def __post_init__(self):
+        self.rev = np.asarray(self.rev, dtype=float)
+        self.exp = np.asarray(self.exp, dtype=float)
+        self.policies = list(self.specs)
+        self.policy_index = {p: i for i, p in enumerate(self.policies)}
+        index = {
+            REV: {n: i for i, n in enumerate(self.rev_names)},
+            EXP: {n: i for i, n in enumerate(self.exp_names)},
+        }
+        # Scatter the sparse ops once into dense (P, C) coefficient matrices.
+        shape = {REV: (len(self.policies), len(self.rev_names)), EXP: (len(self.policies), len(self.exp_names))}
+        mats = {(side, kind): np.zeros(shape[side]) for side in (REV, EXP) for kind in ("add", "mul")}
+        for p, spec in enumerate(self.specs.values()):
+            for op in spec.ops:
+                if op.category not in index[op.side]:
+                    raise KeyError(f"{spec.name}: unknown {op.side} category {op.category!r}")
+                mats[(op.side, op.kind)][p, index[op.side][op.category]] += op.coef
+        self.rev_add, self.rev_mul = mats[(REV, "add")], mats[(REV, "mul")]
+        self.exp_add, self.exp_mul = mats[(EXP, "add")], mats[(EXP, "mul")]
+        # Totals are linear in intensity: T(p, i) = T0 + i * slope[p].
+        self.rev_slope = self.rev_mul @ self.rev + self.rev_add.sum(axis=1)
+        self.exp_slope = self.exp_mul @ self.exp + self.exp_add.sum(axis=1)
+
+    @classmethod
+    def from_budget(cls, budget, specs: Dict[str, PolicySpec] = POLICIES) -> "BudgetModel":
+        return cls(
+            gdp=float(budget.gdp),
+            debt=float(budget.debt),
+            rev_names=[n for n, _ in budget.revenues],
+            exp_names=[n for n, _ in budget.expenditures],
+            rev=[v for _, v in budget.revenues],
+            exp=[v for _, v in budget.expenditures],
+            specs=dict(specs),
+        )
+
+    def _pidx(self, policies) -> np.ndarray:
+        if isinstance(policies, str):
+            return np.asarray(self.policy_index.get(policies, self.policy_index["BASE"]))
+        return np.array([self.policy_index.get(p, self.policy_index["BASE"]) for p in policies])
+
+    def categories(self, policy: str, intensity: float,
+                   rev: np.ndarray = None, exp: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Per-category values after `policy` at `intensity` (optionally on other base vectors)."""
+        p = self._pidx(policy)
+        rev = self.rev if rev is None else np.asarray(rev, dtype=float)
+        exp = self.exp if exp is None else np.asarray(exp, dtype=float)
+        r = rev * (1.0 + self.rev_mul[p] * intensity) + self.rev_add[p] * intensity
+        e = exp * (1.0 + self.exp_mul[p] * intensity) + self.exp_add[p] * intensity
+        return r, e
+
+    def sweep(self, policies: Sequence[str], intensities) -> Dict[str, np.ndarray]:
+        """Evaluate every (policy, intensity) pair; arrays have shape (len(policies), len(intensities)).
+
+        Ratios are for this year, as in year 1 of `project`: debt_pct is the
+        end-of-year debt (current debt plus the deficit) over GDP.
+        """
+        p = self._pidx(list(policies))[:, None]
+        i = np.asarray(intensities, dtype=float)[None, :]
+        rev = self.rev.sum() + self.rev_slope[p] * i
+        exp = self.exp.sum() + self.exp_slope[p] * i
+        deficit = exp - rev
+        return {
+            "revenue": rev,
+            "expenditure": exp,
+            "deficit": deficit,
+            "deficit_pct": deficit / self.gdp,
+            "debt_pct": (self.debt + deficit) / self.gdp,
+        }
+
+    def project(self, policies: Sequence[str], intensities, years: int, growth: float, inflation: float,
+                ramp_years: int = 1) -> Dict[str, np.ndarray]:
+        """Roll debt forward over a (policy, intensity, year) cube.
+
+        Revenues, expenditures and GDP grow with nominal growth (1+g)(1+π); the
+        policy effect follows `phase_in`. Ratios are end-of-year debt / GDP of
+        that year and the year's deficit / GDP.
+        """
+        p = self._pidx(list(policies))[:, None, None]
+        phase = phase_in(intensities, years, ramp_years)[None, :, :]
+        nominal = ((1.0 + growth) * (1.0 + inflation)) ** np.arange(years)
+        gdp = self.gdp * nominal
+        base = self.exp.sum() - self.rev.sum()
+        slope = self.exp_slope[p] - self.rev_slope[p]
+        deficit = (base + phase * slope) * nominal
+        debt = self.debt + np.cumsum(deficit, axis=-1)
+        return {
+            "gdp": gdp,
+            "deficit": deficit,
+            "deficit_pct": deficit / gdp,
+            "debt": debt,
+            "debt_pct": debt / gdp,
+        }
+
+    def note(self, policy: str, intensity: float) -> str:
+        spec = self.specs.get(policy, self.specs["BASE"])
+        delta = sum(op.coef for op in spec.ops if op.kind == "add") * intensity
+        mult = 1.0 + sum(op.coef for op in spec.ops if op.kind == "mul") * intensity
+        return spec.note.format(delta=delta, mult=mult, pct=intensity * 100)
+
+
+def phase_in(intensities, years: int, ramp_years: int = 1) -> np.ndarray:
+    """(I, Y) schedule: year 1 at `intensity`, then linear to the full measure by year `ramp_years` + 1."""
+    i = np.asarray(intensities, dtype=float)[:, None]
+    t = np.arange(years)[None, :]
+    return np.minimum(1.0, i + (1.0 - i) * t / max(ramp_years, 1))
+
+
+def first_breach(ratio: np.ndarray, limit: float) -> np.ndarray:
+    """Years until `ratio` first exceeds `limit` along the last axis (1 = this year, 0 = never)."""
+    over = ratio > limit
+    return np.where(over.any(axis=-1), over.argmax(axis=-1) + 1, 0)
+
+
+def totals(rev: np.ndarray, exp: np.ndarray) -> Tuple[float, float, float]:
+    r = float(np.sum(rev))
+    e = float(np.sum(exp))
+    return r, e, e - r
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""Hierarchical budget store: side -> ministry -> program -> line, with indexed roll-ups.
+
+Nodes are laid out in preorder in flat NumPy arrays, so every subtree is a
+contiguous slice [node, node + size[node]). Roll-ups (`total`) are built
+once, bottom-up per depth level. After that an edit changes its own slice
+and then walks the parent chain:
+
+- set_line(): one leaf, O(depth)
+- scale() / add() on an inner node: the subtree slice (one vectorised
+  multiply) plus O(depth) for the ancestors
+
+Nothing is ever re-summed. Categories are found through two indexes:
+path -> node and name -> nodes. A policy category such as "Пенсии" may
+live at any level. what_if() applies PolicySpec ops with BudgetModel
+semantics (value * (1 + mul * i) + add * i) and reverts them on exit from a
+journal.
+"""
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from budget_engine import EXP, POLICIES, REV, PolicySpec
+
+SIDES = (REV, EXP)
+Path = Tuple[str, ...]
+
+
+class BudgetTree:
+    def __init__(self, rows: Iterable[Tuple[Path, float]]):
+        """`rows` are (path, amount) leaves; path[0] is REV or EXP. Order does not matter."""
+        rows = sorted(((tuple(p), float(a)) for p, a in rows), key=lambda r: r[0])
+        names: List[str] = []
+        parent: List[int] = []
+        depth: List[int] = []
+        amount: List[float] = []
+        self.index: Dict[Path, int] = {}
+        stack: List[int] = []           # node ids of the current path prefix
+        prev: Path = ()
+        for path, value in rows:
+            if path[0] not in SIDES:
+                raise ValueError(f"{'/'.join(path)}: first level must be {REV!r} or {EXP!r}")
+            if path in self.index:
+                raise ValueError(f"{'/'.join(path)}: duplicate line")
+            common = 0
+            while common < min(len(prev), len(path)) and prev[common] == path[common]:
+                common += 1
+            del stack[common:]
+            for d in range(common, len(path)):
+                node = len(names)
+                names.append(path[d])
+                parent.append(stack[-1] if stack else -1)
+                depth.append(d)
+                amount.append(0.0)
+                self.index[path[:d + 1]] = node
+                stack.append(node)
+            amount[stack[-1]] += value
+            prev = path
+        for side in SIDES:
+            if (side,) not in self.index:
+                self.index[(side,)] = len(names)
+                names.append(side)
+                parent.append(-1)
+                depth.append(0)
+                amount.append(0.0)
+
+        n = len(names)
+        self.names = names
+        self.parent = np.asarray(parent, dtype=np.int64)
+        self.depth = np.asarray(depth, dtype=np.int16)
+        self.amount = np.asarray(amount, dtype=float)       # own value (leaves only)
+        self._parents = parent                              # list: fast scalar walks
+        # Preorder: subtree size = distance to the next node at the same or a shallower depth.
+        self.size = np.ones(n, dtype=np.int64)
+        for d in range(int(self.depth.max(initial=0)), 0, -1):
+            idx = np.nonzero(self.depth == d)[0]
+            np.add.at(self.size, self.parent[idx], self.size[idx])
+        self.leaf = self.size == 1
+        mixed = np.nonzero(~self.leaf & (self.amount != 0.0))[0]
+        if len(mixed):
+            raise ValueError(f"{'/'.join(self.path(int(mixed[0])))}: a line cannot also be a group")
+        self.by_name: Dict[str, List[int]] = {}
+        for node, name in enumerate(names):
+            self.by_name.setdefault(name, []).append(node)
+        self.rebuild()
+
+    # ---- construction ----
+    @classmethod
+    def from_budget(cls, budget) -> "BudgetTree":
+        """Two-level tree from a flat Budget (category lists)."""
+        return cls([((REV, n), v) for n, v in budget.revenues] + [((EXP, n), v) for n, v in budget.expenditures])
+
+    @classmethod
+    def from_columns(cls, side: Sequence[str], levels: Sequence[Sequence[str]], amount: Sequence[float]) -> "BudgetTree":
+        """From column arrays (e.g. a data_loader Table): side, one array per level, amount."""
+        cols = [np.asarray(side)] + [np.asarray(level) for level in levels]
+        amounts = np.asarray(amount, dtype=float)
+        return cls((tuple(str(c[i]) for c in cols if str(c[i])), amounts[i]) for i in range(len(amounts)))
+
+    def rebuild(self) -> None:
+        """Full bottom-up roll-up (construction, or to discard accumulated float drift)."""
+        self.total = self.amount.copy()
+        for d in range(int(self.depth.max(initial=0)), 0, -1):
+            idx = np.nonzero(self.depth == d)[0]
+            np.add.at(self.total, self.parent[idx], self.total[idx])
+
+    # ---- lookup ----
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def lines(self) -> int:
+        return int(self.leaf.sum())
+
+    def node(self, path: Path) -> int:
+        return self.index[tuple(path)]
+
+    def path(self, node: int) -> Path:
+        out = []
+        while node >= 0:
+            out.append(self.names[node])
+            node = self._parents[node]
+        return tuple(reversed(out))
+
+    def find(self, name: str, side: Optional[str] = None) -> List[int]:
+        nodes = self.by_name.get(name, [])
+        if side is None:
+            return list(nodes)
+        root = self.index[(side,)]
+        return [n for n in nodes if root < n < root + self.size[root]]
+
+    def children(self, node: int) -> np.ndarray:
+        stop = node + self.size[node]
+        kids = np.arange(node + 1, stop)
+        return kids[self.parent[node + 1:stop] == node]
+
+    def rollup(self, depth: int, side: Optional[str] = None) -> Dict[str, float]:
+        """name -> subtotal for every node at `depth` (1 = ministries / top categories)."""
+        lo, hi = 0, len(self.names)
+        if side is not None:
+            lo = self.index[(side,)]
+            hi = lo + self.size[lo]
+        idx = np.nonzero(self.depth[lo:hi] == depth)[0] + lo
+        return {self.names[i]: float(self.total[i]) for i in idx}
+
+    def totals(self) -> Tuple[float, float, float]:
+        r = float(self.total[self.index[(REV,)]])
+        e = float(self.total[self.index[(EXP,)]])
+        return r, e, e - r
+
+    # ---- edits (all O(depth) on the ancestors) ----
+    def _propagate(self, node: int, delta: float) -> None:
+        parents, total = self._parents, self.total
+        p = parents[node]
+        while p >= 0:
+            total[p] += delta
+            p = parents[p]
+
+    def _journal(self, journal: Optional[list], node: int, delta: float) -> None:
+        if journal is not None:
+            stop = node + int(self.size[node])
+            journal.append((node, delta, self.amount[node:stop].copy(), self.total[node:stop].copy()))
+
+    def set_line(self, node: int, value: float, journal: Optional[list] = None) -> float:
+        if not self.leaf[node]:
+            raise ValueError(f"{'/'.join(self.path(node))} is a group; use scale() or add()")
+        delta = float(value) - self.amount[node]
+        self._journal(journal, node, delta)
+        self.amount[node] = value
+        self.total[node] = value
+        self._propagate(node, delta)
+        return delta
+
+    def scale(self, node: int, factor: float, journal: Optional[list] = None) -> float:
+        """Multiply every line under `node` by `factor`."""
+        stop = node + int(self.size[node])
+        delta = float(self.total[node]) * (factor - 1.0)
+        self._journal(journal, node, delta)
+        self.amount[node:stop] *= factor
+        self.total[node:stop] *= factor
+        self._propagate(node, delta)
+        return delta
+
+    def add(self, node: int, delta: float, journal: Optional[list] = None) -> float:
+        """Add `delta` to a line, or pro rata across the lines of a group."""
+        if self.leaf[node]:
+            return self.set_line(node, self.amount[node] + delta, journal)
+        current = float(self.total[node])
+        if current != 0.0:
+            return self.scale(node, (current + delta) / current, journal)
+        # Empty group: split evenly across its lines.
+        stop = node + int(self.size[node])
+        lines = np.nonzero(self.leaf[node:stop])[0] + node
+        self._journal(journal, node, delta)
+        for line in lines:
+            self.amount[line] += delta / len(lines)
+            self.total[line] += delta / len(lines)
+            p = self._parents[line]
+            while p >= node:
+                self.total[p] += delta / len(lines)
+                p = self._parents[p]
+        self._propagate(node, delta)
+        return delta
+
+    def revert(self, journal: list) -> None:
+        for node, delta, amount, total in reversed(journal):
+            stop = node + len(amount)
+            self.amount[node:stop] = amount
+            self.total[node:stop] = total
+            self._propagate(node, -delta)
+        journal.clear()
+
+    # ---- policies ----
+    def apply(self, spec: PolicySpec, intensity: float, journal: Optional[list] = None) -> float:
+        """Apply a PolicySpec (mul ops on the base, then adds); returns the change in the deficit."""
+        before = self.totals()[2]
+        for kind in ("mul", "add"):
+            for op in spec.ops:
+                if op.kind != kind:
+                    continue
+                nodes = self.find(op.category, op.side)
+                if not nodes:
+                    raise KeyError(f"{spec.name}: unknown {op.side} category {op.category!r}")
+                for node in nodes:
+                    if kind == "mul":
+                        self.scale(node, 1.0 + op.coef * intensity, journal)
+                    else:
+                        self.add(node, op.coef * intensity / len(nodes), journal)
+        return self.totals()[2] - before
+
+    @contextmanager
+    def what_if(self, policy: str, intensity: float, specs: Dict[str, PolicySpec] = POLICIES) -> Iterator["BudgetTree"]:
+        """Temporarily apply `policy`; the tree is restored on exit."""
+        journal: list = []
+        try:
+            self.apply(specs.get(policy, specs["BASE"]), intensity, journal)
+            yield self
+        finally:
+            self.revert(journal)
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""Headless batch mode: run citizen questions through the pipeline without Streamlit.
+
+    python cli.py benchmarks/questions.jsonl -o answers.jsonl
+    python cli.py - --ai < questions.jsonl > answers.jsonl
+    python cli.py questions.jsonl --ai --concurrency 16 --rate 20 --sections
+    BGGOVAI_METRICS_LOG=- python cli.py questions.jsonl --metrics metrics.prom
+
+Input lines are JSON objects with "question" (optionally "intensity",
+"horizon", "id"); results are written one JSON object per line as they are
+produced. A line that cannot be answered (bad JSON, no question, intensity
+outside 0..1, horizon outside 1..30) gives {"line", "error"} and the batch
+goes on. Without --ai the run is fully deterministic.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import IO, Iterator, Tuple
+
+import core
+import llm
+import metrics
+from llm_async import AsyncLLM
+
+
+def read_lines(f: IO[str]) -> Iterator[Tuple[int, str]]:
+    for n, line in enumerate(f, 1):
+        line = line.strip()
+        if line:
+            yield n, line
+
+
+def parse_item(line: str) -> dict:
+    item = json.loads(line)
+    if isinstance(item, str):
+        item = {"question": item}
+    if not isinstance(item, dict) or "question" not in item:
+        raise ValueError("missing 'question'")
+    return item
+
+
+def error_line(n: int, line: str, e: Exception) -> dict:
+    """Output record for an input line that could not be answered; the batch goes on."""
+    try:
+        item = json.loads(line)
+    except ValueError:
+        item = None
+    out = {"line": n, "error": f"{type(e).__name__}: {e}"}
+    return {"id": item["id"], **out} if isinstance(item, dict) and "id" in item else out
+
+
+def whatif(item: dict, args: argparse.Namespace) -> Tuple[float, int]:
+    return float(item.get("intensity", args.intensity)), int(item.get("horizon", args.horizon))
+
+
+def answer_item(item: dict, args: argparse.Namespace, ai: bool) -> dict:
+    trace = metrics.begin("question")
+    intensity, horizon = whatif(item, args)
+    res = core.answer(
+        item["question"],
+        intensity=intensity,
+        horizon=horizon,
+        check_sources=not args.no_sources,
+        ai=ai,
+        model=args.model,
+    )
+    trace.attrs.update(intent=res["intent"], policy=res["policy"])
+    metrics.finish(trace)
+    return {"id": item["id"], **res} if "id" in item else res
+
+
+def run(inp: IO[str], out: IO[str], args: argparse.Namespace) -> int:
+    count = 0
+    for n, line in read_lines(inp):
+        try:
+            res = answer_item(parse_item(line), args, args.ai)
+        except Exception as e:
+            res = error_line(n, line, e)
+        out.write(json.dumps(res, ensure_ascii=False) + "\n")
+        count += 1
+    out.flush()
+    return count
+
+
+async def run_async(inp: IO[str], out: IO[str], args: argparse.Namespace) -> int:
+    """AI answers fanned out concurrently; output keeps input order.
+    Same deadline, hedging and template fallback as the blocking path (OPENAI_DEADLINE, OPENAI_HEDGE_AFTER)."""
+    model = args.model or core.env_setting("OPENAI_MODEL") or core.DEFAULT_MODEL
+    config = llm.ClientConfig.from_lookup(core.env_setting)
+    policy = llm.CallPolicy.from_lookup(core.env_setting)
+    async with AsyncLLM(config, concurrency=args.concurrency, rate=args.rate, burst=args.concurrency,
+                        policy=policy) as ex:
+        async def worker(line: str) -> dict:
+            item = parse_item(line)
+            res = answer_item(item, args, ai=False)
+            context = core.build_context(item["question"], not args.no_sources)
+            res["model"] = model
+            if not ex.active:
+                res["answer"] = core.AI_INACTIVE
+                return res
+            try:
+                if args.sections:
+                    res["answer"] = await ex.answer_sections(core.SYSTEM_PROMPT, context, model)
+                else:
+                    res["answer"] = await ex.complete(core.SYSTEM_PROMPT, context, model)
+            except Exception as e:
+                reason = "deadline" if isinstance(e, TimeoutError) else "error"
+                metrics.fallback(reason)
+                res["answer"] = core.fallback_answer(item["question"], *whatif(item, args), not args.no_sources,
+                                                     reason)
+            return res
+
+        async def guarded(job: Tuple[int, str]) -> dict:
+            # One bad record must not abort the batch: run_batch re-raises a worker's exception.
+            n, line = job
+            try:
+                return await worker(line)
+            except Exception as e:
+                return error_line(n, line, e)
+
+        count = 0
+        async for res in ex.run_batch(read_lines(inp), guarded):
+            out.write(json.dumps(res, ensure_ascii=False) + "\n")
+            count += 1
+    out.flush()
+    return count
+
+
+def fraction(s: str) -> float:
+    x = float(s)
+    if not 0.0 <= x <= 1.0:
+        raise argparse.ArgumentTypeError(f"{s} is outside 0..1")
+    return x
+
+
+def years(s: str) -> int:
+    n = int(s)
+    if not 1 <= n <= core.PROJECTION_YEARS:
+        raise argparse.ArgumentTypeError(f"{s} is outside 1..{core.PROJECTION_YEARS}")
+    return n
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="BGGOVAI headless batch mode (JSONL in, JSONL out)")
+    ap.add_argument("input", help="questions .jsonl, or - for stdin")
+    ap.add_argument("-o", "--output", default="-", help="answers .jsonl, or - for stdout (default)")
+    ap.add_argument("--ai", action="store_true", help="also call the AI model (OPENAI_* env settings)")
+    ap.add_argument("--model", default=None)
+    ap.add_argument("--intensity", type=fraction, default=1.0, help="share of the measure this year, 0..1")
+    ap.add_argument("--horizon", type=years, default=core.DEFAULT_HORIZON,
+                    help=f"projection years, 1..{core.PROJECTION_YEARS}")
+    ap.add_argument("--no-sources", action="store_true")
+    ap.add_argument("--concurrency", type=int, default=1, help="parallel AI calls (async executor when > 1)")
+    ap.add_argument("--rate", type=float, default=10.0, help="max AI requests per second")
+    ap.add_argument("--sections", action="store_true", help="generate the five answer sections in parallel")
+    ap.add_argument("--metrics", default=None, help="write per-stage metrics (Prometheus text) to this file")
+    args = ap.parse_args(argv)
+
+    inp = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    t0 = time.perf_counter()
+    try:
+        if args.ai and (args.concurrency > 1 or args.sections):
+            count = asyncio.run(run_async(inp, out, args))
+        else:
+            count = run(inp, out, args)
+    finally:
+        if inp is not sys.stdin:
+            inp.close()
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - t0
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            f.write(metrics.REGISTRY.prometheus())
+    print(f"{count} questions in {elapsed:.2f} s ({count / elapsed if elapsed else 0:.0f}/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
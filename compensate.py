@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""Deterministic compensating measures: the smallest mix of category changes that brings the deficit back to 3%.
+
+For every lever j (a budget category) the solver picks a deficit reduction
+d_j in [0, cap_j]. A revenue lever adds d_j through collection and
+administration, never through higher rates. An expenditure lever removes
+d_j. The objective is a weighted quadratic:
+
+    minimise   sum_j cost_j * (d_j / base_j)^2
+    subject to sum_j d_j = gap,   0 <= d_j <= cap_j
+
+KKT gives d_j = clip(lam / w_j, 0, cap_j) with w_j = 2 * cost_j / base_j^2.
+The sum is monotone in lam, so a bisection on lam solves it exactly. The
+bisection is vectorised over any number of problems at once, which lets
+grid() solve every policy x intensity in one pass. A category the policy
+itself changes is never a lever (PENSIONS_10 is not paid for by cutting
+pensions). The levers are DEMO assumptions, like the figures in
+budget.json.
+"""
+import argparse
+import json
+import sys
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from budget_engine import EXP, REV, BudgetModel
+
+DEFICIT_LIMIT = 0.03
+
+# (side, category) -> (max change as a share of the category, cost of a 100% change).
+# Categories not listed are not touched (e.g. interest). DEMO assumptions.
+LEVERS: Dict[Tuple[str, str], Tuple[float, float]] = {
+    (REV, "ДДС"): (0.04, 1.0),                    # collection gap, e-invoicing
+    (REV, "Акцизи"): (0.03, 1.2),                 # fiscal control
+    (REV, "Подоходни данъци"): (0.02, 2.0),
+    (REV, "Корпоративни данъци"): (0.03, 1.5),
+    (REV, "Осигуровки"): (0.02, 2.0),
+    (REV, "Еврофондове и други"): (0.08, 1.0),    # absorption
+    (EXP, "Администрация"): (0.10, 1.0),
+    (EXP, "Инфраструктура"): (0.08, 1.5),         # reprioritisation
+    (EXP, "Здравеопазване"): (0.03, 4.0),
+    (EXP, "Образование"): (0.02, 4.0),
+    (EXP, "Социални разходи"): (0.03, 3.0),
+    (EXP, "Отбрана"): (0.02, 3.0),
+    (EXP, "Пенсии"): (0.01, 6.0),
+}
+BISECT_STEPS = 60
+
+
+@dataclass(frozen=True)
+class Plan:
+    policy: str
+    intensity: float
+    deficit_pct: float          # before compensation
+    gap: float                  # bn € above the target (0 = nothing to do)
+    measures: Tuple[Tuple[str, str, float], ...]    # (side, category, change in bn €), largest first
+    closed: float               # bn € of deficit reduction found
+    feasible: bool              # False: every lever at its cap and still above the target
+    target: float = DEFICIT_LIMIT
+
+    def as_dict(self) -> dict:
+        return {
+            "policy": self.policy, "intensity": self.intensity, "deficit_pct": round(self.deficit_pct, 6),
+            "gap": round(self.gap, 4), "closed": round(self.closed, 4), "feasible": self.feasible,
+            "measures": [{"side": s, "category": c, "delta": round(d, 4)} for s, c, d in self.measures],
+        }
+
+
+def solve(gap: np.ndarray, weight: np.ndarray, cap: np.ndarray) -> np.ndarray:
+    """Vectorised: gap (K,), weight/cap (K, n) -> d (K, n) with sum(d) = min(gap, sum(cap))."""
+    gap = np.maximum(np.asarray(gap, dtype=float), 0.0)
+    weight, cap = np.broadcast_arrays(np.asarray(weight, dtype=float), np.asarray(cap, dtype=float))
+    reachable = np.minimum(gap, cap.sum(axis=-1))
+    lo = np.zeros_like(gap)
+    hi = (cap * weight).max(axis=-1, initial=0.0)   # every lever at its cap
+    for _ in range(BISECT_STEPS):
+        lam = (lo + hi) / 2
+        short = np.minimum(lam[..., None] / weight, cap).sum(axis=-1) < reachable
+        lo = np.where(short, lam, lo)
+        hi = np.where(short, hi, lam)
+    return np.minimum(hi[..., None] / weight, cap)
+
+
+class Compensator:
+    def __init__(self, model: BudgetModel, levers: Dict[Tuple[str, str], Tuple[float, float]] = LEVERS,
+                 target: float = DEFICIT_LIMIT):
+        self.model, self.target = model, target
+        keys = [(REV, n) for n in model.rev_names] + [(EXP, n) for n in model.exp_names]
+        self.keys = [k for k in keys if k in levers]
+        self._cols = np.array([keys.index(k) for k in self.keys], dtype=np.intp)
+        self.share = np.array([levers[k][0] for k in self.keys])
+        self.cost = np.array([levers[k][1] for k in self.keys])
+        # (policies, levers): False where the policy changes that category itself, so the lever stays at 0.
+        self.free = np.array([[k not in {(op.side, op.category) for op in model.specs[p].ops} for k in self.keys]
+                              for p in model.policies], dtype=bool).reshape(len(model.policies), len(self.keys))
+
+    def _solve(self, rev: np.ndarray, exp: np.ndarray, free: np.ndarray):
+        """rev/exp (..., n_rev/n_exp) after the policy, free (..., levers) -> (deficit, gap, d (..., levers))."""
+        deficit = exp.sum(axis=-1) - rev.sum(axis=-1)
+        gap = np.maximum(deficit - self.target * self.model.gdp, 0.0)
+        base = np.abs(np.concatenate([rev, exp], axis=-1)[..., self._cols])
+        base = np.maximum(base, 1e-9)
+        return deficit, gap, solve(gap, 2.0 * self.cost / base ** 2, self.share * base * free)
+
+    def _plan(self, policy: str, intensity: float, deficit: float, gap: float, d: np.ndarray) -> Plan:
+        measures = []
+        for j in np.argsort(-d, kind="stable"):
+            if d[j] > 5e-4:
+                side, name = self.keys[j]
+                measures.append((side, name, float(d[j]) if side == REV else -float(d[j])))
+        closed = float(d.sum())
+        return Plan(policy, float(intensity), float(deficit) / self.model.gdp, float(gap), tuple(measures), closed,
+                    bool(closed >= gap - 1e-9), self.target)
+
+    def plan(self, policy: str, intensity: float) -> Plan:
+        rev, exp = self.model.categories(policy, intensity)
+        deficit, gap, d = self._solve(rev, exp, self.free[self.model._pidx(policy)])
+        return self._plan(policy, intensity, deficit, gap, d)
+
+    def grid(self, policies: Optional[Sequence[str]] = None, intensities=np.linspace(0.0, 1.0, 11)) -> list:
+        """Every policy x intensity in one vectorised solve."""
+        m = self.model
+        policies = list(policies or m.policies)
+        p = m._pidx(policies)[:, None]
+        i = np.asarray(intensities, dtype=float)[None, :, None]
+        rev = m.rev * (1.0 + m.rev_mul[p] * i) + m.rev_add[p] * i
+        exp = m.exp * (1.0 + m.exp_mul[p] * i) + m.exp_add[p] * i
+        deficit, gap, d = self._solve(rev, exp, self.free[p])
+        return [self._plan(pol, x, deficit[a, b], gap[a, b], d[a, b])
+                for a, pol in enumerate(policies) for b, x in enumerate(np.asarray(intensities, dtype=float))]
+
+
+def context_lines(plan: Plan, unit: str = "млрд. €") -> str:
+    """Block for the AI context: the model explains these numbers instead of inventing its own."""
+    if plan.gap <= 0:
+        return (f"Компенсиращи мерки (локален оптимизатор): не са нужни, дефицитът е "
+                f"{plan.deficit_pct*100:.2f}% ≤ {plan.target*100:.0f}% от БВП\n")
+    head = "" if plan.feasible else f" (недостатъчни: остават {plan.gap - plan.closed:.2f} {unit})"
+    lines = [f"Компенсиращи мерки (локален оптимизатор, без промяна на ставки) за {plan.gap:.2f} {unit}{head}:"]
+    for side, name, delta in plan.measures:
+        kind = "приходи от събираемост" if side == REV else "разходи"
+        lines.append(f"- {name} ({kind}): {delta:+.2f} {unit}")
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None) -> int:
+    """Batch mode: a plan for every policy x intensity of the current data, one JSON line each."""
+    import core
+
+    ap = argparse.ArgumentParser(description=main.__doc__)
+    ap.add_argument("--steps", type=int, default=11, help="intensity steps between 0 and 1")
+    ap.add_argument("--target", type=float, default=DEFICIT_LIMIT, help="deficit target, share of GDP")
+    args = ap.parse_args(argv)
+    comp = Compensator(core.budget_model(core.dataset().version), target=args.target)
+    for plan in comp.grid(intensities=np.linspace(0.0, 1.0, args.steps)):
+        sys.stdout.write(json.dumps(plan.as_dict(), ensure_ascii=False) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
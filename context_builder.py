@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""Token-budgeted AI context: relevance-ranked blocks packed under a budget, most stable part first.
+
+core.build_context turns a question into Blocks. A block has a header plus
+lines, and every line carries its own relevance to the detected
+intent/policy (0 = never sent). pack() takes lines by relevance until the
+budget is used up. It then writes the chosen lines back in block order, not
+relevance order. So:
+
+- a line never appears twice: a line already written by an earlier block is
+  dropped from later ones (e.g. a source listed twice, a passage found in
+  two issues);
+- blocks are ordered from most to least stable across questions (sources,
+  then macro, scenario, measures, passages, question last). Two questions
+  with the same intent and policy share the whole prompt up to the question,
+  which is what provider-side prompt caching matches on.
+
+Token counts are local. tiktoken (o200k_base, the gpt-4o/4.1 encoding) is
+used when it is installed. Otherwise count_tokens falls back to an estimate
+from word lengths (Cyrillic ~3 characters per token, Latin ~4), which is
+good enough for budgeting.
+"""
+import math
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple
+
+CONTEXT_TOKENS = 600        # default budget for the user message; BGGOVAI_CONTEXT_TOKENS overrides
+ENCODING = "o200k_base"
+
+_encoder = None
+_TIKTOKEN_MISSING = False
+_WORD = re.compile(r"[^\W\d_]+|\d+|[^\w\s]+|_+")
+_CYRILLIC = re.compile(r"[Ѐ-ӿ]")
+
+
+def budget_from_env() -> int:
+    try:
+        return int(os.getenv("BGGOVAI_CONTEXT_TOKENS", "") or CONTEXT_TOKENS)
+    except ValueError:
+        return CONTEXT_TOKENS
+
+
+def _load_encoder():
+    global _encoder, _TIKTOKEN_MISSING
+    if _encoder is None and not _TIKTOKEN_MISSING:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding(ENCODING)
+        except Exception:
+            _TIKTOKEN_MISSING = True
+    return _encoder
+
+
+def tokenizer() -> str:
+    return f"tiktoken {ENCODING}" if _load_encoder() is not None else "estimate (tiktoken not installed)"
+
+
+def estimate_tokens(text: str) -> int:
+    n = 0
+    for w in _WORD.findall(text):
+        if w[0].isalpha():
+            n += math.ceil(len(w) / (3 if _CYRILLIC.match(w) else 4))
+        elif w[0].isdigit():
+            n += math.ceil(len(w) / 3)
+        else:
+            n += len(w)
+    return n
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    enc = _load_encoder()
+    return len(enc.encode(text)) if enc is not None else estimate_tokens(text)
+
+
+@lru_cache(maxsize=8192)
+def _norm(line: str) -> str:
+    return " ".join(line.split()).lower()
+
+
+@dataclass(frozen=True)
+class Block:
+    order: int                              # position in the prompt; lower = more stable across questions
+    header: str                             # written once before the first chosen line ("" = none)
+    lines: Tuple[Tuple[str, float], ...]    # (text, relevance 0..1), in display order
+    required: bool = False                  # always sent in full, first from the budget (the question)
+
+
+@dataclass(frozen=True)
+class Packed:
+    text: str
+    tokens: int             # of `text`, summed per line
+    full_tokens: int        # every block and line, relevance ignored: what the old context sent
+    dropped: int            # relevant lines left out for the budget
+    duplicates: int         # lines removed as repeats of an earlier block
+
+
+def _tokens(block: Block, lines) -> int:
+    """Tokens of a rendered block, summed from cached per-line counts (within a few tokens of the whole)."""
+    if not lines:
+        return 0
+    return sum(count_tokens(t + "\n") for t in lines) + (count_tokens(block.header + "\n") if block.header else 0) + 1
+
+
+@lru_cache(maxsize=1024)
+def _fill(blocks: Tuple[Block, ...], left: float):
+    """Chosen lines per block for `left` tokens. Cached: questions with the same intent, policy and
+    question length get the same blocks and budget, so a repeat costs one lookup."""
+    seen, candidates, duplicates = set(), [], 0
+    for bi, block in enumerate(blocks):
+        for li, (text, score) in enumerate(block.lines):
+            key = _norm(text)
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            if score > 0:
+                candidates.append((bi, li, text, score))
+
+    chosen = [set() for _ in blocks]
+    dropped = 0
+    # Highest relevance first; ties keep prompt order, so equal-score lines fill top-down.
+    for bi, li, text, _ in sorted(candidates, key=lambda c: -c[3]):
+        cost = count_tokens(text + "\n")
+        if not chosen[bi] and blocks[bi].header:
+            cost += count_tokens(blocks[bi].header + "\n") + 1
+        if cost > left:
+            dropped += 1
+            continue
+        chosen[bi].add(li)
+        left -= cost
+    lines = tuple(tuple(b.lines[li][0] for li in sorted(c)) for b, c in zip(blocks, chosen))
+    full = sum(_tokens(b, [t for t, _ in b.lines]) for b in blocks)
+    return lines, sum(map(_tokens, blocks, lines)), full, dropped, duplicates
+
+
+def pack(blocks: Iterable[Block], budget: Optional[int] = None) -> Packed:
+    """The most relevant lines that fit in `budget` tokens (None: no limit), written in block order."""
+    blocks = sorted(blocks, key=lambda b: b.order)
+    required = [b for b in blocks if b.required]
+    optional = tuple(b for b in blocks if not b.required)
+    fixed = sum(_tokens(b, [t for t, _ in b.lines]) for b in required)
+    lines, tokens, full, dropped, duplicates = _fill(optional, math.inf if budget is None else budget - fixed)
+    picked = dict(zip(map(id, optional), lines))
+    parts = []
+    for b in blocks:
+        rows = [t for t, _ in b.lines] if b.required else picked[id(b)]
+        if rows:
+            parts.append((b.header + "\n" if b.header else "") + "".join(t + "\n" for t in rows))
+    return Packed("\n".join(parts), fixed + tokens, fixed + full, dropped, duplicates)
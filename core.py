@@ -0,0 +1,664 @@
+# -*- coding: utf-8 -*-
+"""Streamlit-free BGGOVAI pipeline.
+
+classify_intent -> detect_policy -> apply_policy -> compute_budget ->
+state_of_nation -> build_context -> ai_call, importable by app.py, the batch
+CLI (cli.py) and tests. Figures come from data_loader (budget.json,
+data.json); everything derived from them is memoised per process and keyed
+on the data version, so an edited file is picked up without a redeploy.
+Nothing here touches `st`.
+"""
+import itertools
+import os
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Iterator, Optional
+
+import numpy as np
+
+import compensate
+import context_builder
+import data_loader
+import legal_index
+import llm
+import metrics
+import sensitivity
+import vat_scenarios
+from ai_cache import RESPONSES, cache_key
+from budget_engine import BudgetModel, first_breach, totals
+from budget_tree import SIDES, BudgetTree
+from context_builder import Block
+from router import SOURCE_SETS, route
+from singleflight import FLIGHTS, Abandoned, Flight
+
+DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1-mini")
+
+AMOUNT_COL = "Сума (млрд. €)"
+
+# ---- Data (budget.json + data.json via data_loader; hot-reloaded) ----
+def dataset(version: Optional[str] = None) -> data_loader.Dataset:
+    """Current dataset, or the one for `version`. Caches below key on ds.version."""
+    return data_loader.get(version) if version else data_loader.current()
+
+@lru_cache(maxsize=8)
+def budget_model(version: str) -> BudgetModel:
+    return BudgetModel.from_budget(dataset(version).budget)
+
+PROGRAMS_TABLE = "programs"     # optional budget.json table: side, <level columns...>, amount
+_TREE_LOCK = threading.Lock()
+
+@lru_cache(maxsize=4)
+def budget_tree(version: str) -> BudgetTree:
+    """Program-level tree from the "programs" table when budget.json declares one, else the flat categories."""
+    ds = dataset(version)
+    table = ds.tables.get(PROGRAMS_TABLE)
+    if table is None:
+        return BudgetTree.from_budget(ds.budget)
+    missing = {"side", "amount"} - set(table.columns)
+    if missing:
+        raise data_loader.DataError(f"tables.{PROGRAMS_TABLE}: missing column(s) {', '.join(sorted(missing))}")
+    levels = [c for c in table.columns if c not in ("side", "amount") and table.dtypes[c] == "str"]
+    return BudgetTree.from_columns(table.decoded("side"), [table.decoded(c) for c in levels], table.column("amount"))
+
+def tree_rollup(policy: str, intensity: float, version: Optional[str] = None,
+                depth: int = 1) -> Optional[dict]:
+    """{side: {name: amount}} at `depth` under the policy; None if the tree lacks a policy category."""
+    tree = budget_tree(version or dataset().version)
+    # The tree is edited in place and shared by every session.
+    with _TREE_LOCK:
+        try:
+            with tree.what_if(policy, intensity):
+                return {side: tree.rollup(depth, side) for side in SIDES}
+        except KeyError:
+            return None
+
+PROJECTION_YEARS = 30
+PROJECTION_GRID = np.linspace(0.0, 1.0, 101)   # 1% intensity steps
+DEFAULT_HORIZON = 10
+
+# ----------------------------
+# Helpers
+# ----------------------------
+def pct(x: float, d: int = 2) -> str:
+    return f"{x*100:.{d}f}%"
+
+def bn(x: float, d: int = 2) -> str:
+    return f"{x:.{d}f} млрд. €"
+
+def light(val: float, green: float, yellow: float) -> str:
+    if val <= green:
+        return "🟩"
+    if val <= yellow:
+        return "🟨"
+    return "🟥"
+
+def overall_status(lights: list[str]) -> str:
+    if "🟥" in lights:
+        return "🟥 Под риск"
+    if "🟨" in lights:
+        return "🟨 На ръба"
+    return "🟩 Устойчиво"
+
+@metrics.timed("classify_intent")
+def classify_intent(q: str) -> str:
+    return route(q).intent
+
+@metrics.timed("detect_policy")
+def detect_policy(q: str) -> str:
+    return route(q).policy
+
+def sources_for(hint: str) -> list[tuple[str, str]]:
+    names = route(hint).source_names
+    sources = dataset().sources
+    return list(sources) if names is None else [x for x in sources if x[0] in names]
+
+@metrics.timed("apply_policy")
+def apply_policy(rev_df, exp_df, policy: str, intensity: float):
+    # DataFrame wrapper; frames are expected in the dataset's category order (see base_frames).
+    model = budget_model(dataset().version)
+    rev, exp = model.categories(policy, intensity, rev_df[AMOUNT_COL].to_numpy(), exp_df[AMOUNT_COL].to_numpy())
+    return rev_df.assign(**{AMOUNT_COL: rev}), exp_df.assign(**{AMOUNT_COL: exp}), model.note(policy, intensity)
+
+@metrics.timed("compute_budget")
+def compute_budget(rev_df, exp_df) -> tuple[float, float, float]:
+    return totals(rev_df[AMOUNT_COL].to_numpy(), exp_df[AMOUNT_COL].to_numpy())
+
+def base_frames(version: Optional[str] = None):
+    import pandas as pd
+    budget = dataset(version).budget
+    rev = pd.DataFrame(budget.revenues, columns=["Категория", AMOUNT_COL])
+    exp = pd.DataFrame(budget.expenditures, columns=["Категория", AMOUNT_COL])
+    return rev, exp
+
+def breach_light(years: int) -> str:
+    if years == 0:
+        return "🟩"
+    return "🟨" if years > 5 else "🟥"
+
+def breach_text(years: int, horizon: int) -> str:
+    return f"{years} г." if years else f"няма до {horizon} г."
+
+@metrics.timed("state_of_nation")
+def state_of_nation(def_pct: float, debt_pct: float, breach: Optional[tuple[int, int, int]] = None,
+                    macro: Optional[data_loader.Macro] = None) -> tuple[str, list[tuple[str, str, str]]]:
+    m = macro or dataset().macro
+    infl_l = light(m.inflation, 0.03, 0.05)
+    growth_l = "🟩" if m.growth >= 0.03 else ("🟨" if m.growth >= 0.015 else "🟥")
+    unemp_l = light(m.unemployment, 0.05, 0.07)
+    cons_l = "🟩" if m.consumption >= 0.02 else ("🟨" if m.consumption >= 0.008 else "🟥")
+    rincome_l = "🟩" if m.real_income >= 0.03 else ("🟨" if m.real_income >= 0.012 else "🟥")
+    aic_l = "🟩" if m.aic_bg >= 80 else ("🟨" if m.aic_bg >= 72 else "🟥")
+    def_l = light(abs(def_pct), 0.03, 0.045)
+    debt_l = light(debt_pct, 0.60, 0.70)
+
+    chips = [
+        ("Инфлация", infl_l, f"{m.inflation*100:.1f}%"),
+        ("Растеж", growth_l, f"{m.growth*100:.1f}%"),
+        ("Безработица", unemp_l, f"{m.unemployment*100:.1f}%"),
+        ("Потребление", cons_l, f"{m.consumption*100:.1f}%"),
+        ("Реални доходи", rincome_l, f"{m.real_income*100:.1f}%"),
+        ("AIC", aic_l, f"{m.aic_bg:.0f}/{m.aic_eu:.0f}"),
+        ("Дефицит", def_l, f"{def_pct*100:.2f}%"),
+        ("Дълг", debt_l, f"{debt_pct*100:.2f}%"),
+    ]
+    if breach is not None:
+        # (years until deficit > 3%, years until debt > 60%, horizon) from the projection cube
+        to_def, to_debt, horizon = breach
+        chips.append(("Пробив 3%", breach_light(to_def), breach_text(to_def, horizon)))
+        chips.append(("Пробив 60%", breach_light(to_debt), breach_text(to_debt, horizon)))
+    status = overall_status([x[1] for x in chips])
+    return status, chips
+
+@lru_cache(maxsize=4)
+def vat_band(version: Optional[str] = None) -> Optional[vat_scenarios.ScenarioBand]:
+    # Revenue impact of returning restaurants to 9% VAT (reverse of the data.json move 9% -> 20%).
+    if version is None:
+        return vat_band(dataset().version)
+    module = dataset(version).vat
+    return vat_scenarios.simulate(module, n=1_000_000, reverse=True) if module is not None else None
+
+# ----------------------------
+# Scenario cache
+# ----------------------------
+@lru_cache(maxsize=4)
+def vat_sensitivity(version: Optional[str] = None) -> Optional[sensitivity.Sensitivity]:
+    """Grid cache for the VAT module (same direction as vat_band); keeps its cells across reruns and sessions."""
+    if version is None:
+        return vat_sensitivity(dataset().version)
+    module = dataset(version).vat
+    return sensitivity.Sensitivity(module, reverse=True) if module is not None else None
+
+@lru_cache(maxsize=4)
+def projection(version: str) -> dict:
+    # Full policy x intensity x year cube, computed once per data version.
+    model, macro = budget_model(version), dataset(version).macro
+    return model.project(model.policies, PROJECTION_GRID, PROJECTION_YEARS, macro.growth, macro.inflation)
+
+@dataclass(frozen=True)
+class Scenario:
+    policy: str
+    intensity: float
+    rev: np.ndarray
+    exp: np.ndarray
+    note: str
+    total_rev: float
+    total_exp: float
+    deficit: float
+    def_pct: float
+    debt_pct: float
+    status: str
+    chips: list[tuple[str, str, str]]
+    debt: float                 # end of this year
+    horizon: int
+    years_to_3: int             # 0 = no breach within the horizon
+    years_to_60: int
+    debt_path: np.ndarray       # debt % of GDP per projected year
+    deficit_path: np.ndarray
+    version: str
+
+    def frames(self):
+        rev_df, exp_df = base_frames(self.version)
+        return rev_df.assign(**{AMOUNT_COL: self.rev}), exp_df.assign(**{AMOUNT_COL: self.exp})
+
+    def as_dict(self) -> dict:
+        return {
+            "policy": self.policy, "intensity": self.intensity, "note": self.note,
+            "revenue": round(self.total_rev, 4), "expenditure": round(self.total_exp, 4),
+            "deficit": round(self.deficit, 4), "deficit_pct": round(self.def_pct, 6),
+            "debt": round(self.debt, 4), "debt_pct": round(self.debt_pct, 6), "status": self.status,
+            "horizon": self.horizon, "years_to_3": self.years_to_3, "years_to_60": self.years_to_60,
+        }
+
+def check_whatif(intensity: float, horizon: int = DEFAULT_HORIZON) -> None:
+    """Reject what-if inputs outside the projection cube: intensity 0..1, horizon 1..PROJECTION_YEARS."""
+    if not 0.0 <= intensity <= 1.0:
+        raise ValueError(f"intensity {intensity} is outside 0..1")
+    if not 1 <= horizon <= PROJECTION_YEARS:
+        raise ValueError(f"horizon {horizon} is outside 1..{PROJECTION_YEARS}")
+
+def scenario(policy: str, intensity: float, version: Optional[str] = None,
+             horizon: int = DEFAULT_HORIZON) -> Scenario:
+    """Scenario for the given data version (default: current); shared across tabs, sessions and batch runs."""
+    check_whatif(intensity, horizon)
+    return _scenario(policy, intensity, version or dataset().version, horizon)
+
+@lru_cache(maxsize=1024)
+def _scenario(policy: str, intensity: float, version: str, horizon: int) -> Scenario:
+    # Treat the arrays as read-only. Only runs on a cache miss; the caller's "scenario" span covers hits.
+    ds, model = dataset(version), budget_model(version)
+    with metrics.stage("apply_policy"):
+        rev, exp = model.categories(policy, intensity)
+    with metrics.stage("compute_budget"):
+        total_rev, total_exp, deficit = totals(rev, exp)
+        def_pct = deficit / ds.budget.gdp
+        cube = projection(version)
+        p = model.policy_index.get(policy, model.policy_index["BASE"])
+        # Blend the two grid columns around `intensity`; the cube is affine in intensity, so this is exact.
+        x = intensity * (len(PROJECTION_GRID) - 1)
+        i = min(int(x), len(PROJECTION_GRID) - 2)
+        w = x - i
+        debt_path, deficit_path, debt = ((1.0 - w) * cube[k][p, i, :horizon] + w * cube[k][p, i + 1, :horizon]
+                                         for k in ("debt_pct", "deficit_pct", "debt"))
+        debt_pct = float(debt_path[0])
+        to_3, to_60 = int(first_breach(deficit_path, 0.03)), int(first_breach(debt_path, 0.60))
+    status, chips = state_of_nation(def_pct, debt_pct, (to_3, to_60, horizon), ds.macro)
+    return Scenario(policy, intensity, rev, exp, model.note(policy, intensity), total_rev, total_exp,
+                    deficit, def_pct, debt_pct, status, chips, float(debt[0]), horizon, to_3, to_60,
+                    debt_path, deficit_path, version)
+
+@lru_cache(maxsize=4)
+def compensator(version: str) -> compensate.Compensator:
+    return compensate.Compensator(budget_model(version))
+
+@lru_cache(maxsize=1024)
+def _compensation(policy: str, intensity: float, version: str) -> compensate.Plan:
+    return compensator(version).plan(policy, intensity)
+
+def compensation(policy: str, intensity: float, version: Optional[str] = None) -> compensate.Plan:
+    """Smallest mix of category changes (no rate increases) that brings the deficit back to 3%."""
+    check_whatif(intensity)
+    return _compensation(policy, intensity, version or dataset().version)
+
+def clear_caches() -> None:
+    """Drop every per-version cache (benchmarks; a data reload needs nothing, keys change)."""
+    for fn in (_scenario, _compensation, compensator, projection, budget_model, budget_tree, vat_band,
+               vat_sensitivity, _fiscal_blocks, _source_block):
+        fn.cache_clear()
+
+# ---- Legal texts (offline BM25 index, see legal_index.py) ----
+LEGAL_PASSAGES = 3
+PASSAGE_CHARS = 900
+
+@metrics.timed("legal_search")
+def legal_passages(q: str, k: int = LEGAL_PASSAGES) -> list[legal_index.Passage]:
+    """Top article passages for a LEGAL question; empty until `python legal_index.py add ...` has been run."""
+    return legal_index.INDEX.search(q, k)
+
+def passage_text(p: legal_index.Passage, limit: int = PASSAGE_CHARS) -> str:
+    return p.text if len(p.text) <= limit else p.text[:limit].rsplit(" ", 1)[0] + " …"
+
+# ----------------------------
+# Prompt
+# ----------------------------
+SYSTEM_PROMPT = """
+Ти си BGGOVAI — интелигентен съветник за България (DEMO).
+
+Отговаряй на български, ясно и практично.
+
+Фискални цели:
+- дефицит ≤ 3% от БВП
+- държавен дълг ≤ 60% от БВП
+- максимално бързо догонване по AIC (ЕС=100)
+- без повишаване на данъчните ставки
+
+Ако дадена мярка влошава дефицита или дълга:
+компенсиращите мерки са изчислени в контекста (без вдигане на ставки) —
+обясни ги и не променяй сумите им; ако ги няма, дай рамка
+(ефективност, приоритизация, дигитализация, растеж).
+
+Право:
+- не измисляй членове и алинеи
+- цитирай само текстовете, дадени в контекста, с чл./§ и източника им
+- ако няма точен текст, дай рамка и посочи Държавен вестник, НС, МП
+
+Администрация:
+- дай стъпки, документи, институции
+- ако не си сигурен за такси или срокове – кажи да се проверят
+
+Формат:
+1) Резюме
+2) Анализ
+3) Ефект върху хората и бизнеса
+4) Рискове
+5) Какво да се провери + източници
+"""
+
+# Context blocks, most stable across questions first (see context_builder).
+ORDER_SOURCES, ORDER_MACRO, ORDER_SCENARIO, ORDER_MEASURES, ORDER_BAND, ORDER_PASSAGES, ORDER_QUESTION = \
+    0, 10, 20, 30, 40, 50, 90
+
+# Router keywords that make a context line fully relevant (see _rank).
+CONTEXT_KEYWORDS = frozenset({"aic", "инфлац", "растеж", "безработ", "потреблен", "реалн доход", "дълг", "приход",
+                              "разход", "дефиц"})
+
+def _rank(base: float, hits: frozenset, *keywords: str) -> float:
+    """Relevance of a context line: `base`, or 1.0 when the question names one of `keywords`."""
+    return 1.0 if hits.intersection(keywords) else base
+
+@lru_cache(maxsize=256)
+def _fiscal_blocks(policy: str, version: str, hits: frozenset) -> tuple[Block, ...]:
+    ds = dataset(version)
+    sc = scenario(policy, 1.0, version)
+    m = ds.macro
+    blocks = [
+        Block(ORDER_MACRO, f"{ds.label} макро (данни {version}):", (
+            (f"- БВП: {ds.budget.gdp:.1f} млрд. €", 1.0),
+            (f"- AIC: {m.aic_bg:.0f}/{m.aic_eu:.0f}", _rank(0.4, hits, "aic")),
+            (f"- Инфлация: {m.inflation*100:.1f}% | Растеж: {m.growth*100:.1f}% | Безработица: {m.unemployment*100:.1f}%",
+             _rank(0.4, hits, "инфлац", "растеж", "безработ")),
+            (f"- Потребление: {m.consumption*100:.1f}% | Реални доходи: {m.real_income*100:.1f}%",
+             _rank(0.3, hits, "потреблен", "реалн доход")),
+        )),
+        Block(ORDER_SCENARIO, f"Бюджет при сценария — {sc.note}:", (
+            (f"- Дълг в края на годината: {sc.debt:.1f} млрд. € ({sc.debt_pct*100:.2f}%)", _rank(0.9, hits, "дълг")),
+            (f"- Приходи: {sc.total_rev:.2f} млрд. €", _rank(0.7, hits, "приход")),
+            (f"- Разходи: {sc.total_exp:.2f} млрд. €", _rank(0.7, hits, "разход")),
+            (f"- Дефицит: {sc.deficit:.2f} млрд. € ({sc.def_pct*100:.2f}%)", 1.0),
+            (f"- Прогноза {sc.horizon} г. (растеж + инфлация): пробив на 3% дефицит: "
+             f"{breach_text(sc.years_to_3, sc.horizon)}; пробив на 60% дълг: {breach_text(sc.years_to_60, sc.horizon)}",
+             _rank(0.8, hits, "дефиц", "дълг")),
+        )),
+    ]
+    head, *measures = compensate.context_lines(compensation(policy, 1.0, version), ds.unit).splitlines()
+    blocks.append(Block(ORDER_MEASURES, head, tuple((x, 0.8) for x in measures)) if measures
+                  else Block(ORDER_MEASURES, "", ((head, 0.6),)))
+    band = vat_band(version) if policy == "VAT_REST_9" else None
+    if band is not None:
+        blocks.append(Block(ORDER_BAND, "", ((
+            f"- Monte Carlo ефект ДДС 9% ресторанти: P5 {band.p5:+.3f} / P50 {band.p50:+.3f} / P95 {band.p95:+.3f} млрд. €",
+            0.9),)))
+    return tuple(blocks)
+
+@lru_cache(maxsize=64)
+def _source_block(version: str, names: Optional[frozenset]) -> Block:
+    # The sources render_sources shows, else those of the intent; the rest only cost tokens.
+    return Block(ORDER_SOURCES, "Официални източници:", tuple(
+        (f"- {n}: {u}", 0.5 if names is None else float(n in names)) for n, u in dataset(version).sources))
+
+def context_blocks(q: str, check_sources: bool = True) -> list[Block]:
+    ds = dataset()
+    r = route(q)
+    blocks = [Block(ORDER_QUESTION, "", ((f"Въпрос: {q}", 1.0),), required=True)]
+    intent = classify_intent(q)
+    if intent == "FISCAL":
+        blocks += _fiscal_blocks(detect_policy(q), ds.version, r.keywords & CONTEXT_KEYWORDS)
+    elif intent == "LEGAL":
+        found = legal_passages(q)
+        if found:
+            blocks.append(Block(ORDER_PASSAGES, "Текстове от локалния индекс (Държавен вестник / НС):", tuple(
+                (f"[{p.article} — {p.title}; {p.source}]\n{passage_text(p)}\n", 1.0 - 0.1 * i)
+                for i, p in enumerate(found))))
+        else:
+            blocks.append(Block(ORDER_PASSAGES, "", (("Текстове: няма намерени в локалния индекс.", 1.0),)))
+    if check_sources:
+        blocks.append(_source_block(ds.version, r.source_names or SOURCE_SETS.get(intent)))
+    return blocks
+
+@metrics.timed("prompt")
+def build_context(q: str, check_sources: bool = True, budget: Optional[int] = None) -> str:
+    """User message for the AI: relevant blocks under `budget` tokens (default BGGOVAI_CONTEXT_TOKENS)."""
+    packed = context_builder.pack(context_blocks(q, check_sources),
+                                  context_builder.budget_from_env() if budget is None else budget)
+    metrics.annotate(context_tokens=packed.tokens, context_full_tokens=packed.full_tokens)
+    return packed.text
+
+# ----------------------------
+# Fallback answer (AI late or failing)
+# ----------------------------
+FALLBACK_WHY = {"deadline": "ИИ не отговори навреме", "error": "ИИ повикването не мина"}
+ADMIN_STEPS = ("Решение на едноличния собственик и съгласие на новия управител",
+               "Спесимен (образец на подпис) и декларации по ТЗ",
+               "Заявление А4 в Търговския регистър (електронно с КЕП или на място)",
+               "След вписване: уведомяване на банки и партньори")
+
+def fallback_answer(q: str, intensity: float = 1.0, horizon: int = DEFAULT_HORIZON, check_sources: bool = True,
+                    reason: str = "deadline") -> str:
+    """Deterministic answer in the SYSTEM_PROMPT format, from the computed numbers only. Never cached."""
+    r = route(q)
+    ds = dataset()
+    head = f"⚠️ {FALLBACK_WHY.get(reason, FALLBACK_WHY['error'])} — автоматично обобщение от изчисленията (DEMO)."
+    if r.intent == "FISCAL":
+        sc = scenario(r.policy, intensity, ds.version, horizon)
+        plan = compensation(r.policy, intensity, ds.version)
+        band = vat_band(ds.version) if r.policy == "VAT_REST_9" else None
+        analysis = [f"- Приходи {bn(sc.total_rev)}, разходи {bn(sc.total_exp)}, дефицит {bn(sc.deficit)}",
+                    f"- Дълг в края на годината: {bn(sc.debt, 1)} ({pct(sc.debt_pct)} от БВП)",
+                    f"- Прогноза {sc.horizon} г.: пробив на 3% дефицит: {breach_text(sc.years_to_3, sc.horizon)}; "
+                    f"пробив на 60% дълг: {breach_text(sc.years_to_60, sc.horizon)}"]
+        if band is not None:
+            b = band.scaled(intensity)
+            analysis.append(f"- Ефект ДДС 9% ресторанти (Monte Carlo): P5 {b.p5:+.3f} / P50 {b.p50:+.3f} / "
+                            f"P95 {b.p95:+.3f} млрд. €")
+        risks = [f"- {n}: {l} {v}" for n, l, v in sc.chips if l != "🟩"] or ["- Всички индикатори са в зелено."]
+        sections = (
+            f"{sc.note}. {sc.status}: дефицит {pct(sc.def_pct)} и дълг {pct(sc.debt_pct)} от БВП.",
+            "\n".join(analysis),
+            compensate.context_lines(plan, ds.unit).strip(),
+            "\n".join(risks),
+        )
+    elif r.intent == "ADMIN":
+        sections = ("Смяната на управител (МОЛ) на ЕООД се вписва в Търговския регистър (Агенция по вписванията).",
+                    "\n".join(f"{i}) {x}" for i, x in enumerate(ADMIN_STEPS, 1)),
+                    "Новият управител се вижда в Търговския регистър след вписването; дотогава банки и партньори работят с "
+                    "досегашния.",
+                    "- Таксите и сроковете да се проверят преди подаване.")
+    elif r.intent == "LEGAL":
+        found = legal_passages(q)
+        sections = ("Без ИИ анализ: само намерените текстове и рамка за анализ.",
+                    "\n".join(f"- {p.article} — {p.title} ({p.source})" for p in found)
+                    or "- Няма намерени текстове в локалния индекс.",
+                    "Зависи от точния текст (чл./ал./§) и преходните разпоредби.",
+                    "- Съответствие с Конституцията и правото на ЕС; неясноти и обжалвания.")
+    else:
+        sections = ("Нефискална тема – финансови сметки не се показват.", "—", "—", "—")
+    check = ["- Проверете текущите данни и официалните текстове."]
+    if check_sources:
+        check += [f"- {n}: {u}" for n, u in sources_for(q)]
+    titles = ("Резюме", "Анализ", "Ефект върху хората и бизнеса", "Рискове", "Какво да се провери + източници")
+    body = [f"{i}) {t}\n{x}" for i, (t, x) in enumerate(zip(titles, (*sections, "\n".join(check))), 1)]
+    return "\n\n".join([head, *body])
+
+# ----------------------------
+# OpenAI (v1+) helpers
+# ----------------------------
+Lookup = Callable[[str], Optional[str]]
+
+def env_setting(name: str, default: Optional[str] = None) -> Optional[str]:
+    return os.getenv(name, "").strip() or default
+
+def get_openai_client(lookup: Lookup = env_setting) -> Optional["llm.OpenAI"]:
+    # Pooled per process: built once, reused across reruns, sessions and batch runs.
+    return llm.get_client(llm.ClientConfig.from_lookup(lookup))
+
+AI_INACTIVE = "⚠️ AI модулът не е активен (липсва OPENAI_API_KEY или openai пакет)."
+
+# fallback(reason) -> answer text, reason "deadline" | "error"; None keeps the "❌" error text.
+Fallback = Optional[Callable[[str], str]]
+
+def _failed(e: BaseException, fallback: Fallback) -> str:
+    if fallback is None:
+        return f"❌ AI повикването не мина: {e}" if str(e) else "❌ AI повикването не мина."
+    reason = "deadline" if isinstance(e, TimeoutError) else "error"
+    metrics.fallback(reason)
+    return fallback(reason)
+
+def _cut(e: BaseException, fallback: Fallback, sent: int) -> str:
+    # A stream that broke off: the same fallback as ai_call, after whatever the user already has.
+    return "\n\n" + _failed(e, fallback) if sent else _failed(e, fallback)
+
+def _lead_call(key: str, flight: Flight, client, system: str, user: str, model: str, policy: llm.CallPolicy,
+               fallback: Fallback = None) -> str:
+    served = []
+
+    def late(result: str) -> None:
+        # Answered after the deadline: too late for this user, still good for the next one.
+        if result and not served:
+            RESPONSES.set(key, result)
+
+    try:
+        with metrics.stage("ai_upstream"):
+            result, _ = llm.hedged(lambda: llm.complete(client, system, user, model), policy, on_late=late)
+    except Exception as e:
+        metrics.ai_error(type(e).__name__)
+        FLIGHTS.land(key, flight, error=e)
+        return _failed(e, fallback)
+    served.append(result)
+    if result:
+        RESPONSES.set(key, result)
+    FLIGHTS.land(key, flight, result)
+    return result
+
+def ai_call(system: str, user: str, model: str, lookup: Lookup = env_setting, fallback: Fallback = None) -> str:
+    """Cached, coalesced and hedged AI answer within OPENAI_DEADLINE; then `fallback` (never cached)."""
+    with metrics.stage("ai_call"):
+        key = cache_key(system, user, model)
+        cached = RESPONSES.get(key)
+        metrics.cache_result(cached is not None)
+        if cached is not None:
+            return cached
+        client = get_openai_client(lookup)
+        if client is None:
+            return AI_INACTIVE
+        policy, t0 = llm.CallPolicy.from_lookup(lookup), time.monotonic()
+        # Identical calls already upstream (other sessions/threads): wait for that one instead.
+        while True:
+            flight, leader = FLIGHTS.join(key)
+            if leader:
+                break
+            metrics.coalesced("call")
+            try:
+                with metrics.stage("ai_coalesced"):
+                    return flight.wait(policy.after(time.monotonic() - t0).deadline)
+            except Abandoned:
+                continue
+            except Exception as e:
+                return _failed(e, fallback)
+        try:
+            cached = RESPONSES.get(key)     # landed between the miss above and join()
+            if cached is not None:
+                FLIGHTS.land(key, flight, cached)
+                return cached
+            return _lead_call(key, flight, client, system, user, model, policy.after(time.monotonic() - t0),
+                              fallback)
+        finally:
+            if not flight.done:
+                FLIGHTS.land(key, flight, error=Abandoned())
+
+def _close_stream(first: tuple) -> None:
+    first[1].close()
+
+def ai_stream(system: str, user: str, model: str, lookup: Lookup = env_setting,
+              fallback: Fallback = None) -> Iterator[str]:
+    """Yield the answer token by token; a finished stream lands in the same cache as ai_call.
+    The deadline and the hedge race apply to the first token."""
+    with metrics.stage("ai_call"):
+        key = cache_key(system, user, model)
+        cached = RESPONSES.get(key)
+        metrics.cache_result(cached is not None)
+        if cached is not None:
+            yield cached
+            return
+        client = get_openai_client(lookup)
+        if client is None:
+            yield AI_INACTIVE
+            return
+        policy, t0 = llm.CallPolicy.from_lookup(lookup), time.monotonic()
+        # Attach to an identical in-flight call: replay what it has streamed so far, then follow it live.
+        while True:
+            flight, leader = FLIGHTS.join(key)
+            if leader:
+                break
+            metrics.coalesced("stream")
+            sent = 0
+            try:
+                with metrics.stage("ai_coalesced"):
+                    for delta in flight.follow(policy.after(time.monotonic() - t0).deadline):
+                        sent += 1
+                        yield delta
+                return
+            except Abandoned as e:
+                if not sent:
+                    continue        # take over as the leader
+                yield _cut(e, fallback, sent)
+                return
+            except Exception as e:
+                yield _cut(e, fallback, sent)
+                return
+        parts = []
+        try:
+            cached = RESPONSES.get(key)
+            if cached is not None:
+                FLIGHTS.land(key, flight, cached)
+                yield cached
+                return
+            try:
+                with metrics.stage("ai_upstream") as span:
+                    t1 = time.perf_counter()
+                    (first, rest), _ = llm.hedged(lambda: llm.first_delta(llm.stream(client, system, user, model)),
+                                                  policy.after(time.monotonic() - t0), "ai_attempt_ttft",
+                                                  on_late=_close_stream)
+                    span["ttft_ms"] = round((time.perf_counter() - t1) * 1000, 3)
+                    for delta in itertools.chain((first,), rest):
+                        if not delta:
+                            continue
+                        parts.append(delta)
+                        flight.publish(delta)
+                        yield delta
+            except Exception as e:
+                metrics.ai_error(type(e).__name__)
+                if not parts and isinstance(e, TimeoutError):
+                    FLIGHTS.land(key, flight, error=e)
+                    yield _failed(e, fallback)
+                elif not parts:
+                    # Streaming not available upstream: fall back to the blocking call, still for this flight.
+                    yield _lead_call(key, flight, client, system, user, model, policy.after(time.monotonic() - t0),
+                                     fallback)
+                else:
+                    FLIGHTS.land(key, flight, error=e)
+                    yield _cut(e, fallback, len(parts))
+                return
+            result = "".join(parts).strip()
+            if result:
+                RESPONSES.set(key, result)
+            FLIGHTS.land(key, flight, result)
+        finally:
+            # The session went away mid-stream (rerun, closed tab): let a follower take over.
+            if not flight.done:
+                FLIGHTS.land(key, flight, error=Abandoned())
+
+# ----------------------------
+# Whole pipeline
+# ----------------------------
+def answer(q: str, intensity: float = 1.0, horizon: int = DEFAULT_HORIZON, check_sources: bool = True,
+           ai: bool = False, model: Optional[str] = None, lookup: Lookup = env_setting) -> dict:
+    """Run one question through the pipeline; the AI step is optional."""
+    check_whatif(intensity, horizon)
+    with metrics.stage("route"):
+        r = route(q)
+    out = {"question": q, "intent": r.intent, "policy": r.policy,
+           "sources": [n for n, _ in sources_for(q)] if check_sources else []}
+    if r.intent == "FISCAL":
+        with metrics.stage("scenario"):
+            out["scenario"] = scenario(r.policy, intensity, None, horizon).as_dict()
+            out["compensation"] = compensation(r.policy, intensity).as_dict()
+    elif r.intent == "LEGAL":
+        out["passages"] = [{"article": p.article, "title": p.title, "source": p.source, "score": round(p.score, 3)}
+                           for p in legal_passages(q)]
+    if ai:
+        model = model or lookup("OPENAI_MODEL") or DEFAULT_MODEL
+        out["model"] = model
+        out["answer"] = ai_call(SYSTEM_PROMPT, build_context(q, check_sources), model, lookup,
+                                lambda why: fallback_answer(q, intensity, horizon, check_sources, why))
+    return out
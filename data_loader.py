@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""Versioned data layer: budget, macro, sources and scenario inputs from files.
+
+    ds = data_loader.current()      # cheap; re-stats the files at most every CHECK_INTERVAL s
+    ds.version                      # content hash: key downstream caches on it
+    ds.budget.revenues, ds.macro.growth, ds.sources, ds.vat, ds.tables["nsi"].column("amount")
+
+budget.json (BGGOVAI_DATA overrides the path) holds the small data:
+macro indicators, the budget by category, official sources, and a pointer
+to the VAT scenario file (data.json). It is schema-checked on every load,
+and the budget must list every category a policy changes (ДДС, Пенсии, ...).
+A file that fails validation is reported in `last_error`, and the last good
+dataset keeps being served.
+
+Reload is driven by (mtime, size) of every file involved. Content only
+counts when those change: if the hash is unchanged (e.g. a touch), nothing
+is re-parsed. A few recent versions stay resolvable through get(version),
+so a rerun that started on the old version finishes on it.
+
+Large extracts (NSI/MinFin CSV or Parquet) are declared under "tables" and
+are never materialised per session. On first access each column is
+converted once into a .npy column store under .cache/tables/<file hash>/.
+String columns are dictionary-encoded as int32 codes + labels. Columns are
+then opened with np.load(mmap_mode="r"), so all sessions and processes
+share the OS page cache.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import budget_engine
+import vat_scenarios
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATH = os.path.join(ROOT, "budget.json")
+STORE_DIR = os.path.join(ROOT, ".cache", "tables")
+SCHEMA = 1
+CHECK_INTERVAL = 1.0        # seconds between stat() checks
+KEEP_VERSIONS = 4
+MACRO_FIELDS = ("inflation", "growth", "unemployment", "consumption", "real_income", "aic_bg", "aic_eu")
+COLUMN_TYPES = ("str", "int32", "int64", "float32", "float64")
+
+log = logging.getLogger("bggovai.data")
+
+
+class DataError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Macro:
+    inflation: float
+    growth: float
+    unemployment: float
+    consumption: float
+    real_income: float
+    aic_bg: float
+    aic_eu: float
+
+
+@dataclass(frozen=True)
+class Budget:
+    gdp: float                                  # млрд. €
+    debt: float
+    revenues: Tuple[Tuple[str, float], ...]     # (category, amount), display order
+    expenditures: Tuple[Tuple[str, float], ...]
+
+
+# ---- Large tables: column store, memory-mapped ----
+class Table:
+    """Column-wise view of a CSV/Parquet extract; columns load (memory-mapped) on first use."""
+
+    def __init__(self, name: str, path: str, columns: Dict[str, str], digest: str, store_dir: str = STORE_DIR):
+        self.name = name
+        self.path = path
+        self.dtypes = dict(columns)
+        self.digest = digest
+        self.store = os.path.join(store_dir, digest)
+        self._cols: Dict[str, np.ndarray] = {}
+        self._labels: Dict[str, Tuple[str, ...]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.dtypes)
+
+    def __len__(self) -> int:
+        return len(self.column(self.columns[0]))
+
+    def column(self, name: str) -> np.ndarray:
+        """Read-only array; str columns come back as int32 codes into labels(name)."""
+        col = self._cols.get(name)
+        if col is None:
+            if name not in self.dtypes:
+                raise KeyError(f"{self.name}: no column {name!r} (have {', '.join(self.dtypes)})")
+            with self._lock:
+                self._build()
+                col = self._cols[name] = np.load(os.path.join(self.store, f"{name}.npy"), mmap_mode="r")
+        return col
+
+    def labels(self, name: str) -> Tuple[str, ...]:
+        if name not in self._labels:
+            self.column(name)
+            with open(os.path.join(self.store, f"{name}.labels.json"), encoding="utf-8") as f:
+                self._labels[name] = tuple(json.load(f))
+        return self._labels[name]
+
+    def decoded(self, name: str) -> np.ndarray:
+        """Materialised str column (small tables / display only)."""
+        return np.asarray(self.labels(name), dtype=object)[self.column(name)]
+
+    def _build(self) -> None:
+        # One conversion per file content, shared across processes; written to a temp dir and renamed.
+        if os.path.exists(os.path.join(self.store, "_complete")):
+            return
+        import pandas as pd
+        cols = list(self.dtypes)
+        if self.path.endswith(".parquet"):
+            df = pd.read_parquet(self.path, columns=cols)
+        else:
+            df = pd.read_csv(self.path, usecols=cols,
+                             dtype={c: (str if t == "str" else t) for c, t in self.dtypes.items()})
+        tmp = f"{self.store}.tmp{os.getpid()}"
+        os.makedirs(tmp, exist_ok=True)
+        for c, t in self.dtypes.items():
+            if t == "str":
+                codes, uniques = pd.factorize(df[c].fillna(""), sort=False)
+                np.save(os.path.join(tmp, f"{c}.npy"), codes.astype(np.int32))
+                with open(os.path.join(tmp, f"{c}.labels.json"), "w", encoding="utf-8") as f:
+                    json.dump([str(u) for u in uniques], f, ensure_ascii=False)
+            else:
+                np.save(os.path.join(tmp, f"{c}.npy"), df[c].to_numpy(dtype=t))
+        open(os.path.join(tmp, "_complete"), "w").close()
+        try:
+            os.rename(tmp, self.store)
+        except OSError:
+            # Another process finished first; its copy is identical.
+            import shutil
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+@dataclass(frozen=True)
+class Dataset:
+    version: str
+    label: str
+    unit: str
+    macro: Macro
+    budget: Budget
+    sources: Tuple[Tuple[str, str], ...]
+    vat: Optional[vat_scenarios.VatModule] = field(compare=False)
+    tables: Dict[str, Table] = field(compare=False, default_factory=dict)
+    files: Tuple[str, ...] = ()
+    loaded_at: float = 0.0
+
+
+# ---- Schema ----
+def _num(obj: dict, key: str, where: str, lo: Optional[float] = None, hi: Optional[float] = None) -> float:
+    if key not in obj:
+        raise DataError(f"{where}.{key}: missing")
+    val = obj[key]
+    if isinstance(val, bool) or not isinstance(val, (int, float)):
+        raise DataError(f"{where}.{key}: expected a number, got {type(val).__name__}")
+    if (lo is not None and val < lo) or (hi is not None and val > hi):
+        raise DataError(f"{where}.{key}: {val} outside [{lo}, {hi}]")
+    return float(val)
+
+
+def _obj(obj, key: str, where: str, kind=dict):
+    if not isinstance(obj, dict) or key not in obj:
+        raise DataError(f"{where}.{key}: missing")
+    if not isinstance(obj[key], kind):
+        raise DataError(f"{where}.{key}: expected {kind.__name__}")
+    return obj[key]
+
+
+def _lines(items: list, where: str) -> Tuple[Tuple[str, float], ...]:
+    out, seen = [], set()
+    for i, item in enumerate(items):
+        w = f"{where}[{i}]"
+        name = _obj(item, "category", w, str).strip()
+        if not name:
+            raise DataError(f"{w}.category: empty")
+        if name in seen:
+            raise DataError(f"{w}.category: duplicate {name!r}")
+        seen.add(name)
+        out.append((name, _num(item, "amount", w, lo=0.0)))
+    if not out:
+        raise DataError(f"{where}: empty")
+    return tuple(out)
+
+
+def parse_budget(doc: dict) -> Tuple[str, str, Macro, Budget, Tuple[Tuple[str, str], ...]]:
+    if not isinstance(doc, dict):
+        raise DataError("budget.json: expected an object")
+    if doc.get("schema") != SCHEMA:
+        raise DataError(f"schema: expected {SCHEMA}, got {doc.get('schema')!r}")
+    m = _obj(doc, "macro", "budget.json")
+    macro = Macro(**{k: _num(m, k, "macro", lo=-1.0 if k not in ("aic_bg", "aic_eu") else 0.0) for k in MACRO_FIELDS})
+    b = _obj(doc, "budget", "budget.json")
+    budget = Budget(
+        gdp=_num(b, "gdp", "budget", lo=1e-9),
+        debt=_num(b, "debt", "budget", lo=0.0),
+        revenues=_lines(_obj(b, "revenues", "budget", list), "budget.revenues"),
+        expenditures=_lines(_obj(b, "expenditures", "budget", list), "budget.expenditures"),
+    )
+    sources = []
+    for i, s in enumerate(_obj(doc, "sources", "budget.json", list)):
+        name = _obj(s, "name", f"sources[{i}]", str).strip()
+        url = _obj(s, "url", f"sources[{i}]", str).strip()
+        if not url.startswith(("https://", "http://")):
+            raise DataError(f"sources[{i}].url: expected http(s) URL, got {url!r}")
+        sources.append((name, url))
+    return str(doc.get("label", "")), str(doc.get("unit", "млрд. €")), macro, budget, tuple(sources)
+
+
+def parse_tables(doc: dict, base: str) -> Dict[str, Tuple[str, Dict[str, str]]]:
+    out = {}
+    for name, spec in (doc.get("tables") or {}).items():
+        where = f"tables.{name}"
+        path = os.path.join(base, _obj(spec, "path", where, str))
+        if not path.endswith((".csv", ".parquet")):
+            raise DataError(f"{where}.path: expected .csv or .parquet")
+        cols = _obj(spec, "columns", where)
+        if not cols:
+            raise DataError(f"{where}.columns: empty")
+        for c, t in cols.items():
+            if t not in COLUMN_TYPES:
+                raise DataError(f"{where}.columns.{c}: type must be one of {', '.join(COLUMN_TYPES)}")
+        out[name] = (path, dict(cols))
+    return out
+
+
+def _digest(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _stat(path: str) -> Optional[Tuple[int, int]]:
+    """(mtime, size), or None for a missing file (a reload waits for it to appear)."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+# ---- Loader ----
+class DataLoader:
+    def __init__(self, path: str = DEFAULT_PATH, check_interval: float = CHECK_INTERVAL, store_dir: str = STORE_DIR):
+        self.path = os.path.abspath(path)
+        self.check_interval = check_interval
+        self.store_dir = store_dir
+        self.last_error: Optional[str] = None
+        self.reloads = 0
+        self._current: Optional[Dataset] = None
+        self._versions: "OrderedDict[str, Dataset]" = OrderedDict()
+        self._stats: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> Dataset:
+        now = time.monotonic()
+        if self._current is None or now - self._checked >= self.check_interval:
+            self.reload()
+        return self._current
+
+    def get(self, version: str) -> Dataset:
+        ds = self._versions.get(version)
+        if ds is None:
+            ds = self.current()
+            if ds.version != version:
+                raise DataError(f"data version {version} is no longer loaded (current {ds.version})")
+        return ds
+
+    def _changed(self) -> bool:
+        return any(_stat(p) != s for p, s in self._stats.items()) or not self._stats
+
+    def reload(self, force: bool = False) -> bool:
+        """Re-read the files if their stat changed; True when a new version was installed."""
+        with self._lock:
+            self._checked = time.monotonic()
+            if not force and self._current is not None and not self._changed():
+                return False
+            stats: Dict[str, Optional[Tuple[int, int]]] = {}
+            try:
+                ds = self._load(stats)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                if self._current is None:
+                    raise DataError(f"cannot load {self.path}: {self.last_error}") from e
+                # Remember what failed: the next attempt waits for one of these files to change again.
+                self._stats = stats
+                log.warning("data reload failed, keeping version %s: %s", self._current.version, self.last_error)
+                return False
+            self._stats = stats
+            self.last_error = None
+            if self._current is not None and ds.version == self._current.version:
+                return False
+            self._current = ds
+            self._versions[ds.version] = ds
+            while len(self._versions) > KEEP_VERSIONS:
+                self._versions.popitem(last=False)
+            self.reloads += 1
+            log.info("data version %s loaded from %s", ds.version, ", ".join(ds.files))
+            return True
+
+    def _load(self, stats: Dict[str, Optional[Tuple[int, int]]]) -> Dataset:
+        """Read every file; `stats` gets each file's stat before it is read, also when loading fails."""
+        stats[self.path] = _stat(self.path)
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        h = hashlib.sha1(raw)
+        doc = json.loads(raw.decode("utf-8"))
+        label, unit, macro, budget, sources = parse_budget(doc)
+        try:
+            # Every FISCAL question builds this model; a file it cannot serve must not become current.
+            budget_engine.BudgetModel.from_budget(budget)
+        except KeyError as e:
+            raise DataError(f"budget: {e.args[0]}") from e
+        base = os.path.dirname(self.path)
+        files = [self.path]
+
+        vat = None
+        if doc.get("scenarios"):
+            vpath = os.path.join(base, doc["scenarios"])
+            stats[vpath] = _stat(vpath)
+            with open(vpath, "rb") as f:
+                vraw = f.read()
+            h.update(vraw)
+            try:
+                vat = vat_scenarios.module_from_dict(json.loads(vraw.decode("utf-8")))
+            except (KeyError, TypeError, ValueError) as e:
+                raise DataError(f"{os.path.basename(vpath)}: invalid scenario file ({type(e).__name__}: {e})") from e
+            files.append(vpath)
+
+        tables = {}
+        for name, (tpath, cols) in parse_tables(doc, base).items():
+            stats[tpath] = _stat(tpath)
+            digest = _digest(tpath)
+            h.update(f"{name}:{digest}:{sorted(cols.items())}".encode("utf-8"))
+            tables[name] = Table(name, tpath, cols, digest, self.store_dir)
+            files.append(tpath)
+
+        version = h.hexdigest()[:12]
+        if self._current is not None and self._current.version == version:
+            return self._current
+        return Dataset(version, label, unit, macro, budget, sources, vat, tables, tuple(files), time.time())
+
+
+LOADER = DataLoader(os.getenv("BGGOVAI_DATA", "").strip() or DEFAULT_PATH)
+
+
+def current() -> Dataset:
+    return LOADER.current()
+
+
+def get(version: str) -> Dataset:
+    return LOADER.get(version)
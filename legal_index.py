@@ -0,0 +1,452 @@
+# -*- coding: utf-8 -*-
+"""Offline full-text index (BM25) over downloaded Държавен вестник issues and parliament bill texts.
+
+    python legal_index.py add downloads/dv/*.html downloads/bills/   # new issues -> one new segment
+    python legal_index.py search "придобиване на българско гражданство"
+    python legal_index.py stats | compact | purge
+
+Ingestion splits every text into article passages ("Чл. 12.", "§ 3."), then
+tokenizes them: lower-case Cyrillic/Latin words, Bulgarian stop words
+dropped, and the light suffix stemmer of Savoy (the one Lucene's
+BulgarianStemmer implements). Articles, plurals and the "ен"/"ъ" vowel
+shifts are folded, so "гражданството", "гражданства" and "гражданство" all
+meet.
+
+The index is a directory of immutable segments plus an atomic manifest.
+Each `add` writes one new segment for the files it has not seen (by
+content hash), so a new issue never triggers a rebuild. `compact` merges
+the segments when there are many. The merged-away segments are listed as
+"retired" in the manifest and deleted by a later `add` or `compact` once
+RETIRE_GRACE has passed, so a reader that just read the old manifest can
+still open them. A segment is flat .npy arrays:
+
+    term_hash  int64, sorted      (64-bit hash of the stemmed term)
+    offsets    int64              postings of term i: [offsets[i], offsets[i+1])
+    doc_ids    int32, tfs uint16  postings, grouped by term
+    doc_len    int32              tokens per passage (BM25 length norm)
+    text_off   int64, text uint8  passage records, UTF-8
+
+Everything opens with np.load(mmap_mode="r"). Startup builds no dict, and a
+term lookup is one searchsorted per segment. Queries touch only the
+postings of their terms, so processes share the OS page cache. BM25 uses
+corpus-wide document frequencies and average length across segments.
+"""
+import argparse
+import hashlib
+import html
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+INDEX_DIR = os.getenv("BGGOVAI_LEGAL_INDEX", os.path.join(ROOT, "legal_index"))
+MANIFEST = "manifest.json"
+K1, B = 1.2, 0.75
+CHECK_INTERVAL = 1.0        # seconds between manifest stat() checks
+RETIRE_GRACE = 60.0         # seconds a compacted-away segment stays on disk for readers of the old manifest
+SEP = "\x1f"                # between source, title, article and text inside a record
+
+STOPWORDS = frozenset("""
+а аз ако ала би бил била били било бъде в вас ваш ваша вече все всеки всички всяка всяко във въпреки
+г где да дали до докато дори е едва ето за зад заедно защо защото и из или им има ими как каква какво
+като ква кога когато кое които кой който колко която което към ли м между мен ми му н на над най напр
+например не него нея ни ние никой нито но о обаче около от отгоре отдолу откакто пак по под поради
+после при пред преди през с са само се си сме според сред срещу сте след сега със т та такива такъв
+тази така те тези ти то това тогава този той толкова точно тук тъй тя тях у че чрез ще щом
+""".split())
+_WORD = re.compile(r"[0-9a-zа-яѐ-ӿ]+")
+_ARTICLE = re.compile(r"(?m)^[ \t]*((?:Чл\.|§)[ \t]*\d+[а-я]?\.?)")
+_TAG = re.compile(r"<(script|style)\b.*?</\1>|<[^>]+>", re.S | re.I)
+_BLOCK = re.compile(r"<(?:br|/p|/div|/li|/h\d|/tr)\b[^>]*>", re.I)
+
+
+# ---- Text processing ----
+def _article(w: str) -> str:
+    n = len(w)
+    if n > 6 and w.endswith("ият"):
+        return w[:-3]
+    if n > 5 and w.endswith(("ът", "то", "те", "та", "ия")):
+        return w[:-2]
+    if n > 4 and w.endswith("ят"):
+        return w[:-2]
+    return w
+
+
+def _plural(w: str) -> str:
+    n = len(w)
+    if n > 6:
+        if w.endswith("овци"):
+            return w[:-3]
+        if w.endswith("ове"):
+            return w[:-3]
+        if w.endswith("еве"):
+            return w[:-3] + "й"
+    if n > 5:
+        if w.endswith("ища"):
+            return w[:-3]
+        if w.endswith("та"):
+            return w[:-2]
+        if w.endswith("ци"):
+            return w[:-2] + "к"
+        if w.endswith("зи"):
+            return w[:-2] + "г"
+        if w[-3] == "е" and w[-1] == "и":
+            return w[:-3] + "я" + w[-2]
+    if n > 4:
+        if w.endswith("си"):
+            return w[:-2] + "х"
+        if w.endswith("и"):
+            return w[:-1]
+    return w
+
+
+def stem(w: str) -> str:
+    """Savoy's light stemmer for Bulgarian (articles, plurals, final vowels)."""
+    if len(w) < 4:
+        return w
+    if len(w) > 5 and w.endswith("ища"):
+        return w[:-3]
+    w = _plural(_article(w))
+    if len(w) > 3:
+        if w.endswith("я"):
+            w = w[:-1]
+        if w.endswith(("а", "о", "е")):
+            w = w[:-1]
+    if len(w) > 4 and w.endswith("ен"):
+        w = w[:-2] + "н"
+    if len(w) > 5 and w[-2] == "ъ":
+        w = w[:-2] + w[-1]
+    return w
+
+
+def tokenize(text: str) -> List[str]:
+    return [stem(w) for w in _WORD.findall(text.lower().replace("ѝ", "и")) if w not in STOPWORDS]
+
+
+def term_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+def read_text(path: str) -> str:
+    with open(path, "rb") as f:
+        raw = f.read()
+    try:
+        text = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        text = raw.decode("cp1251", errors="replace")     # older DV / parliament exports
+    if path.lower().endswith((".htm", ".html")):
+        text = html.unescape(_TAG.sub(" ", _BLOCK.sub("\n", text)))
+    return text
+
+
+def passages(text: str, source: str) -> Iterator[Tuple[str, str, str, str]]:
+    """(source, title, article, text) per article; text before the first article is kept as "Увод"."""
+    lines = [" ".join(ln.split()) for ln in text.splitlines()]
+    title = next((ln for ln in lines if ln), os.path.basename(source))[:200]
+    body = "\n".join(ln for ln in lines if ln)
+    heads = list(_ARTICLE.finditer(body))
+    intro = body[:heads[0].start()] if heads else body
+    if intro.strip():
+        yield source, title, "Увод", intro.strip()
+    for i, m in enumerate(heads):
+        end = heads[i + 1].start() if i + 1 < len(heads) else len(body)
+        yield source, title, re.sub(r"\s+", " ", m.group(1)).rstrip("."), body[m.end():end].strip()
+
+
+def iter_files(paths: Iterable[str]) -> Iterator[str]:
+    for p in paths:
+        if os.path.isdir(p):
+            for root, _, files in os.walk(p):
+                for name in sorted(files):
+                    if name.lower().endswith((".txt", ".htm", ".html")):
+                        yield os.path.join(root, name)
+        else:
+            yield p
+
+
+# ---- Segments ----
+@dataclass(frozen=True)
+class Passage:
+    source: str
+    title: str
+    article: str
+    text: str
+    score: float
+
+
+def write_segment(path: str, records: Sequence[Tuple[str, str, str, str]]) -> Tuple[int, int]:
+    """Build one immutable segment directory from passage records; returns (docs, tokens)."""
+    vocab: Dict[str, int] = {}
+    terms: List[int] = []
+    docs: List[int] = []
+    tfs: List[int] = []
+    doc_len = np.zeros(len(records), dtype=np.int32)
+    for d, (_, title, article, text) in enumerate(records):
+        tokens = tokenize(f"{article} {text}")
+        doc_len[d] = len(tokens)
+        for t, c in Counter(tokens).items():
+            terms.append(vocab.setdefault(t, len(vocab)))
+            docs.append(d)
+            tfs.append(min(c, 65535))
+    hashes = np.array([term_hash(t) for t in vocab], dtype=np.int64)
+    posting_hash = hashes[np.asarray(terms, dtype=np.int64)] if terms else np.zeros(0, dtype=np.int64)
+    blob = [SEP.join(r).encode("utf-8") for r in records]
+    _save(path, posting_hash, np.asarray(docs, dtype=np.int32), np.asarray(tfs, dtype=np.uint16), doc_len, blob)
+    return len(records), int(doc_len.sum())
+
+
+def _save(path: str, posting_hash: np.ndarray, docs: np.ndarray, tfs: np.ndarray, doc_len: np.ndarray,
+          blob: Sequence[bytes]) -> None:
+    order = np.lexsort((docs, posting_hash))
+    uniq, starts = np.unique(posting_hash[order], return_index=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    os.makedirs(tmp, exist_ok=True)
+    np.save(os.path.join(tmp, "term_hash.npy"), uniq)
+    np.save(os.path.join(tmp, "offsets.npy"), np.append(starts, len(order)).astype(np.int64))
+    np.save(os.path.join(tmp, "doc_ids.npy"), docs[order])
+    np.save(os.path.join(tmp, "tfs.npy"), tfs[order])
+    np.save(os.path.join(tmp, "doc_len.npy"), doc_len)
+    np.save(os.path.join(tmp, "text_off.npy"), np.cumsum([0] + [len(b) for b in blob], dtype=np.int64))
+    np.save(os.path.join(tmp, "text.npy"), np.frombuffer(b"".join(blob), dtype=np.uint8))
+    os.replace(tmp, path)
+
+
+class Segment:
+    FILES = ("term_hash", "offsets", "doc_ids", "tfs", "doc_len", "text_off", "text")
+
+    def __init__(self, path: str):
+        self.path = path
+        for name in self.FILES:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    def postings(self, h: int) -> Tuple[np.ndarray, np.ndarray]:
+        i = int(np.searchsorted(self.term_hash, h))
+        if i == len(self.term_hash) or self.term_hash[i] != h:
+            return self.doc_ids[:0], self.tfs[:0]
+        lo, hi = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self.doc_ids[lo:hi], self.tfs[lo:hi]
+
+    def record(self, doc: int) -> Tuple[str, str, str, str]:
+        raw = bytes(self.text[int(self.text_off[doc]):int(self.text_off[doc + 1])]).decode("utf-8")
+        source, title, article, text = raw.split(SEP, 3)
+        return source, title, article, text
+
+
+# ---- Index ----
+class LegalIndex:
+    def __init__(self, path: str = INDEX_DIR, check_interval: float = CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._stat: Optional[Tuple[int, int]] = None
+        self._checked = float("-inf")
+        self._state: Tuple[dict, Tuple[Segment, ...]] = ({"segments": []}, ())
+
+    @property
+    def manifest(self) -> dict:
+        return self._state[0]
+
+    @property
+    def segments(self) -> Tuple[Segment, ...]:
+        return self._state[1]
+
+    # -- reading --
+    def _manifest_path(self) -> str:
+        return os.path.join(self.path, MANIFEST)
+
+    def refresh(self, force: bool = False) -> None:
+        """Pick up segments written by another process (`add` / `compact`); stat() at most every check_interval."""
+        now = time.monotonic()
+        if not force and now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        try:
+            st = os.stat(self._manifest_path())
+        except FileNotFoundError:
+            self._state, self._stat = ({"segments": []}, ()), None
+            return
+        stat = (st.st_mtime_ns, st.st_size)
+        if stat == self._stat and not force:
+            return
+        with self._lock:
+            for attempt in range(2):
+                with open(self._manifest_path(), encoding="utf-8") as f:
+                    manifest = json.load(f)
+                try:
+                    segments = tuple(Segment(os.path.join(self.path, s["name"])) for s in manifest["segments"])
+                    break
+                except FileNotFoundError:
+                    # Stalled past RETIRE_GRACE on a manifest a writer has since replaced: read the new one.
+                    if attempt:
+                        raise
+            self._state, self._stat = (manifest, segments), stat     # one swap: searches see a consistent pair
+
+    @property
+    def docs(self) -> int:
+        return sum(s["docs"] for s in self.manifest["segments"])
+
+    def __bool__(self) -> bool:
+        self.refresh()
+        return bool(self.segments)
+
+    def search(self, query: str, k: int = 5) -> List[Passage]:
+        self.refresh()
+        manifest, segments = self._state
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not segments or not terms:
+            return []
+        n = sum(s["docs"] for s in manifest["segments"])
+        avgdl = max(sum(s["tokens"] for s in manifest["segments"]) / max(n, 1), 1.0)
+        hits = [[seg.postings(term_hash(t)) for t in terms] for seg in segments]
+        df = np.array([sum(len(h[j][0]) for h in hits) for j in range(len(terms))], dtype=float)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        best: List[Tuple[float, int, int]] = []
+        for si, (seg, postings) in enumerate(zip(segments, hits)):
+            if not any(len(d) for d, _ in postings):
+                continue
+            scores = np.zeros(len(seg), dtype=np.float32)
+            norm = K1 * (1.0 - B + B * np.asarray(seg.doc_len, dtype=np.float32) / avgdl)
+            for j, (docs, tf) in enumerate(postings):
+                if len(docs):
+                    tf = tf.astype(np.float32)
+                    scores[docs] += idf[j] * tf * (K1 + 1.0) / (tf + norm[docs])
+            # Everything tied with the k-th score: ties then go by document order, the same before and after compact.
+            kth = np.partition(scores, len(scores) - min(k, len(scores)))[len(scores) - min(k, len(scores))]
+            top = np.flatnonzero((scores >= kth) & (scores > 0))
+            best += [(float(scores[d]), si, int(d)) for d in top]
+        best.sort(key=lambda x: (-x[0], x[1], x[2]))
+        return [Passage(*segments[si].record(d), score) for score, si, d in best[:k]]
+
+    # -- writing (offline; one writer at a time) --
+    def _write_manifest(self, manifest: dict) -> None:
+        tmp = f"{self._manifest_path()}.tmp{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self._manifest_path())
+        self.refresh(force=True)
+
+    def _next_name(self) -> str:
+        used = [int(s["name"].split("-")[1]) for s in self.manifest["segments"] + self.manifest.get("retired", [])]
+        return f"seg-{max(used, default=0) + 1:06d}"
+
+    def add(self, paths: Iterable[str]) -> dict:
+        """Index files not seen before (by content hash) into one new segment."""
+        os.makedirs(self.path, exist_ok=True)
+        self.refresh(force=True)
+        self.purge()
+        seen = {f["sha1"] for s in self.manifest["segments"] for f in s["files"]}
+        records, files = [], []
+        for path in iter_files(paths):
+            with open(path, "rb") as f:
+                digest = hashlib.sha1(f.read()).hexdigest()
+            if digest in seen:
+                continue
+            seen.add(digest)
+            rel = os.path.relpath(path, ROOT) if os.path.abspath(path).startswith(ROOT) else path
+            records += passages(read_text(path), rel)
+            files.append({"path": rel, "sha1": digest})
+        if not records:
+            return {"files": 0, "docs": 0}
+        name = self._next_name()
+        docs, tokens = write_segment(os.path.join(self.path, name), records)
+        entry = {"name": name, "docs": docs, "tokens": tokens, "files": files}
+        self._write_manifest({**self.manifest, "segments": self.manifest["segments"] + [entry]})
+        return {"files": len(files), "docs": docs, "segment": name}
+
+    def compact(self) -> Optional[str]:
+        """Merge all segments into one (postings are concatenated, not re-tokenized)."""
+        self.refresh(force=True)
+        self.purge()
+        if len(self.segments) < 2:
+            return None
+        hashes, docs, tfs, lens, blob, base = [], [], [], [], [], 0
+        for seg in self.segments:
+            counts = np.diff(np.asarray(seg.offsets))
+            hashes.append(np.repeat(np.asarray(seg.term_hash), counts))
+            docs.append(np.asarray(seg.doc_ids) + base)
+            tfs.append(np.asarray(seg.tfs))
+            lens.append(np.asarray(seg.doc_len))
+            text, off = bytes(seg.text), np.asarray(seg.text_off)
+            blob += [text[a:b] for a, b in zip(off[:-1], off[1:])]
+            base += len(seg)
+        name = self._next_name()
+        _save(os.path.join(self.path, name), np.concatenate(hashes), np.concatenate(docs).astype(np.int32),
+              np.concatenate(tfs), np.concatenate(lens), blob)
+        old = self.manifest["segments"]
+        entry = {"name": name, "docs": sum(s["docs"] for s in old), "tokens": sum(s["tokens"] for s in old),
+                 "files": [f for s in old for f in s["files"]]}
+        retired = self.manifest.get("retired", []) + [{"name": s["name"], "at": time.time()} for s in old]
+        self._write_manifest({**self.manifest, "segments": [entry], "retired": retired})
+        return name
+
+    def purge(self, grace: float = RETIRE_GRACE) -> List[str]:
+        """Delete the retired segments older than `grace` s; readers of a newer manifest never open them."""
+        now = time.time()
+        retired = self.manifest.get("retired", [])
+        gone = [r for r in retired if now - r["at"] >= grace]
+        if not gone:
+            return []
+        self._write_manifest({**self.manifest, "retired": [r for r in retired if r not in gone]})
+        # Processes that still have the old segments mapped keep working; the space is freed once they close.
+        for r in gone:
+            shutil.rmtree(os.path.join(self.path, r["name"]), ignore_errors=True)
+        return [r["name"] for r in gone]
+
+
+INDEX = LegalIndex()
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--index", default=INDEX_DIR)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    a = sub.add_parser("add", help="index new .txt/.html files or directories")
+    a.add_argument("paths", nargs="+")
+    s = sub.add_parser("search")
+    s.add_argument("query")
+    s.add_argument("-k", type=int, default=5)
+    sub.add_parser("stats")
+    sub.add_parser("compact", help="merge all segments into one")
+    sub.add_parser("purge", help=f"delete segments retired by compact more than {RETIRE_GRACE:g} s ago")
+    args = ap.parse_args(argv)
+
+    index = LegalIndex(args.index)
+    if args.cmd == "add":
+        t = time.perf_counter()
+        res = index.add(args.paths)
+        print(f"{res['files']} new file(s), {res['docs']} passages in {time.perf_counter() - t:.2f} s"
+              + (f" -> {res['segment']}" if res.get("segment") else ""))
+    elif args.cmd == "search":
+        t = time.perf_counter()
+        hits = index.search(args.query, args.k)
+        print(f"{len(hits)} hit(s) in {(time.perf_counter() - t) * 1000:.2f} ms")
+        for p in hits:
+            print(f"\n[{p.score:.2f}] {p.article} — {p.title} ({p.source})\n{p.text[:400]}")
+    elif args.cmd == "stats":
+        index.refresh(force=True)
+        m = index.manifest["segments"]
+        print(f"{len(m)} segment(s), {sum(s['docs'] for s in m)} passages, "
+              f"{sum(len(s['files']) for s in m)} files, {sum(s['tokens'] for s in m)} tokens, "
+              f"{len(index.manifest.get('retired', []))} retired")
+    elif args.cmd == "compact":
+        print(index.compact() or "nothing to compact")
+    elif args.cmd == "purge":
+        index.refresh(force=True)
+        print(" ".join(index.purge()) or "nothing to purge")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""Thin helpers around the OpenAI v1 chat completions API (blocking and streaming).
+
+Clients are pooled per process: one OpenAI client (and its keep-alive
+httpx connection pool) per distinct ClientConfig, shared by every Streamlit
+session and thread. Retries with exponential backoff are done by the SDK
+(max_retries).
+
+hedged() bounds the wait of one request (CallPolicy). When the first attempt
+has not answered after the hedge delay, one duplicate is sent and the first
+answer wins. By default the delay is the p95 of recent single attempts, so
+about 1 request in 20 is hedged. After the deadline the caller gets
+DeadlineExceeded and can answer otherwise. Attempts still running are not
+cancelled: they finish in the background, and `on_late` receives what they
+return.
+"""
+import contextvars
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+import metrics
+
+# OpenAI SDK v1+, imported on first use: it pulls in httpx + pydantic (~0.4 s),
+# which a Streamlit rerun without an AI call should not pay. See load_sdk().
+httpx = None
+OpenAI = None
+_SDK_MISSING = False
+
+TEMPERATURE = 0.2
+DEADLINE = 30.0             # seconds to an answer (first token when streaming); OPENAI_DEADLINE overrides
+HEDGE_MIN_SAMPLES = 20      # attempts seen before the p95 replaces HEDGE_DEFAULT
+HEDGE_DEFAULT = 0.5         # share of the deadline before the first hedge while p95 is unknown
+HEDGE_FLOOR = 0.2           # seconds; never hedge earlier than this
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class ClientConfig:
+    api_key: str
+    base_url: Optional[str] = None      # e.g. a local OpenAI-compatible stub
+    max_connections: int = 20
+    max_keepalive: int = 10
+    keepalive_expiry: float = 60.0
+    timeout: float = 60.0
+    connect_timeout: float = 5.0
+    max_retries: int = 2
+
+    @classmethod
+    def from_lookup(cls, lookup: Callable[[str], Optional[str]] = os.getenv) -> Optional["ClientConfig"]:
+        """Build from OPENAI_* settings; `lookup` returns None for unset names."""
+        key = (lookup("OPENAI_API_KEY") or "").strip()
+        if not key:
+            return None
+
+        def num(name: str, default, cast):
+            val = lookup(name)
+            return cast(val) if val not in (None, "") else default
+
+        return cls(
+            api_key=key,
+            base_url=(lookup("OPENAI_BASE_URL") or "").strip() or None,
+            max_connections=num("OPENAI_MAX_CONNECTIONS", cls.max_connections, int),
+            max_keepalive=num("OPENAI_MAX_KEEPALIVE", cls.max_keepalive, int),
+            timeout=num("OPENAI_TIMEOUT", cls.timeout, float),
+            connect_timeout=num("OPENAI_CONNECT_TIMEOUT", cls.connect_timeout, float),
+            max_retries=num("OPENAI_MAX_RETRIES", cls.max_retries, int),
+        )
+
+
+class DeadlineExceeded(TimeoutError):
+    """No attempt answered before the request's deadline."""
+
+
+def _seconds(raw: str, default: Optional[float]) -> Optional[float]:
+    # A malformed setting means the default rather than an error on every AI call.
+    try:
+        return float(raw)
+    except ValueError:
+        return default
+
+
+@dataclass(frozen=True)
+class CallPolicy:
+    deadline: Optional[float] = DEADLINE    # None: wait as long as the SDK does
+    hedge_after: Optional[float] = None     # seconds; None: adaptive p95 of recent attempts
+    hedge: bool = True
+
+    @classmethod
+    def from_lookup(cls, lookup: Callable[[str], Optional[str]] = os.getenv) -> "CallPolicy":
+        """OPENAI_DEADLINE (seconds, 0 = none) and OPENAI_HEDGE_AFTER (seconds, "p95" or "off")."""
+        deadline = (lookup("OPENAI_DEADLINE") or "").strip()
+        hedge = (lookup("OPENAI_HEDGE_AFTER") or "").strip().lower()
+        return cls(
+            deadline=(_seconds(deadline, DEADLINE) or None) if deadline else DEADLINE,
+            hedge_after=_seconds(hedge, None) if hedge not in ("", "p95", "off", "0") else None,
+            hedge=hedge not in ("off", "0"),
+        )
+
+    def hedge_delay(self, stat: str) -> Optional[float]:
+        """Seconds before the duplicate attempt: fixed, or the p95 of the `stat` histogram."""
+        if not self.hedge:
+            return None
+        if self.hedge_after is not None:
+            return self.hedge_after
+        h = metrics.REGISTRY.histogram(stat)
+        if h.snapshot()["count"] < HEDGE_MIN_SAMPLES:
+            return self.deadline * HEDGE_DEFAULT if self.deadline is not None else None
+        return max(HEDGE_FLOOR, h.quantiles((0.95,))[0.95])
+
+    def after(self, elapsed: float) -> "CallPolicy":
+        """The same policy with `elapsed` seconds of the deadline used up."""
+        return self if self.deadline is None else replace(self, deadline=max(0.0, self.deadline - elapsed))
+
+
+def hedged(attempt: Callable[[], T], policy: CallPolicy, stat: str = "ai_attempt",
+           on_late: Optional[Callable[[T], None]] = None) -> Tuple[T, bool]:
+    """(first successful result, True if the hedge won). Raises the last error when every attempt failed,
+    DeadlineExceeded at the deadline. A result nobody takes any more goes to `on_late`."""
+    cond = threading.Condition()
+    state = {"winner": None, "value": None, "errors": [], "started": 0, "closed": False}
+
+    def run(i: int) -> None:
+        t0 = time.perf_counter()
+        try:
+            value = attempt()
+        except Exception as e:
+            with cond:
+                state["errors"].append(e)
+                cond.notify_all()
+            return
+        metrics.REGISTRY.observe(stat, time.perf_counter() - t0)
+        with cond:
+            if state["winner"] is None and not state["closed"]:
+                state["winner"], state["value"] = i, value
+                cond.notify_all()
+                return
+        if on_late is not None:
+            on_late(value)
+
+    def launch() -> None:
+        i = state["started"]
+        state["started"] += 1
+        # Copy the context so usage annotations land on the caller's trace.
+        threading.Thread(target=contextvars.copy_context().run, args=(run, i), name=f"llm-attempt-{i}",
+                         daemon=True).start()
+
+    start = time.monotonic()
+    delay = policy.hedge_delay(stat)
+    end = start + policy.deadline if policy.deadline is not None else None
+    with cond:
+        metrics.hedge_attempt()
+        launch()
+        while True:
+            if state["winner"] is not None:
+                won = state["winner"] > 0
+                if won:
+                    metrics.hedge_won()
+                return state["value"], won
+            if len(state["errors"]) == state["started"]:
+                raise state["errors"][-1]       # the SDK has retried each attempt already
+            now = time.monotonic()
+            if end is not None and now >= end:
+                state["closed"] = True
+                raise DeadlineExceeded(f"no answer within {policy.deadline:g} s")
+            if state["started"] == 1 and delay is not None and now >= start + delay:
+                metrics.hedge_sent()
+                launch()
+                continue
+            wake = [t for t in (end, start + delay if delay is not None and state["started"] == 1 else None)
+                    if t is not None]
+            cond.wait(min(wake) - now if wake else None)
+
+
+def load_sdk() -> bool:
+    """Import httpx and the OpenAI SDK once; False if they are not installed."""
+    global httpx, OpenAI, _SDK_MISSING
+    if OpenAI is None and not _SDK_MISSING:
+        try:
+            import httpx as _httpx
+            from openai import OpenAI as _OpenAI
+        except Exception:
+            _SDK_MISSING = True
+            return False
+        httpx, OpenAI = _httpx, _OpenAI
+    return OpenAI is not None
+
+
+_CLIENTS: Dict[ClientConfig, "OpenAI"] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def build_client(config: ClientConfig) -> "OpenAI":
+    if not load_sdk():
+        raise RuntimeError("openai package is not installed")
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive,
+            keepalive_expiry=config.keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(config.timeout, connect=config.connect_timeout),
+    )
+    return OpenAI(
+        api_key=config.api_key,
+        base_url=config.base_url,
+        max_retries=config.max_retries,
+        http_client=http_client,
+    )
+
+
+def get_client(config: Optional[ClientConfig]) -> Optional["OpenAI"]:
+    """Process-wide pooled client for `config` (None if openai is missing or no key is set)."""
+    if config is None or not load_sdk():
+        return None
+    client = _CLIENTS.get(config)
+    if client is not None:
+        return client
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(config)
+        if client is None:
+            try:
+                client = build_client(config)
+            except Exception:
+                return None
+            _CLIENTS[config] = client
+    return client
+
+
+def close_clients() -> None:
+    with _CLIENTS_LOCK:
+        for client in _CLIENTS.values():
+            client.close()
+        _CLIENTS.clear()
+
+
+def messages(system: str, user: str) -> List[dict]:
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user},
+    ]
+
+
+def complete(client, system: str, user: str, model: str) -> str:
+    resp = client.chat.completions.create(
+        model=model,
+        messages=messages(system, user),
+        temperature=TEMPERATURE,
+    )
+    metrics.record_usage(model, getattr(resp, "usage", None))
+    return (resp.choices[0].message.content or "").strip()
+
+
+def first_delta(deltas: Iterator[str]) -> Tuple[str, Iterator[str]]:
+    """Wait for the first delta of a stream: (delta, the rest). Lets hedged() race streams to the first token."""
+    for delta in deltas:
+        return delta, deltas
+    return "", deltas
+
+
+def stream(client, system: str, user: str, model: str) -> Iterator[str]:
+    """Yield content deltas as they arrive."""
+    resp = client.chat.completions.create(
+        model=model,
+        messages=messages(system, user),
+        temperature=TEMPERATURE,
+        stream=True,
+        stream_options={"include_usage": True},    # final chunk carries token usage
+    )
+    try:
+        for chunk in resp:
+            if getattr(chunk, "usage", None) is not None:
+                metrics.record_usage(model, chunk.usage)
+            if chunk.choices:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+    finally:
+        resp.close()
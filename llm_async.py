@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""asyncio fan-out for AI calls: bounded concurrency plus a token-bucket rate limit.
+
+Used for two things the blocking path cannot do:
+
+- answer_sections(): the five answer sections of SYSTEM_PROMPT are
+  generated as independent completions in parallel and merged, so latency
+  is that of the slowest section rather than the sum.
+- run_batch(): many questions processed concurrently, results in input order.
+
+Answers go through the same ai_cache as the blocking path; its (SQLite)
+calls run in a worker thread, off the event loop. Each completion follows
+the same llm.CallPolicy as the blocking path: a duplicate request after the
+hedge delay and llm.DeadlineExceeded at the deadline. Identical completions
+in flight on the executor are coalesced into one upstream request.
+"""
+import asyncio
+import re
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional, TypeVar
+
+import llm
+import metrics
+from ai_cache import RESPONSES, cache_key
+
+T = TypeVar("T")
+
+SECTIONS = ("Резюме", "Анализ", "Ефект върху хората и бизнеса", "Рискове", "Какво да се провери + източници")
+
+
+class TokenBucket:
+    """`rate` requests per second on average, bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = float(rate)
+        self.capacity = float(max(burst, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self.tokens) / self.rate)
+
+
+def section_prompt(system: str, index: int) -> str:
+    return (system + f"\n\nНапиши САМО раздел „{index}) {SECTIONS[index - 1]}“ от формата — "
+            "без заглавие и без останалите раздели.")
+
+
+def merge_sections(parts: Iterable[str]) -> str:
+    out = []
+    for i, text in enumerate(parts, 1):
+        name = SECTIONS[i - 1]
+        # Models sometimes repeat the heading they were asked to omit.
+        body = re.sub(rf"^\s*{i}\)\s*{re.escape(name)}\s*:?\s*", "", text or "").strip()
+        out.append(f"{i}) {name}\n{body}")
+    return "\n\n".join(out)
+
+
+class AsyncLLM:
+    def __init__(self, config: Optional[llm.ClientConfig], concurrency: int = 8, rate: float = 10.0,
+                 burst: int = 10, cache=RESPONSES, policy: llm.CallPolicy = llm.CallPolicy()):
+        self.config = config
+        self.cache = cache
+        self.concurrency = concurrency
+        self.policy = policy
+        self._sem = asyncio.Semaphore(concurrency)
+        self._bucket = TokenBucket(rate, burst)
+        self._client = None
+        self._flights: Dict[str, asyncio.Future] = {}
+
+    @property
+    def active(self) -> bool:
+        return self.config is not None and llm.load_sdk()
+
+    def _get_client(self):
+        # AsyncOpenAI is bound to the running event loop, so it is owned by the executor.
+        if self._client is None:
+            # Imported on first use, like the blocking client (llm.load_sdk()).
+            from openai import AsyncOpenAI
+            httpx = llm.httpx
+            c = self.config
+            self._client = AsyncOpenAI(
+                api_key=c.api_key,
+                base_url=c.base_url,
+                max_retries=c.max_retries,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=max(c.max_connections, self.concurrency),
+                                        max_keepalive_connections=max(c.max_keepalive, self.concurrency),
+                                        keepalive_expiry=c.keepalive_expiry),
+                    timeout=httpx.Timeout(c.timeout, connect=c.connect_timeout),
+                ),
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    async def __aenter__(self) -> "AsyncLLM":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def _attempt(self, system: str, user: str, model: str) -> str:
+        async with self._sem:
+            await self._bucket.acquire()
+            t0 = time.perf_counter()
+            resp = await self._get_client().chat.completions.create(
+                model=model,
+                messages=llm.messages(system, user),
+                temperature=llm.TEMPERATURE,
+            )
+        metrics.REGISTRY.observe("ai_attempt", time.perf_counter() - t0)
+        metrics.record_usage(model, getattr(resp, "usage", None))
+        return (resp.choices[0].message.content or "").strip()
+
+    async def hedged(self, attempt: Callable[[], Awaitable[T]]) -> T:
+        """llm.hedged for coroutines: first successful attempt wins, the other one is cancelled."""
+        policy, loop = self.policy, asyncio.get_running_loop()
+        start = loop.time()
+        end = start + policy.deadline if policy.deadline is not None else None
+        delay = policy.hedge_delay("ai_attempt")
+        metrics.hedge_attempt()
+        first = asyncio.ensure_future(attempt())
+        running, hedge, error = {first}, None, None
+        try:
+            while running:
+                wake = [t for t in (end, start + delay if delay is not None and hedge is None else None)
+                        if t is not None]
+                done, running = await asyncio.wait(running, timeout=max(0.0, min(wake) - loop.time()) if wake
+                                                   else None, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            metrics.hedge_won()
+                        return task.result()
+                    error = task.exception()
+                if not running:
+                    break       # every attempt failed (the SDK has retried each already)
+                now = loop.time()
+                if end is not None and now >= end:
+                    raise llm.DeadlineExceeded(f"no answer within {policy.deadline:g} s")
+                if hedge is None and delay is not None and now >= start + delay:
+                    metrics.hedge_sent()
+                    hedge = asyncio.ensure_future(attempt())
+                    running.add(hedge)
+            raise error
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def complete(self, system: str, user: str, model: str) -> str:
+        key = cache_key(system, user, model)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            return cached
+        if not self.active:
+            raise RuntimeError("AI is not configured (OPENAI_API_KEY or openai package missing)")
+        flight = self._flights.get(key)
+        if flight is not None:
+            metrics.coalesced("async")
+            return await asyncio.shield(flight)
+        flight = self._flights[key] = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting: mark a failure as retrieved so asyncio does not log it.
+        flight.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            result = await self.hedged(lambda: self._attempt(system, user, model))
+            if result:
+                await asyncio.to_thread(self.cache.set, key, result)
+            flight.set_result(result)
+            return result
+        except Exception as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            if not flight.done():
+                flight.cancel()     # the leader was cancelled: so are its followers
+            del self._flights[key]
+
+    async def answer_sections(self, system: str, user: str, model: str) -> str:
+        parts = await asyncio.gather(*(self.complete(section_prompt(system, i), user, model)
+                                       for i in range(1, len(SECTIONS) + 1)))
+        return merge_sections(parts)
+
+    async def run_batch(self, jobs: Iterable, worker, window: Optional[int] = None) -> AsyncIterator:
+        """Run `await worker(job)` concurrently and yield results in input order (bounded look-ahead)."""
+        window = window or self.concurrency * 4
+        pending: deque = deque()
+        for job in jobs:
+            pending.append(asyncio.ensure_future(worker(job)))
+            if len(pending) >= window:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+
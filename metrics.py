@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+"""Per-stage latency and AI usage metrics for the pipeline.
+
+    with metrics.stage("apply_policy"):        # or @metrics.timed("apply_policy")
+        ...
+    trace = metrics.begin("app", intent=...)    # per question / rerun
+    ...
+    metrics.finish(trace)                       # -> JSON log line, trace.as_dict()
+
+Stages are timed with time.perf_counter_ns() while a trace is active in
+the current context (contextvars: per Streamlit script thread, per asyncio
+task). Each span lands in the trace, for the per-request breakdown, and in
+the process-wide REGISTRY: Prometheus histogram buckets plus the last
+RECENT samples per stage for exact p50/p95/p99. Export:
+
+- REGISTRY.prometheus(): Prometheus text format; serve(port) exposes it on
+  /metrics (and JSON on /metrics.json). The app starts it when
+  BGGOVAI_METRICS_PORT is set.
+- JSON log lines on the "bggovai.metrics" logger, one per finished trace;
+  BGGOVAI_METRICS_LOG=- (stderr) or a file path attaches a handler.
+
+Token cost uses BGGOVAI_PRICE_PROMPT / BGGOVAI_PRICE_COMPLETION (USD per
+1M tokens), if set.
+"""
+import bisect
+import contextvars
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+# Upper bounds in seconds, 10 µs .. 60 s.
+BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+RECENT = 1024
+PREFIX = "bggovai"
+
+log = logging.getLogger("bggovai.metrics")
+
+
+def quantile(sorted_xs: List[float], q: float) -> float:
+    if not sorted_xs:
+        return math.nan
+    k = (len(sorted_xs) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_xs) - 1)
+    return sorted_xs[lo] + (sorted_xs[hi] - sorted_xs[lo]) * (k - lo)
+
+
+class Histogram:
+    """Prometheus-style buckets plus the last RECENT samples for exact quantiles.
+
+    observe() only appends to a pending deque (atomic under the GIL, ~0.1 µs);
+    samples are folded into the buckets when read or every FOLD_EVERY samples.
+    """
+    FOLD_EVERY = 4096
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.bounds = buckets
+        self.counts = [0] * (len(buckets) + 1)      # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.recent: deque = deque(maxlen=RECENT)
+        self._pending: deque = deque()
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        self._pending.append(seconds)
+        if len(self._pending) >= self.FOLD_EVERY:
+            self._fold()
+
+    def _fold(self) -> None:
+        with self._lock:
+            pending, bounds, counts = self._pending, self.bounds, self.counts
+            while pending:
+                x = pending.popleft()
+                counts[bisect.bisect_left(bounds, x)] += 1
+                self.sum += x
+                self.count += 1
+                self.recent.append(x)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self.counts = [0] * (len(self.bounds) + 1)
+            self.sum = 0.0
+            self.count = 0
+            self.recent.clear()
+
+    def quantiles(self, qs=QUANTILES) -> Dict[float, float]:
+        self._fold()
+        with self._lock:
+            xs = sorted(self.recent)
+        return {q: quantile(xs, q) for q in qs}
+
+    def snapshot(self) -> dict:
+        self._fold()
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        return {"count": count, "sum": total, "buckets": counts}
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")  # noqa: E731
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+class Registry:
+    def __init__(self):
+        self.stages: Dict[str, Histogram] = {}
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage: str) -> Histogram:
+        h = self.stages.get(stage)
+        if h is None:
+            with self._lock:
+                h = self.stages.setdefault(stage, Histogram())
+        return h
+
+    def observe(self, stage: str, seconds: float) -> None:
+        self.histogram(stage).observe(seconds)
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def counter(self, name: str, **labels: str) -> float:
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0.0)
+
+    def reset(self) -> None:
+        # Histograms are zeroed in place: timed() wrappers hold on to them.
+        with self._lock:
+            for h in self.stages.values():
+                h.clear()
+            self.counters.clear()
+
+    def summary(self) -> Dict[str, dict]:
+        """stage -> count, mean and p50/p95/p99 in seconds."""
+        out = {}
+        for stage, h in sorted(self.stages.items()):
+            qs = h.quantiles()
+            snap = h.snapshot()
+            count = snap["count"]
+            out[stage] = {"count": count, "mean": snap["sum"] / count if count else math.nan,
+                          **{f"p{int(q * 100)}": v for q, v in qs.items()}}
+        return out
+
+    def snapshot(self) -> dict:
+        return {
+            "stages": self.summary(),
+            "counters": [{"name": n, "labels": dict(lb), "value": v} for (n, lb), v in sorted(self.counters.items())],
+        }
+
+    def prometheus(self) -> str:
+        lines = [f"# HELP {PREFIX}_stage_seconds Wall time per pipeline stage.",
+                 f"# TYPE {PREFIX}_stage_seconds histogram"]
+        stages = sorted(self.stages.items())
+        for stage, h in stages:
+            snap = h.snapshot()
+            cum = 0
+            for bound, c in zip(h.bounds + (math.inf,), snap["buckets"]):
+                cum += c
+                le = "+Inf" if bound == math.inf else repr(bound)
+                lines.append(f"{PREFIX}_stage_seconds_bucket{_labels({'stage': stage, 'le': le})} {cum}")
+            lines.append(f"{PREFIX}_stage_seconds_sum{_labels({'stage': stage})} {snap['sum']:.9f}")
+            lines.append(f"{PREFIX}_stage_seconds_count{_labels({'stage': stage})} {snap['count']}")
+        lines += [f"# HELP {PREFIX}_stage_recent_seconds Quantiles over the last {RECENT} samples per stage.",
+                  f"# TYPE {PREFIX}_stage_recent_seconds gauge"]
+        for stage, h in stages:
+            for q, v in h.quantiles().items():
+                if not math.isnan(v):
+                    lines.append(f"{PREFIX}_stage_recent_seconds{_labels({'stage': stage, 'quantile': str(q)})} {v:.9f}")
+        with self._lock:
+            counters = sorted(self.counters.items())
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {PREFIX}_{name} counter")
+            lines.append(f"{PREFIX}_{name}{_labels(dict(labels))} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# ---- Traces (per question / rerun) ----
+@dataclass
+class Span:
+    name: str
+    depth: int
+    seconds: float = 0.0
+    attrs: dict = field(default_factory=dict)
+
+
+@dataclass
+class Trace:
+    name: str
+    attrs: dict = field(default_factory=dict)
+    spans: List[Span] = field(default_factory=list)
+    started_ns: int = field(default_factory=time.perf_counter_ns)
+    seconds: float = 0.0
+    _open: List[Span] = field(default_factory=list, repr=False)
+
+    def as_dict(self) -> dict:
+        return {
+            "event": self.name, **self.attrs, "total_ms": round(self.seconds * 1000, 3),
+            "stages": [{"stage": s.name, "depth": s.depth, "ms": round(s.seconds * 1000, 3), **s.attrs}
+                       for s in self.spans],
+        }
+
+
+_CURRENT: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("bggovai_trace", default=None)
+
+
+def begin(name: str, **attrs) -> Trace:
+    trace = Trace(name, dict(attrs))
+    _CURRENT.set(trace)
+    return trace
+
+
+def current() -> Optional[Trace]:
+    return _CURRENT.get()
+
+
+def finish(trace: Trace) -> dict:
+    trace.seconds = (time.perf_counter_ns() - trace.started_ns) / 1e9
+    REGISTRY.observe(trace.name, trace.seconds)
+    if _CURRENT.get() is trace:
+        _CURRENT.set(None)
+    out = trace.as_dict()
+    if log.isEnabledFor(logging.INFO):
+        log.info(json.dumps({"ts": round(time.time(), 3), **out}, ensure_ascii=False, default=str))
+    return out
+
+
+class stage:
+    """Time a block; `with stage(name) as span` gives the span's attribute dict (span["cache"] = "hit").
+
+    Only work inside a trace is measured; untraced calls (sweeps, benchmarks,
+    library use) pay one context-variable lookup. A class rather than
+    @contextmanager because it sits on µs-level paths.
+    """
+    __slots__ = ("name", "trace", "span", "t")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.trace = _CURRENT.get()
+        self.span = None
+
+    def __enter__(self) -> dict:
+        trace = self.trace
+        if trace is None:
+            return {}
+        self.span = span = Span(self.name, len(trace._open))
+        trace.spans.append(span)
+        trace._open.append(span)
+        self.t = time.perf_counter_ns()
+        return span.attrs
+
+    def __exit__(self, *exc) -> None:
+        span = self.span
+        if span is None:
+            return
+        span.seconds = dt = (time.perf_counter_ns() - self.t) / 1e9
+        REGISTRY.observe(self.name, dt)
+        opened = self.trace._open
+        if opened and opened[-1] is span:
+            opened.pop()
+
+
+def timed(name: str):
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _CURRENT.get() is None:
+                return fn(*args, **kwargs)
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def annotate(**attrs) -> None:
+    """Attach attributes to the innermost open span of the current trace."""
+    trace = _CURRENT.get()
+    if trace is not None and trace._open:
+        trace._open[-1].attrs.update(attrs)
+
+
+# ---- AI usage ----
+def _price(name: str) -> float:
+    try:
+        return float(os.getenv(name, "") or 0.0)
+    except ValueError:
+        return 0.0
+
+
+def cache_result(hit: bool) -> None:
+    REGISTRY.inc("ai_cache_total", result="hit" if hit else "miss")
+    annotate(cache="hit" if hit else "miss")
+
+
+def coalesced(mode: str) -> None:
+    """An AI call that joined an identical in-flight call instead of going upstream (see singleflight.py)."""
+    REGISTRY.inc("ai_coalesced_total", mode=mode)
+    annotate(coalesced=mode)
+
+
+def hedge_attempt() -> None:
+    """A first upstream attempt under llm.hedged: the base of the hedge rate."""
+    REGISTRY.inc("ai_first_attempts_total")
+
+
+def hedge_sent() -> None:
+    """A duplicate upstream request after the hedge delay (llm.hedged); rate = this / ai_first_attempts_total."""
+    REGISTRY.inc("ai_hedges_total")
+    annotate(hedged=True)
+
+
+def hedge_won() -> None:
+    REGISTRY.inc("ai_hedge_wins_total")
+    annotate(hedge_won=True)
+
+
+def fallback(reason: str) -> None:
+    """The template answer was served instead of the model's (reason: deadline | error)."""
+    REGISTRY.inc("ai_fallbacks_total", reason=reason)
+    annotate(fallback=reason)
+
+
+def ai_error(kind: str) -> None:
+    REGISTRY.inc("ai_errors_total", kind=kind)
+    annotate(error=kind)
+
+
+def record_usage(model: str, usage) -> None:
+    """Token counters (and cost, when prices are configured) from an OpenAI `usage` object."""
+    if usage is None:
+        return
+    prompt = int(getattr(usage, "prompt_tokens", 0) or 0)
+    completion = int(getattr(usage, "completion_tokens", 0) or 0)
+    REGISTRY.inc("ai_tokens_total", prompt, model=model, kind="prompt")
+    REGISTRY.inc("ai_tokens_total", completion, model=model, kind="completion")
+    cost = (prompt * _price("BGGOVAI_PRICE_PROMPT") + completion * _price("BGGOVAI_PRICE_COMPLETION")) / 1e6
+    if cost:
+        REGISTRY.inc("ai_cost_usd_total", cost, model=model)
+    annotate(prompt_tokens=prompt, completion_tokens=completion, **({"cost_usd": round(cost, 6)} if cost else {}))
+
+
+# ---- Export ----
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/metrics":
+            body, ctype = REGISTRY.prometheus().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/metrics.json":
+            body, ctype = json.dumps(REGISTRY.snapshot(), default=str).encode("utf-8"), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+def _configure_log(target: Optional[str]) -> None:
+    if not target or log.handlers:
+        return
+    handler = logging.StreamHandler(sys.stderr) if target in ("-", "stderr") else logging.FileHandler(target, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+
+
+_configure_log(os.getenv("BGGOVAI_METRICS_LOG", "").strip())
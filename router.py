@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""Single-pass keyword router shared by app.py and streamlit_app.py.
+
+All keyword rules live in one table. The keywords are compiled once into a
+trie-shaped regex, so a question is scanned a single time and the cost per
+character is bounded by the branching of the trie, not by the number of rules.
+Rules are only evaluated when one of their keywords was actually hit.
+"""
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+
+@dataclass(frozen=True)
+class Rule:
+    family: str                          # "intent" | "policy" | "sources" | "topic"
+    label: str
+    groups: Tuple[Tuple[str, ...], ...]  # every group must hit; any keyword inside a group
+
+
+@dataclass(frozen=True)
+class Route:
+    intent: str
+    policy: str
+    sources: str
+    topic: Optional[str]
+    keywords: FrozenSet[str]
+
+    @property
+    def source_names(self) -> Optional[FrozenSet[str]]:
+        return SOURCE_SETS.get(self.sources)
+
+
+# Order inside a family is priority order (first satisfied rule wins).
+RULES: List[Rule] = [
+    Rule("intent", "FISCAL", (("бюдж", "дефиц", "дълг", "ддс", "пенс", "разход", "приход", "бвп", "инфлац",
+                               "безработ", "aic", "потреблен", "реалн доход", "растеж"),)),
+    Rule("intent", "ADMIN", (("мол", "управител", "еоод", "оод", "а4", "търговски регист", "агенция по вписвания"),)),
+    Rule("intent", "LEGAL", (("закон", "чл", "ал.", "параграф", "гражданств", "натурализ", "държавен вестник",
+                              "проектозакон"),)),
+
+    Rule("policy", "VAT_REST_9", (("ддс",), ("ресторан", "9", "9%"))),
+    Rule("policy", "PENSIONS_10", (("пенс",), ("10", "10%"))),
+    Rule("policy", "INVEST", (("инвест", "капекс", "инфраструкт", "образован", "здравеопаз"),)),
+
+    Rule("sources", "LEGAL", (("закон", "чл", "ал", "гражданств", "държавен вестник", "проектозакон"),)),
+    Rule("sources", "ADMIN", (("мол", "управител", "еоод", "оод", "търговски регист", "а4"),)),
+    Rule("sources", "FISCAL", (("бюджет", "дефиц", "дълг", "инфлац", "безработ", "бвп", "aic"),)),
+
+    # Validated demo topics of streamlit_app.py
+    Rule("topic", "ADMIN_MOL", (("мол",), ("еоод", "управител", "търговски"))),
+    Rule("topic", "VAT_REST_9", (("ддс",), ("9", "ресторан", "кетъринг"))),
+    Rule("topic", "CITIZENSHIP", (("гражданств",),)),
+    Rule("topic", "FISCAL_TARGETS", (("дефицит", "3%", "дълг", "60%", "aic", "догон", "бюджет"),)),
+]
+
+DEFAULTS: Dict[str, Optional[str]] = {"intent": "GENERAL", "policy": "BASE", "sources": "ALL", "topic": None}
+
+SOURCE_SETS: Dict[str, FrozenSet[str]] = {
+    "LEGAL": frozenset({"Народно събрание", "Държавен вестник", "Министерство на правосъдието"}),
+    "ADMIN": frozenset({"Агенция по вписванията / Търговски регистър", "Електронно управление",
+                        "Министерство на правосъдието"}),
+    "FISCAL": frozenset({"Министерство на финансите", "Българска народна банка",
+                         "Национален статистически институт"}),
+}
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    trie: dict = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: dict) -> str:
+        alts = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return emit(trie)
+
+
+class Router:
+    def __init__(self, rules: Sequence[Rule], defaults: Dict[str, Optional[str]] = DEFAULTS):
+        self.rules = list(rules)
+        self.defaults = dict(defaults)
+        keywords = sorted({k for r in self.rules for g in r.groups for k in g})
+        # Lookahead finds the longest keyword starting at every position, so overlapping hits survive.
+        self._pattern = re.compile("(?=(" + _trie_regex(keywords) + "))")
+        # A hit on "ал." also counts as a hit on its prefix "ал".
+        self._closure = {k: frozenset(p for p in keywords if k.startswith(p)) for k in keywords}
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._priority: Dict[int, int] = {}
+        seen: Dict[str, int] = {}
+        for ri, rule in enumerate(self.rules):
+            self._priority[ri] = seen.get(rule.family, 0)
+            seen[rule.family] = self._priority[ri] + 1
+            for gi, group in enumerate(rule.groups):
+                for k in group:
+                    self._postings.setdefault(k, []).append((ri, gi))
+
+    def scan(self, text: str) -> FrozenSet[str]:
+        hits = set()
+        for m in self._pattern.finditer(text):
+            hits.update(self._closure[m.group(1)])
+        return frozenset(hits)
+
+    def route(self, text: str) -> Route:
+        hits = self.scan((text or "").lower())
+        groups_hit: Dict[int, set] = {}
+        for k in hits:
+            for ri, gi in self._postings[k]:
+                groups_hit.setdefault(ri, set()).add(gi)
+        best: Dict[str, Tuple[int, str]] = {}
+        for ri, gs in groups_hit.items():
+            rule = self.rules[ri]
+            if len(gs) == len(rule.groups):
+                prio = self._priority[ri]
+                if rule.family not in best or prio < best[rule.family][0]:
+                    best[rule.family] = (prio, rule.label)
+        labels = {fam: best[fam][1] if fam in best else default for fam, default in self.defaults.items()}
+        return Route(labels["intent"], labels["policy"], labels["sources"], labels["topic"], hits)
+
+
+ROUTER = Router(RULES)
+
+
+@lru_cache(maxsize=4096)
+def route(text: str) -> Route:
+    return ROUTER.route(text)
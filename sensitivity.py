@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""Sensitivity maps for the VAT restaurants module: dense parameter grids, heatmaps and tornado bars.
+
+A grid sweeps up to all four data.json parameters (share, passthrough,
+elasticity, compliance). Parameters that are not swept stay at the Base
+preset. Every cell comes from one broadcast call to
+vat_scenarios.revenue_impact, so 200 x 200 x 50 cells are a single
+vectorised pass.
+
+Axes snap to a dyadic lattice per parameter: the step is the parameter's
+padded preset span / 200 times a power of two. Zooming in halves the step, so
+every other point of a zoomed axis has already been computed, and extending
+a range only adds points at the edges. Cells are cached per (rates, fixed
+parameters, swept parameters, lattice level per axis) as one dense block.
+A new request copies what it can from the best cached block at the same or
+a coarser level (strided slices, no per-cell work). It then computes only
+the missing cells, as at most one slab per axis:
+
+    slab d = missing on axis d x copied on axes < d x everything on axes > d
+
+The slabs are disjoint and together cover exactly the missing cells.
+"""
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from vat_scenarios import BGN_PER_EUR, PARAMS, VatModule, _rates, revenue_impact
+
+LABELS = {
+    "share": "Дял ресторанти в сектор I",
+    "passthrough": "Пренос към цените",
+    "elasticity": "Ценова еластичност",
+    "compliance": "Промяна в събираемостта",
+}
+LATTICE = 200           # default step = padded preset span / LATTICE
+MAX_CELLS = 16_000_000  # per block; all blocks together stay under 2 * MAX_CELLS
+
+
+@dataclass(frozen=True)
+class Grid:
+    params: Tuple[str, ...]
+    axes: Tuple[np.ndarray, ...]
+    values: np.ndarray          # млрд. €, shape = tuple(len(a) for a in axes)
+    computed: int               # cells evaluated for this request (0 = fully cached)
+
+    def slice2d(self, index: int = 0) -> np.ndarray:
+        """2-D view: the first two axes, at `index` along the third (if any)."""
+        return self.values if self.values.ndim == 2 else self.values[:, :, index]
+
+
+def _select(mask: np.ndarray):
+    """Positions where `mask` is set: a slice when evenly spaced (assignment stays a view), else an index array."""
+    idx = np.flatnonzero(mask)
+    step = int(idx[1] - idx[0]) if len(idx) > 1 else 1
+    if np.array_equal(np.diff(idx), np.full(len(idx) - 1, step)):
+        return slice(int(idx[0]), int(idx[-1]) + 1, step)
+    return idx
+
+
+def _outer(index: Sequence) -> tuple:
+    """Outer-product indexer: plain slices stay a view; any index array switches to np.ix_."""
+    if all(isinstance(i, slice) for i in index):
+        return tuple(index)
+    return np.ix_(*[np.arange(i.start, i.stop, i.step) if isinstance(i, slice) else i for i in index])
+
+
+class _Block:
+    """Cells for lattice indices lo[d] .. lo[d] + shape[d] - 1 at one lattice level per axis."""
+    __slots__ = ("levels", "lo", "values")
+
+    def __init__(self, levels: Tuple[int, ...], lo: Tuple[int, ...], values: np.ndarray):
+        self.levels, self.lo, self.values = levels, lo, values
+
+    @property
+    def hi(self) -> Tuple[int, ...]:
+        return tuple(k + n - 1 for k, n in zip(self.lo, self.values.shape))
+
+
+class Sensitivity:
+    def __init__(self, module: VatModule, reverse: bool = True, max_blocks: int = 8):
+        self.module = module
+        self.rate_old, self.rate_new = _rates(module, reverse)
+        self.base = {p: module.ranges[p].mode for p in PARAMS}
+        self.max_blocks = max_blocks
+        self._blocks: "OrderedDict[tuple, _Block]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.computed = 0
+        self.reused = 0
+
+    # ---- axes ----
+    def span(self, param: str) -> Tuple[float, float]:
+        r = self.module.ranges[param]
+        width = (r.high - r.low) or max(abs(r.mode), 0.1)
+        return r.low - width / 2, r.high + width / 2
+
+    def step(self, param: str, level: int) -> float:
+        lo, hi = self.span(param)
+        return (hi - lo) / LATTICE * 2.0 ** level
+
+    def lattice(self, param: str, lo: Optional[float] = None, hi: Optional[float] = None,
+                n: int = 50) -> Tuple[int, int, int]:
+        """(level, k0, k1): at least `n` points k * step(level) covering [lo, hi] (default: padded preset span)."""
+        default_lo, default_hi = self.span(param)
+        lo = default_lo if lo is None else float(lo)
+        hi = default_hi if hi is None else float(hi)
+        if hi <= lo or n < 2:
+            k = round(lo / self.step(param, 0))
+            return 0, k, k
+        level = math.floor(math.log2((hi - lo) / (n - 1) / self.step(param, 0)))
+        step = self.step(param, level)
+        # Snap outwards: the axis may overshoot [lo, hi] by less than a step, never fall short of it.
+        k0, k1 = math.floor(lo / step + 1e-9), math.ceil(hi / step - 1e-9)
+        return level, k0, max(k1, k0 + n - 1)
+
+    def axis(self, param: str, lo: Optional[float] = None, hi: Optional[float] = None, n: int = 50) -> np.ndarray:
+        level, k0, k1 = self.lattice(param, lo, hi, n)
+        # Power-of-two steps: k * step(j + 1) == 2k * step(j) exactly, so levels share cells bit for bit.
+        return np.arange(k0, k1 + 1) * self.step(param, level)
+
+    # ---- evaluation ----
+    def _eval(self, params: Sequence[str], coords: Sequence[np.ndarray], fixed: Dict[str, float]) -> np.ndarray:
+        kw = dict(fixed)
+        ndim = len(params)
+        for d, (p, c) in enumerate(zip(params, coords)):
+            kw[p] = c.reshape((-1,) + (1,) * (ndim - d - 1))
+        out = revenue_impact(self.module.turnover_bgn, self.rate_old, self.rate_new, **kw)
+        return (np.broadcast_to(out, tuple(len(c) for c in coords)) / BGN_PER_EUR / 1e9).astype(np.float32)
+
+    def grid(self, ranges: Dict[str, Tuple[Optional[float], Optional[float], int]],
+             fixed: Optional[Dict[str, float]] = None) -> Grid:
+        """`ranges`: param -> (lo, hi, n) in sweep order; other params at Base (or `fixed`)."""
+        params = tuple(ranges)
+        unknown = [p for p in params if p not in PARAMS]
+        if unknown:
+            raise KeyError(f"unknown parameter(s) {', '.join(unknown)}; have {', '.join(PARAMS)}")
+        lattice = [self.lattice(p, *ranges[p]) for p in params]
+        rest = {p: float(v) for p, v in {**self.base, **(fixed or {})}.items() if p not in params}
+        key = (self.rate_old, self.rate_new, tuple(sorted(rest.items())), params)
+        with self._lock:
+            block, computed = self._fill(key, params, lattice, rest)
+            values = block.values[tuple(slice(k0 - b, k1 - b + 1) for (_, k0, k1), b in zip(lattice, block.lo))]
+        axes = tuple(np.arange(k0, k1 + 1) * self.step(p, j) for p, (j, k0, k1) in zip(params, lattice))
+        return Grid(params, axes, values, computed)
+
+    def _fill(self, key: tuple, params, lattice, fixed: Dict[str, float]):
+        levels = tuple(j for j, _, _ in lattice)
+        lo = [k0 for _, k0, _ in lattice]
+        hi = [k1 for _, _, k1 in lattice]
+        block = self._blocks.get((key, levels))
+        if block is not None:
+            self._blocks.move_to_end((key, levels))
+            if all(b <= k0 and k1 <= e for b, e, k0, k1 in zip(block.lo, block.hi, lo, hi)):
+                self.reused += math.prod(k1 - k0 + 1 for k0, k1 in zip(lo, hi))
+                return block, 0
+            # Same level: grow to the union of both ranges.
+            lo = [min(a, b) for a, b in zip(lo, block.lo)]
+            hi = [max(a, b) for a, b in zip(hi, block.hi)]
+            if math.prod(k1 - k0 + 1 for k0, k1 in zip(lo, hi)) > MAX_CELLS:
+                lo, hi = [k0 for _, k0, _ in lattice], [k1 for _, _, k1 in lattice]
+        shape = tuple(k1 - k0 + 1 for k0, k1 in zip(lo, hi))
+        values = np.empty(shape, dtype=np.float32)
+        have = [np.zeros(n, dtype=bool) for n in shape]
+
+        # Copy from the cached block (same level or coarser on every axis) that overlaps the most.
+        best, best_cells = None, 0
+        for (k, lv), b in self._blocks.items():
+            if k != key or any(c < f for c, f in zip(lv, levels)):
+                continue
+            spans = []
+            for d, (bl, bh) in enumerate(zip(b.lo, b.hi)):
+                r = 2 ** (lv[d] - levels[d])
+                first = max(lo[d], bl * r)
+                first += -first % r
+                last = min(hi[d], bh * r)
+                last -= last % r
+                spans.append((r, first, last))
+            cells = math.prod(max(0, (last - first) // r + 1) for r, first, last in spans)
+            if cells > best_cells:
+                best, best_cells = (b, spans), cells
+        if best is not None:
+            b, spans = best
+            dst = tuple(slice(first - lo[d], last - lo[d] + 1, r) for d, (r, first, last) in enumerate(spans))
+            src = tuple(slice(first // r - b.lo[d], last // r - b.lo[d] + 1) for d, (r, first, last) in enumerate(spans))
+            values[dst] = b.values[src]
+            for d, s in enumerate(dst):
+                have[d][s] = True
+
+        # Missing cells as disjoint slabs: new on axis d x copied on axes < d x everything on axes > d.
+        coords = [np.arange(k0, k1 + 1) * self.step(p, j) for p, j, k0, k1 in zip(params, levels, lo, hi)]
+        computed = 0
+        for d in range(len(shape)):
+            if have[d].all():
+                continue
+            masks = [have[e] if e < d else (~have[e] if e == d else np.ones(shape[e], dtype=bool))
+                     for e in range(len(shape))]
+            if not all(m.any() for m in masks):
+                continue
+            sel = [_select(m) for m in masks]
+            slab = self._eval(params, [c[s] for c, s in zip(coords, sel)], fixed)
+            values[_outer(sel)] = slab
+            computed += slab.size
+        values.setflags(write=False)
+        self._blocks[(key, levels)] = block = _Block(levels, tuple(lo), values)   # earlier Grid views keep the old array
+        self._blocks.move_to_end((key, levels))
+        while len(self._blocks) > 1 and (len(self._blocks) > self.max_blocks or
+                                         sum(b.values.size for b in self._blocks.values()) > 2 * MAX_CELLS):
+            self._blocks.popitem(last=False)
+        self.computed += computed
+        self.reused += math.prod(k1 - k0 + 1 for _, k0, k1 in lattice) - computed
+        return block, computed
+
+    # ---- one-at-a-time ----
+    def tornado(self) -> List[Tuple[str, float, float]]:
+        """(param, impact at the preset low, impact at the preset high), widest swing first; others at Base."""
+        rows = []
+        for p in PARAMS:
+            r = self.module.ranges[p]
+            lo, hi = self._eval((p,), (np.array([r.low, r.high]),), {q: v for q, v in self.base.items() if q != p})
+            rows.append((p, float(lo), float(hi)))
+        return sorted(rows, key=lambda row: -abs(row[2] - row[1]))
+
+    def base_impact(self) -> float:
+        return float(self._eval((), (), self.base))
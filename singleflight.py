@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""Single-flight coalescing of identical in-flight AI calls, across threads and Streamlit sessions.
+
+When a topical question spreads, many sessions ask for the same cache key
+before the first answer has landed in RESPONSES. The first caller becomes
+the leader of a Flight and makes the upstream call. Everyone else with the
+same key joins that flight as a follower, and nothing else is sent upstream:
+
+- a blocking follower (ai_call) waits for the finished text;
+- a streaming follower (ai_stream) replays the deltas received so far, then
+  receives new ones as the leader publishes them.
+
+Leaders and followers mix freely: a stream can join a blocking call (it gets
+the whole text at the end) and vice versa. When the leader fails, the
+followers get the same error and do not retry, so a failing upstream is not
+hit N times. A leader that stops before finishing (a streaming session that
+rerun away from the answer) abandons the flight instead, and one of its
+followers takes over. Failures are never written to RESPONSES.
+"""
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class Abandoned(Exception):
+    """The leader went away before finishing; followers should make the call themselves."""
+
+
+class Flight:
+    __slots__ = ("cond", "parts", "done", "result", "error", "followers")
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.parts: List[str] = []
+        self.done = False
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+    # ---- leader side ----
+    def publish(self, delta: str) -> None:
+        with self.cond:
+            self.parts.append(delta)
+            self.cond.notify_all()
+
+    def finish(self, result: Optional[str] = None, error: Optional[BaseException] = None) -> None:
+        with self.cond:
+            if self.done:
+                return
+            self.result = "".join(self.parts) if result is None and error is None else result
+            self.error, self.done = error, True
+            self.cond.notify_all()
+
+    # ---- follower side ----
+    def wait(self, timeout: Optional[float] = None) -> str:
+        """The leader's finished text; raises the leader's error (or Abandoned, or TimeoutError)."""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.done, timeout):
+                raise TimeoutError("in-flight AI call did not finish in time")
+            if self.error is not None:
+                raise self.error
+            return self.result
+
+    def follow(self, timeout: Optional[float] = None) -> Iterator[str]:
+        """Deltas from the start of the flight, then live. Ends when the leader finishes (raises as wait())."""
+        seen = 0
+        while True:
+            with self.cond:
+                if not self.cond.wait_for(lambda: self.done or len(self.parts) > seen, timeout):
+                    raise TimeoutError("in-flight AI call stalled")
+                new, seen = self.parts[seen:], len(self.parts)
+                done, error, result = self.done, self.error, self.result
+            yield from new
+            if done:
+                if error is not None:
+                    raise error
+                if seen == 0 and result:
+                    yield result        # joined a blocking leader: the text arrives in one piece
+                return
+
+
+class Group:
+    """Flights by key, plus counters; one per process (FLIGHTS)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    def join(self, key: str) -> Tuple[Flight, bool]:
+        """(flight, True) for the new leader, (flight, False) for a follower of an in-flight call."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                self.coalesced += 1
+                return flight, False
+            self._flights[key] = flight = Flight()
+            self.leaders += 1
+            return flight, True
+
+    def land(self, key: str, flight: Flight, result: Optional[str] = None,
+             error: Optional[BaseException] = None) -> None:
+        """Leader: publish the outcome and close the flight. Later callers start a new one."""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if isinstance(error, Abandoned):
+                self.abandoned += 1
+        flight.finish(result, error)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"in_flight": len(self._flights), "leaders": self.leaders, "coalesced": self.coalesced,
+                    "abandoned": self.abandoned}
+
+
+FLIGHTS = Group()
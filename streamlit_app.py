@@ -1,5 +1,7 @@
 import streamlit as st
 
+from router import route
+
 # --- Inline SVG (demo crest) so we don't depend on assets/ folder ---
 CREST_SVG = """
 <svg xmlns="http://www.w3.org/2000/svg" width="120" height="140" viewBox="0 0 120 140">
@@ -92,6 +94,7 @@ st.markdown("</div>", unsafe_allow_html=True)
 
 # Minimal demo router (only validated topics)
 q = (question or "").lower()
+topic = route(q).topic
 
 def answer(title, body):
     st.subheader(title)
@@ -99,7 +102,7 @@ def answer(title, body):
 
 if not q.strip():
     st.info("Въведи въпрос. Демото е настроено за: ДДС 9% ресторанти, смяна на МОЛ на ЕООД, промени в закона за гражданството, бюджетни цели (дефицит/дълг/AIC).")
-elif "мол" in q and ("еоод" in q or "управител" in q or "търговски" in q):
+elif topic == "ADMIN_MOL":
     answer("Административен отговор: Смяна на МОЛ (управител) на ЕООД",
            "- Решение на едноличния собственик за освобождаване/назначаване на управител\n"
            "- Декларации по ТЗ от новия управител\n"
@@ -107,12 +110,12 @@ elif "мол" in q and ("еоод" in q or "управител" in q or "тър
            "- Заявление А4 в Търговски регистър (електронно)\n"
            "- Такса + подаване с КЕП\n\n"
            "Демо бележка: в реална версия системата ще генерира готов пакет документи и чеклист.")
-elif "ддс" in q and ("9" in q or "ресторан" in q or "кетъринг" in q):
+elif topic == "VAT_REST_9":
     answer("Финансов отговор (демо): ДДС 9% за ресторанти",
            "Тук в пълната версия ще се зареди бюджетният Excel модел и ще се изчислят:\n"
            "• ефект върху приходи\n• дефицит (% от БВП)\n• дълг\n• индикатор за AIC догонване\n\n"
            "Демо бележка: UI и routing са готови; следващата стъпка е да вържем Excel бюджета от файла.")
-elif "гражданств" in q:
+elif topic == "CITIZENSHIP":
     answer("Юридически отговор (демо): промени в закона за българското гражданство",
            "Структура на анализ:\n"
            "1) Какво се променя (хипотези + критерии)\n"
@@ -120,7 +123,7 @@ elif "гражданств" in q:
            "3) Процедура и администрация (МП, президент, ДАНС/МВР при проверки)\n"
            "4) Рискове (конституционен, ЕС, съдебни спорове)\n\n"
            "Демо бележка: в реална версия ще работим с конкретен текст на законопроекта.")
-elif ("дефицит" in q or "3%" in q or "дълг" in q or "60%" in q or "aic" in q or "догон" in q or "бюджет" in q):
+elif topic == "FISCAL_TARGETS":
     answer("Фискални цели (демо):",
            "Цели:\n"
            "• Дефицит ≤ 3% от БВП\n"
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""Local OpenAI-compatible stub for /v1/chat/completions (blocking and SSE streaming).
+
+    python stub_llm.py --port 8765 --latency 0.3 --token-delay 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=stub streamlit run app.py
+
+Streaming responses are sent with Transfer-Encoding: chunked, one SSE event
+per token, so time-to-first-token and inter-token gaps are observable.
+
+Tail and failure injection (e.g. to exercise hedging, deadlines and the
+fallback answer): --slow-rate of the requests wait --slow extra seconds
+before the first byte, and --fail-rate of them get an HTTP 500 after the
+normal latency. Draws come from one seeded RNG (--seed).
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+SECTIONS = ("Резюме", "Анализ", "Ефект върху хората и бизнеса", "Рискове", "Какво да се провери + източници")
+
+
+def reply_for(model: str, msgs: List[dict]) -> str:
+    user = next((m.get("content") or "" for m in reversed(msgs) if m.get("role") == "user"), "")
+    first = user.strip().splitlines()[0] if user.strip() else ""
+    tag = hashlib.sha256(user.encode("utf-8")).hexdigest()[:8]
+    body = [f"{i}) {name}\n(stub {model} #{tag}) {first}" for i, name in enumerate(SECTIONS, 1)]
+    return "\n\n".join(body)
+
+
+def tokens(text: str) -> List[str]:
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "StubServer"
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; without this, keep-alive hits Nagle + delayed ACK.
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, fmt, *args):  # keep load tests quiet
+        pass
+
+    def _json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        req = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+        cfg = self.server
+        with cfg.lock:
+            cfg.requests += 1
+            fail = cfg.rng.random() < cfg.fail_rate
+            extra = cfg.slow if cfg.rng.random() < cfg.slow_rate else 0.0
+            cfg.failed += fail
+            cfg.slowed += extra > 0
+        model = req.get("model", "stub")
+        text = reply_for(model, req.get("messages", []))
+        parts = tokens(text)
+        prompt_tokens = sum(len(m.get("content") or "") for m in req.get("messages", [])) // 4
+        created = int(time.time())
+        rid = f"chatcmpl-stub-{created}"
+        time.sleep(cfg.latency + extra + (random.uniform(0.0, cfg.jitter) if cfg.jitter else 0.0))
+        if fail:
+            self._json(500, {"error": {"message": "stub: injected failure", "type": "server_error"}})
+            return
+
+        if not req.get("stream"):
+            time.sleep(cfg.token_delay * len(parts))
+            self._json(200, {
+                "id": rid, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": text}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(parts),
+                          "total_tokens": prompt_tokens + len(parts)},
+            })
+            return
+
+        try:
+            self._stream(rid, created, model, parts, prompt_tokens, req)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the stream early (e.g. a hedged request that lost the race).
+            with cfg.lock:
+                cfg.aborted += 1
+
+    def _stream(self, rid: str, created: int, model: str, parts: List[str], prompt_tokens: int, req: dict) -> None:
+        cfg = self.server
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, part in enumerate(parts):
+            if i:
+                time.sleep(cfg.token_delay)
+            delta = {"role": "assistant", "content": part} if i == 0 else {"content": part}
+            event = {"id": rid, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            self._chunk(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+        done = {"id": rid, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        self._chunk(f"data: {json.dumps(done)}\n\n".encode("utf-8"))
+        if (req.get("stream_options") or {}).get("include_usage"):
+            usage = {"id": rid, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [], "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(parts),
+                                              "total_tokens": prompt_tokens + len(parts)}}
+            self._chunk(f"data: {json.dumps(usage)}\n\n".encode("utf-8"))
+        self._chunk(b"data: [DONE]\n\n")
+        self._chunk(b"")
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, token_delay: float = 0.0,
+                 jitter: float = 0.0, slow_rate: float = 0.0, slow: float = 0.0, fail_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        super().__init__((host, port), StubHandler)
+        self.latency = latency
+        self.token_delay = token_delay
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow = slow
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.slowed = 0
+        self.failed = 0
+        self.aborted = 0        # streams the client closed before the end
+        self.lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="stub-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Local OpenAI-compatible stub server")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.3, help="seconds before the first byte")
+    ap.add_argument("--token-delay", type=float, default=0.02, help="seconds between streamed tokens")
+    ap.add_argument("--jitter", type=float, default=0.0, help="extra uniform random latency, seconds")
+    ap.add_argument("--slow-rate", type=float, default=0.0, help="share of requests delayed by --slow")
+    ap.add_argument("--slow", type=float, default=0.0, help="extra seconds before the first byte of a slow request")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with HTTP 500")
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+    server = StubServer(args.host, args.port, args.latency, args.token_delay, args.jitter, args.slow_rate, args.slow,
+                        args.fail_rate, args.seed)
+    print(f"stub LLM on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+
+import core
+import llm
+import metrics
+from ai_cache import cache_key
+from singleflight import FLIGHTS
+
+SETTINGS = {"OPENAI_API_KEY": "sk-test", "OPENAI_BASE_URL": "http://127.0.0.1:9/v1"}
+
+
+def lookup(name, default=None):
+    return SETTINGS.get(name, default)
+
+
+def test_stream_follower_failing_mid_answer_gets_the_fallback():
+    user = f"контекст {time.time_ns()}"
+    key = cache_key(core.SYSTEM_PROMPT, user, "m")
+    flight, leader = FLIGHTS.join(key)
+    assert leader
+    flight.publish("Частичен ")
+    stream = core.ai_stream(core.SYSTEM_PROMPT, user, "m", lookup, fallback=lambda why: f"ШАБЛОН {why}")
+    assert next(stream) == "Частичен "
+    FLIGHTS.land(key, flight, error=RuntimeError("connection reset"))
+    rest = "".join(stream)
+    assert rest == "\n\nШАБЛОН error"
+    assert "connection reset" not in rest
+
+
+def test_call_policy_ignores_malformed_settings():
+    policy = llm.CallPolicy.from_lookup({"OPENAI_DEADLINE": "soon", "OPENAI_HEDGE_AFTER": "fast"}.get)
+    assert policy == llm.CallPolicy()
+    assert llm.CallPolicy.from_lookup({"OPENAI_DEADLINE": "0", "OPENAI_HEDGE_AFTER": "1.5"}.get) == \
+        llm.CallPolicy(deadline=None, hedge_after=1.5)
+
+
+def test_hedge_rate_counts_first_attempts():
+    metrics.REGISTRY.reset()
+    policy = llm.CallPolicy(deadline=5.0, hedge_after=0.05)
+    assert llm.hedged(lambda: "бързо", policy) == ("бързо", False)
+    value, _ = llm.hedged(lambda: time.sleep(0.2) or "бавно", policy)
+    assert value == "бавно"
+    assert metrics.REGISTRY.counter("ai_first_attempts_total") == 2
+    assert metrics.REGISTRY.counter("ai_hedges_total") == 1
+
+
+@pytest.mark.parametrize("outcome", ["", RuntimeError("upstream 500")])
+def test_empty_or_failed_lead_call_is_not_cached(monkeypatch, outcome):
+    def complete(*_):
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(llm, "complete", complete)
+    user = f"контекст {time.time_ns()}"
+    answer = core.ai_call(core.SYSTEM_PROMPT, user, "m", lookup, fallback=lambda why: f"ШАБЛОН {why}")
+    assert answer == ("ШАБЛОН error" if outcome else "")
+    assert core.RESPONSES.get(cache_key(core.SYSTEM_PROMPT, user, "m")) is None
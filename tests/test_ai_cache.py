@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+import sys
+
+import ai_cache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make(tmp_path, **kw):
+    return ai_cache.SQLiteCache(str(tmp_path / "cache.sqlite3"), **kw)
+
+
+def age(cache, seconds):
+    with cache._write() as db:
+        db.execute("UPDATE entries SET accessed = accessed - ?", (seconds,))
+
+
+def test_hit_is_read_only(tmp_path, monkeypatch):
+    cache = make(tmp_path)
+    cache.set("a", "отговор")
+    age(cache, 2 * ai_cache.TOUCH_INTERVAL)
+
+    def no_write():
+        raise AssertionError("a hit must not open a write transaction")
+
+    monkeypatch.setattr(cache, "_write", no_write)
+    assert [cache.get("a") for _ in range(3)] == ["отговор"] * 3
+    assert cache.get("b") is None
+    assert cache.counters.hits == 3 and cache.counters.misses == 1
+
+
+def test_queued_touch_counts_for_eviction(tmp_path):
+    cache = make(tmp_path, max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    age(cache, 2 * ai_cache.TOUCH_INTERVAL)
+    with cache._write() as db:
+        db.execute("UPDATE entries SET accessed = accessed - 1 WHERE key = 'a'")     # a is the older one
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+    assert cache.get("a") == "1" and cache.get("c") == "3"
+    assert cache.get("b") is None
+
+
+def test_import_creates_no_files_and_bad_settings_fall_back(tmp_path):
+    path = tmp_path / "answers.sqlite3"
+    env = {**os.environ, "BGGOVAI_CACHE": "sqlite", "BGGOVAI_CACHE_PATH": str(path),
+           "BGGOVAI_CACHE_TTL": "15 min", "BGGOVAI_CACHE_MAX_ENTRIES": "lots"}
+    probe = ("import os, sys, ai_cache, core; assert not os.path.exists(sys.argv[1]); "
+             "c = ai_cache.RESPONSES; print(c.ttl, c.max_entries, c.stats()['backend'])")
+    out = subprocess.run([sys.executable, "-c", probe, str(path)], cwd=ROOT, env=env, capture_output=True,
+                         text=True, check=True).stdout.split()
+    assert out == [str(ai_cache.DEFAULT_TTL), str(ai_cache.DEFAULT_MAX_ENTRIES), "sqlite"]
+    assert path.exists()
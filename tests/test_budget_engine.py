@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+import core
+from budget_engine import first_breach, phase_in
+
+AMOUNT = core.AMOUNT_COL
+INTENSITIES = [0.0, 0.25, 0.5, 0.9, 1.0]
+
+
+def legacy_apply_policy(rev_df, exp_df, policy, intensity):
+    # The per-policy pandas code the engine replaced.
+    r, e = rev_df.copy(), exp_df.copy()
+    notes = []
+    if policy == "VAT_REST_9":
+        delta = -0.35 * intensity
+        r.loc[r["Категория"] == "ДДС", AMOUNT] += delta
+        notes.append(f"ДДС 9% за ресторанти: {delta:+.2f} млрд. € (DEMO, {intensity*100:.0f}%)")
+    elif policy == "PENSIONS_10":
+        mult = 1.0 + 0.10 * intensity
+        e.loc[e["Категория"] == "Пенсии", AMOUNT] *= mult
+        notes.append(f"Пенсии +10%: x{mult:.3f} (DEMO, {intensity*100:.0f}%)")
+    elif policy == "INVEST":
+        e.loc[e["Категория"] == "Инфраструктура", AMOUNT] += 0.60 * intensity
+        e.loc[e["Категория"].isin(["Образование", "Здравеопазване"]), AMOUNT] += 0.15 * intensity
+        notes.append(f"Инвестиции: +капекс/обр./здр. (DEMO, {intensity*100:.0f}%)")
+    return r, e, " • ".join(notes) if notes else "Няма разпозната фискална мярка (DEMO)."
+
+
+def legacy_compute_budget(rev_df, exp_df):
+    rev, exp = float(rev_df[AMOUNT].sum()), float(exp_df[AMOUNT].sum())
+    return rev, exp, exp - rev
+
+
+@pytest.fixture(scope="module")
+def model():
+    return core.budget_model(core.dataset().version)
+
+
+@pytest.mark.parametrize("policy", ["VAT_REST_9", "PENSIONS_10", "INVEST", "BASE", "UNKNOWN"])
+@pytest.mark.parametrize("intensity", INTENSITIES)
+def test_agrees_with_the_legacy_pandas_code(policy, intensity):
+    rev_df, exp_df = core.base_frames()
+    old_r, old_e, old_note = legacy_apply_policy(rev_df, exp_df, policy, intensity)
+    new_r, new_e, new_note = core.apply_policy(rev_df, exp_df, policy, intensity)
+    np.testing.assert_allclose(new_r[AMOUNT], old_r[AMOUNT], rtol=1e-12)
+    np.testing.assert_allclose(new_e[AMOUNT], old_e[AMOUNT], rtol=1e-12)
+    assert new_note == old_note
+    assert core.compute_budget(new_r, new_e) == pytest.approx(legacy_compute_budget(old_r, old_e), rel=1e-12)
+
+
+def test_sweep_matches_categories_and_year_one_of_the_projection(model):
+    sweep = model.sweep(model.policies, INTENSITIES)
+    proj = model.project(model.policies, INTENSITIES, 3, growth=0.03, inflation=0.02)
+    for p, policy in enumerate(model.policies):
+        for i, x in enumerate(INTENSITIES):
+            rev, exp = model.categories(policy, x)
+            assert sweep["revenue"][p, i] == pytest.approx(rev.sum(), rel=1e-12)
+            assert sweep["expenditure"][p, i] == pytest.approx(exp.sum(), rel=1e-12)
+            assert sweep["deficit"][p, i] == pytest.approx(exp.sum() - rev.sum(), rel=1e-12)
+    np.testing.assert_allclose(sweep["deficit_pct"], proj["deficit_pct"][..., 0], rtol=1e-12)
+    np.testing.assert_allclose(sweep["debt_pct"], proj["debt_pct"][..., 0], rtol=1e-12)
+    # A measure that changes the deficit changes this year's debt ratio too.
+    assert np.ptp(sweep["debt_pct"][model.policy_index["PENSIONS_10"]]) > 0
+
+
+def test_project_rolls_debt_forward(model):
+    out = model.project(["PENSIONS_10"], [0.5], 4, growth=0.02, inflation=0.03, ramp_years=2)
+    nominal = (1.02 * 1.03) ** np.arange(4)
+    np.testing.assert_allclose(out["gdp"], model.gdp * nominal)
+    np.testing.assert_allclose(phase_in([0.5], 4, ramp_years=2), [[0.5, 0.75, 1.0, 1.0]])
+    base = model.exp.sum() - model.rev.sum()
+    slope = model.exp_slope[model.policy_index["PENSIONS_10"]] - model.rev_slope[model.policy_index["PENSIONS_10"]]
+    deficit = (base + np.array([0.5, 0.75, 1.0, 1.0]) * slope) * nominal
+    np.testing.assert_allclose(out["deficit"][0, 0], deficit)
+    np.testing.assert_allclose(out["debt"][0, 0], model.debt + np.cumsum(deficit))
+
+
+def test_first_breach_counts_years_from_one():
+    ratio = np.array([[0.01, 0.02, 0.04, 0.05], [0.01, 0.01, 0.01, 0.01], [0.05, 0.0, 0.0, 0.0]])
+    assert first_breach(ratio, 0.03).tolist() == [3, 0, 1]
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+import core
+from budget_engine import EXP, REV, PolicyOp, PolicySpec
+from budget_tree import BudgetTree
+
+ROWS = [
+    ((REV, "ДДС"), 10.0),
+    ((REV, "Акцизи", "Горива"), 2.0),
+    ((REV, "Акцизи", "Тютюн"), 1.5),
+    ((EXP, "МТСП", "Пенсии", "Осигурителни"), 8.0),
+    ((EXP, "МТСП", "Пенсии", "Социални"), 2.0),
+    ((EXP, "МТСП", "Помощи"), 1.0),
+    ((EXP, "МЗ", "Здравеопазване"), 3.0),
+    ((EXP, "МОН", "Образование"), 2.5),
+]
+
+
+@pytest.fixture
+def tree():
+    return BudgetTree(reversed(ROWS))
+
+
+def assert_consistent(tree):
+    # Incremental roll-ups must equal a full re-sum from the lines.
+    totals = tree.total.copy()
+    tree.rebuild()
+    np.testing.assert_allclose(totals, tree.total, atol=1e-12)
+
+
+def test_rollups_sum_the_lines(tree):
+    assert tree.lines == len(ROWS)
+    assert tree.totals() == pytest.approx((13.5, 16.5, 3.0))
+    assert tree.rollup(1, REV) == pytest.approx({"ДДС": 10.0, "Акцизи": 3.5})
+    assert tree.rollup(1, EXP) == pytest.approx({"МТСП": 11.0, "МЗ": 3.0, "МОН": 2.5})
+    assert tree.rollup(2, EXP) == pytest.approx({"Пенсии": 10.0, "Помощи": 1.0, "Здравеопазване": 3.0,
+                                                 "Образование": 2.5})
+    for node in range(len(tree)):
+        stop = node + tree.size[node]
+        assert tree.total[node] == pytest.approx(tree.amount[node:stop].sum())
+    assert [tree.path(int(c)) for c in tree.children(tree.node((EXP, "МТСП")))] == [
+        (EXP, "МТСП", "Пенсии"), (EXP, "МТСП", "Помощи")]
+
+
+def test_edits_propagate_to_every_ancestor(tree):
+    pensions = tree.node((EXP, "МТСП", "Пенсии"))
+    assert tree.scale(pensions, 1.1) == pytest.approx(1.0)
+    assert tree.total[tree.node((EXP, "МТСП", "Пенсии", "Социални"))] == pytest.approx(2.2)
+    assert tree.total[tree.node((EXP, "МТСП"))] == pytest.approx(12.0)
+    assert tree.totals() == pytest.approx((13.5, 17.5, 4.0))
+
+    tree.set_line(tree.node((REV, "Акцизи", "Тютюн")), 2.5)
+    assert tree.rollup(1, REV)["Акцизи"] == pytest.approx(4.5)
+    tree.add(tree.node((EXP, "МЗ")), 0.6)
+    tree.add(tree.node((REV, "ДДС")), -0.4)
+    assert tree.totals() == pytest.approx((14.1, 18.1, 4.0))
+    assert_consistent(tree)
+
+    with pytest.raises(ValueError, match="group"):
+        tree.set_line(pensions, 1.0)
+
+
+def test_revert_restores_amounts_and_totals(tree):
+    amount, total = tree.amount.copy(), tree.total.copy()
+    journal = []
+    tree.scale(tree.node((EXP, "МТСП")), 1.3, journal)
+    tree.add(tree.node((REV, "Акцизи")), -0.7, journal)
+    tree.set_line(tree.node((EXP, "МОН", "Образование")), 4.0, journal)
+    tree.scale(tree.node((EXP, "МТСП", "Пенсии")), 0.5, journal)
+    tree.revert(journal)
+    assert journal == []
+    np.testing.assert_allclose(tree.amount, amount, atol=1e-12)
+    np.testing.assert_allclose(tree.total, total, atol=1e-12)
+
+
+def test_what_if_applies_and_reverts_a_policy(tree):
+    specs = {
+        "MIX": PolicySpec("MIX", (PolicyOp(EXP, "Пенсии", "mul", 0.10), PolicyOp(REV, "Акцизи", "add", 0.35)), ""),
+        "BASE": PolicySpec("BASE", (), ""),
+    }
+    before = tree.totals()
+    with tree.what_if("MIX", 0.5, specs) as t:
+        assert t.totals() == pytest.approx((13.675, 17.0, 3.325))
+        assert t.total[t.node((REV, "Акцизи", "Горива"))] == pytest.approx(2.0 * (3.675 / 3.5))
+        assert_consistent(t)
+    assert tree.totals() == pytest.approx(before)
+
+    with pytest.raises(KeyError, match="Непознато"):
+        with tree.what_if("X", 1.0, {"X": PolicySpec("X", (PolicyOp(EXP, "Непознато", "add", 1.0),), ""),
+                                    "BASE": specs["BASE"]}):
+            pass
+    assert tree.totals() == pytest.approx(before)
+
+
+@pytest.mark.parametrize("policy", ["VAT_REST_9", "PENSIONS_10", "INVEST", "BASE"])
+def test_flat_tree_agrees_with_the_budget_model(policy):
+    ds = core.dataset()
+    tree, model = BudgetTree.from_budget(ds.budget), core.budget_model(ds.version)
+    with tree.what_if(policy, 0.7):
+        rev, exp = model.categories(policy, 0.7)
+        assert tree.totals() == pytest.approx((rev.sum(), exp.sum(), exp.sum() - rev.sum()), rel=1e-12)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+
+import pytest
+
+import cli
+import core
+
+VAT = "Какъв е ефектът ако върнем ДДС 9% за ресторанти?"
+
+
+def batch(lines, *argv):
+    ns = cli.argparse.Namespace(ai=False, model=None, intensity=1.0, horizon=core.DEFAULT_HORIZON,
+                                no_sources=True)
+    for k, v in zip(argv[::2], argv[1::2]):
+        setattr(ns, k, v)
+    out = io.StringIO()
+    count = cli.run(io.StringIO("\n".join(lines) + "\n"), out, ns)
+    return count, [json.loads(l) for l in out.getvalue().splitlines()]
+
+
+@pytest.mark.parametrize("intensity, horizon", [(1.5, 10), (-0.1, 10), (0.5, 0), (0.5, core.PROJECTION_YEARS + 1)])
+def test_scenario_rejects_inputs_outside_the_cube(intensity, horizon):
+    with pytest.raises(ValueError):
+        core.scenario("VAT_REST_9", intensity, None, horizon)
+
+
+def test_bad_records_do_not_abort_the_batch():
+    lines = [
+        json.dumps({"id": 1, "question": VAT}),
+        "{not json",
+        json.dumps({"id": 3, "text": VAT}),
+        json.dumps({"id": 4, "question": VAT, "intensity": 1.5}),
+        json.dumps({"id": 5, "question": VAT, "horizon": 0}),
+        json.dumps({"id": 6, "question": VAT, "horizon": 50}),
+        json.dumps({"id": 7, "question": VAT, "horizon": core.PROJECTION_YEARS}),
+    ]
+    count, res = batch(lines)
+    assert count == len(lines)
+    assert "error" not in res[0] and res[0]["scenario"]["horizon"] == core.DEFAULT_HORIZON
+    assert res[1]["line"] == 2 and "id" not in res[1]
+    assert [r["id"] for r in res[2:6]] == [3, 4, 5, 6]
+    assert all("error" in r for r in res[1:6])
+    assert res[6]["scenario"]["horizon"] == core.PROJECTION_YEARS
+
+
+@pytest.mark.parametrize("flag, value", [("--intensity", "1.5"), ("--intensity", "x"), ("--horizon", "0"),
+                                         ("--horizon", "50")])
+def test_flags_are_range_checked(flag, value, capsys):
+    with pytest.raises(SystemExit) as e:
+        cli.main(["-", flag, value])
+    assert e.value.code == 2
+
+
+def test_async_batch_keeps_going(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    ns = cli.argparse.Namespace(ai=True, model=None, intensity=1.0, horizon=core.DEFAULT_HORIZON, no_sources=True,
+                                concurrency=4, rate=100.0, sections=False)
+    lines = [json.dumps({"id": 1, "question": VAT, "intensity": 2}), "[]", json.dumps({"id": 3, "question": VAT})]
+    out = io.StringIO()
+    assert cli.asyncio.run(cli.run_async(io.StringIO("\n".join(lines)), out, ns)) == 3
+    res = [json.loads(l) for l in out.getvalue().splitlines()]
+    assert res[0]["id"] == 1 and "error" in res[0]
+    assert res[1] == {"line": 2, "error": "ValueError: missing 'question'"}
+    assert res[2]["answer"] == core.AI_INACTIVE
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+import compensate
+import core
+from budget_engine import REV
+
+
+@pytest.fixture(scope="module")
+def model():
+    return core.budget_model(core.dataset().version)
+
+
+def test_solve_meets_the_gap_within_caps():
+    weight = np.array([[1.0, 2.0, 4.0], [1.0, 1.0, 1.0]])
+    cap = np.array([[0.5, 0.5, 0.5], [0.1, 0.2, 0.3]])
+    d = compensate.solve(np.array([0.6, 5.0]), weight, cap)
+    assert np.all(d >= 0) and np.all(d <= cap + 1e-12)
+    assert d[0].sum() == pytest.approx(0.6)
+    # KKT: levers below their cap share one marginal cost lam = w_j * d_j.
+    free = d[0] < cap[0] - 1e-9
+    assert np.ptp(weight[0][free] * d[0][free]) < 1e-9
+    np.testing.assert_allclose(d[1], cap[1])        # infeasible: everything at its cap
+
+
+def test_nothing_to_do_below_the_target(model):
+    plan = compensate.Compensator(model, target=1.0).plan("PENSIONS_10", 1.0)
+    assert plan.gap == 0 and plan.measures == () and plan.feasible
+
+
+@pytest.mark.parametrize("target", [0.03, -0.01, -0.03, -0.2])
+def test_plans_are_feasible_and_leave_the_policy_alone(model, target):
+    comp = compensate.Compensator(model, target=target)
+    for policy in model.policies:
+        plan = comp.plan(policy, 1.0)
+        own = {(op.side, op.category) for op in model.specs[policy].ops}
+        assert not own & {(s, c) for s, c, _ in plan.measures}, policy
+        rev, exp = model.categories(policy, 1.0)
+        after = exp.sum() - rev.sum() - sum(d if s == REV else -d for s, _, d in plan.measures)
+        if plan.feasible:
+            assert after <= target * model.gdp + 1e-3      # measures below 5e-4 are dropped from the plan
+        else:
+            assert plan.closed < plan.gap
+        for s, c, d in plan.measures:
+            share, _ = compensate.LEVERS[(s, c)]
+            base = dict(zip(model.rev_names, rev)) if s == REV else dict(zip(model.exp_names, exp))
+            assert abs(d) <= share * abs(base[c]) + 1e-9
+
+
+def test_grid_matches_single_plans(model):
+    comp = compensate.Compensator(model, target=-0.03)
+    xs = [0.0, 0.5, 1.0]
+    for plan in comp.grid(intensities=xs):
+        one = comp.plan(plan.policy, plan.intensity)
+        assert [(s, c) for s, c, _ in plan.measures] == [(s, c) for s, c, _ in one.measures]
+        assert plan.closed == pytest.approx(one.closed) and plan.feasible == one.feasible
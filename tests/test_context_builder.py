@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import context_builder as cb
+import core
+from context_builder import Block, count_tokens
+
+QUESTION = Block(9, "", (("Въпрос: колко струва мярката?", 1.0),), required=True)
+SOURCES = Block(0, "Източници:", (("- Министерство на финансите", 0.2), ("- НСИ", 0.9), ("- НАП", 0.0)))
+SCENARIO = Block(3, "Сценарий:", tuple((f"- ред {i}: " + "дълъг текст за бюджета " * 3, 1.0 - i / 10)
+                                       for i in range(8)))
+PASSAGES = Block(5, "Текстове:", (("- НСИ", 1.0), ("- чл. 66 ЗДДС", 0.5)))
+
+
+def lines(text):
+    return [line for line in text.splitlines() if line]
+
+
+def test_unlimited_budget_keeps_every_relevant_line_in_block_order():
+    packed = cb.pack([QUESTION, PASSAGES, SCENARIO, SOURCES])
+    got = lines(packed.text)
+    assert got[0] == "Източници:" and got[-1] == "Въпрос: колко струва мярката?"
+    assert got.index("Източници:") < got.index("Сценарий:") < got.index("Текстове:")
+    assert "- НАП" not in got                       # relevance 0 is never sent
+    assert got.count("- НСИ") == 1 and packed.duplicates == 1
+    assert packed.dropped == 0
+
+
+@pytest.mark.parametrize("budget", [40, 80, 120, 200])
+def test_budget_is_respected_and_relevance_decides(budget):
+    packed = cb.pack([QUESTION, SOURCES, SCENARIO, PASSAGES], budget)
+    assert packed.tokens <= budget
+    assert abs(count_tokens(packed.text) - packed.tokens) <= 6
+    got = lines(packed.text)
+    assert got[-1] == "Въпрос: колко струва мярката?"
+    kept = [i for i in range(8) if any(g.startswith(f"- ред {i}:") for g in got)]
+    assert kept == list(range(len(kept)))           # the most relevant scenario lines go first
+    # 11 candidates: 8 scenario lines, 2 sources, 1 passage (the repeated "- НСИ" is not one).
+    assert packed.dropped == 11 - sum(g.startswith("- ") for g in got)
+    assert packed.full_tokens >= packed.tokens
+
+
+def test_required_block_is_sent_even_over_budget():
+    packed = cb.pack([QUESTION, SOURCES], budget=1)
+    assert lines(packed.text) == ["Въпрос: колко струва мярката?"]
+    assert packed.dropped == 2
+
+
+@pytest.mark.parametrize("budget", [120, 250, 600])
+def test_build_context_fits_the_budget_with_the_question_last(budget):
+    q = "Какво става с дефицита, ако пенсиите се увеличат с 10%?"
+    packed = cb.pack(core.context_blocks(q), budget)
+    assert packed.tokens <= budget
+    assert core.build_context(q, budget=budget) == packed.text
+    assert packed.text.rstrip().endswith(f"Въпрос: {q}")
+    assert packed.text.startswith("Официални източници:")
+
+
+def test_same_intent_and_policy_share_the_prompt_prefix():
+    a = core.build_context("Какъв е ефектът ако върнем ДДС 9% за ресторанти?")
+    b = core.build_context("Ще се увеличи ли дефицитът при ДДС 9% за заведенията?")
+    assert a.rsplit("Въпрос:", 1)[0] == b.rsplit("Въпрос:", 1)[0]
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+import pytest
+
+import data_loader
+
+
+def write_budget(path, drop=None):
+    with open(data_loader.DEFAULT_PATH, encoding="utf-8") as f:
+        doc = json.load(f)
+    doc.pop("scenarios")
+    if drop:
+        doc["budget"]["revenues"] = [r for r in doc["budget"]["revenues"] if r["category"] != drop]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False)
+
+
+def test_missing_policy_category_keeps_the_old_version(tmp_path):
+    path = str(tmp_path / "budget.json")
+    write_budget(path)
+    loader = data_loader.DataLoader(path, check_interval=0.0, store_dir=str(tmp_path / "tables"))
+    good = loader.current().version
+
+    write_budget(path, drop="ДДС")
+    os.utime(path, ns=(0, 0))
+    assert loader.reload() is False
+    assert "ДДС" in loader.last_error
+    assert loader.current().version == good
+
+
+def test_missing_policy_category_on_first_load(tmp_path):
+    path = str(tmp_path / "budget.json")
+    write_budget(path, drop="ДДС")
+    with pytest.raises(data_loader.DataError, match="ДДС"):
+        data_loader.DataLoader(path, store_dir=str(tmp_path / "tables")).current()
+
+
+def test_failed_reload_waits_for_the_file_to_change(tmp_path, monkeypatch):
+    path = str(tmp_path / "budget.json")
+    write_budget(path)
+    loader = data_loader.DataLoader(path, check_interval=0.0, store_dir=str(tmp_path / "tables"))
+    good = loader.current().version
+    loads = []
+    real_load = loader._load
+    monkeypatch.setattr(loader, "_load", lambda stats: loads.append(1) or real_load(stats))
+
+    write_budget(path, drop="ДДС")
+    os.utime(path, ns=(0, 0))
+    assert loader.reload() is False
+    for _ in range(3):
+        assert loader.current().version == good
+    assert len(loads) == 1
+    assert "ДДС" in loader.last_error
+
+    write_budget(path)
+    os.utime(path, ns=(10**9, 10**9))
+    assert loader.reload() is False
+    assert len(loads) == 2
+    assert loader.last_error is None
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import os
+
+import legal_index
+
+ISSUES = (
+    "Чл. 1. Българско гражданство по натурализация може да придобие лице, навършило 18 години.\n"
+    "Чл. 2. Заявлението се подава в Министерството на правосъдието.",
+    "Чл. 3. Управителят на еднолично дружество с ограничена отговорност се вписва в търговския регистър.",
+)
+
+
+def build(tmp_path):
+    index = legal_index.LegalIndex(str(tmp_path / "index"), check_interval=0.0)
+    for i, text in enumerate(ISSUES):
+        path = tmp_path / f"dv-{i}.txt"
+        path.write_text(text, encoding="utf-8")
+        index.add([str(path)])
+    return index
+
+
+def test_compact_keeps_old_segments_for_readers(tmp_path):
+    index = build(tmp_path)
+    old = [s["name"] for s in index.manifest["segments"]]
+    assert len(old) == 2
+    merged = index.compact()
+
+    # A reader that read the manifest just before the swap still opens its segments.
+    for name in old:
+        assert len(legal_index.Segment(os.path.join(index.path, name))) > 0
+    assert [r["name"] for r in index.manifest["retired"]] == old
+    assert index.purge() == []
+
+    assert index.purge(grace=0.0) == old
+    assert not any(os.path.exists(os.path.join(index.path, name)) for name in old)
+    assert index.manifest["retired"] == []
+    reader = legal_index.LegalIndex(index.path)
+    reader.refresh()
+    assert [s.path for s in reader.segments] == [os.path.join(index.path, merged)]
+    assert reader.search("гражданство")[0].article.startswith("Чл. 1")
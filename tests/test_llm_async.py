@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import io
+import json
+import threading
+import time
+
+import pytest
+
+import cli
+import core
+import llm
+import metrics
+from ai_cache import MemoryCache
+from llm_async import SECTIONS, AsyncLLM, TokenBucket, merge_sections
+from stub_llm import StubServer
+
+
+def config(srv):
+    return llm.ClientConfig.from_lookup({"OPENAI_API_KEY": "sk-test", "OPENAI_BASE_URL": srv.base_url}.get)
+
+
+def test_token_bucket_bursts_then_keeps_the_rate():
+    async def go():
+        bucket = TokenBucket(rate=50.0, burst=3)
+        t0 = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        burst = time.monotonic() - t0
+        for _ in range(5):
+            await bucket.acquire()
+        return burst, time.monotonic() - t0
+
+    burst, total = asyncio.run(go())
+    assert burst < 0.02
+    assert 0.09 <= total < 0.3       # 5 more tokens at 50/s
+
+
+def test_merge_sections_numbers_and_strips_repeated_headings():
+    parts = [f"1) {SECTIONS[0]}: кратко", "анализ", None, f"  4) {SECTIONS[3]}\nриск", "провери"]
+    text = merge_sections(parts)
+    heads = [f"{i}) {name}" for i, name in enumerate(SECTIONS, 1)]
+    assert [line for line in text.splitlines() if line in heads] == heads
+    assert text.count(SECTIONS[0]) == 1 and text.count(SECTIONS[3]) == 1     # repeated headings dropped
+    assert f"{heads[0]}\nкратко" in text and f"{heads[3]}\nриск" in text and f"{heads[2]}\n\n\n{heads[3]}" in text
+
+
+def test_complete_caches_off_the_loop_and_coalesces():
+    threads = []
+
+    class Recording(MemoryCache):
+        def get(self, key):
+            threads.append(threading.current_thread())
+            return super().get(key)
+
+    async def go(srv):
+        async with AsyncLLM(config(srv), concurrency=8, rate=1000, burst=8, cache=Recording()) as ex:
+            answers = await asyncio.gather(*(ex.complete("система", "въпрос", "m") for _ in range(5)))
+            again = await ex.complete("система", "въпрос", "m")
+        return answers, again
+
+    with StubServer(latency=0.2) as srv:
+        answers, again = asyncio.run(go(srv))
+        assert srv.requests == 1
+    assert len(set(answers)) == 1 and answers[0] and again == answers[0]
+    assert threading.main_thread() not in threads
+
+
+def test_deadline_and_hedge():
+    async def slow():
+        await asyncio.sleep(1.0)
+        return "бавно"
+
+    async def go():
+        late = AsyncLLM(None, policy=llm.CallPolicy(deadline=0.1, hedge=False))
+        t0 = time.monotonic()
+        with pytest.raises(llm.DeadlineExceeded):
+            await late.hedged(slow)
+        took = time.monotonic() - t0
+
+        calls = []
+
+        async def attempt():
+            calls.append(1)
+            return await slow() if len(calls) == 1 else "хедж"
+
+        hedging = AsyncLLM(None, policy=llm.CallPolicy(deadline=2.0, hedge_after=0.05))
+        return took, await hedging.hedged(attempt)
+
+    metrics.REGISTRY.reset()
+    took, value = asyncio.run(go())
+    assert took < 0.5
+    assert value == "хедж"
+    assert metrics.REGISTRY.counter("ai_hedges_total") == 1 and metrics.REGISTRY.counter("ai_hedge_wins_total") == 1
+
+
+def test_cli_async_falls_back_at_the_deadline(monkeypatch):
+    vat = "Какъв е ефектът ако върнем ДДС 9% за ресторанти?"
+    with StubServer(latency=1.0) as srv:
+        for k, v in {"OPENAI_API_KEY": "sk-test", "OPENAI_BASE_URL": srv.base_url, "OPENAI_DEADLINE": "0.2",
+                     "OPENAI_HEDGE_AFTER": "off"}.items():
+            monkeypatch.setenv(k, v)
+        ns = cli.argparse.Namespace(ai=True, model="m", intensity=1.0, horizon=core.DEFAULT_HORIZON,
+                                    no_sources=True, concurrency=4, rate=100.0, sections=False)
+        out = io.StringIO()
+        assert asyncio.run(cli.run_async(io.StringIO(json.dumps({"question": vat}) + "\n"), out, ns)) == 1
+    res = json.loads(out.getvalue())
+    assert res["answer"] == core.fallback_answer(vat, 1.0, core.DEFAULT_HORIZON, False, "deadline")
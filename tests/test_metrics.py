@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import math
+import re
+
+import pytest
+
+import metrics
+
+SAMPLE = re.compile(r'^bggovai_[a-z_]+(\{[a-z_]+="(?:[^"\\]|\\.)*"(,[a-z_]+="(?:[^"\\]|\\.)*")*\})? \S+$')
+
+
+def parse(text):
+    """{(name, labels): value} from Prometheus text; every line must be a comment or a sample."""
+    out = {}
+    for line in text.splitlines():
+        if line.startswith("#"):
+            assert re.match(r"^# (HELP|TYPE) bggovai_\w+ ", line), line
+            continue
+        assert SAMPLE.match(line), line
+        head, value = line.rsplit(" ", 1)
+        name, _, labels = head.partition("{")
+        out[(name, labels.rstrip("}"))] = float(value)
+    return out
+
+
+def test_histogram_folds_pending_samples_on_read():
+    h = metrics.Histogram(buckets=(0.1, 1.0))
+    for x in (0.05, 0.1, 0.5, 1.0, 3.0):
+        h.observe(x)
+    assert h.count == 0 and len(h._pending) == 5          # observe() only appends
+    snap = h.snapshot()
+    assert snap["count"] == 5 and snap["sum"] == pytest.approx(4.65)
+    assert snap["buckets"] == [2, 2, 1]                   # le is inclusive; the last slot is +Inf
+    assert h.quantiles((0.0, 0.5, 1.0)) == {0.0: 0.05, 0.5: 0.5, 1.0: 3.0}
+    h.clear()
+    assert h.snapshot() == {"count": 0, "sum": 0.0, "buckets": [0, 0, 0]}
+    assert math.isnan(h.quantiles((0.5,))[0.5])
+
+
+def test_histogram_folds_every_fold_every_samples(monkeypatch):
+    monkeypatch.setattr(metrics.Histogram, "FOLD_EVERY", 10)
+    h = metrics.Histogram()
+    for _ in range(25):
+        h.observe(0.002)
+    assert h.count == 20 and len(h._pending) == 5
+    assert h.snapshot()["count"] == 25
+
+
+def test_recent_window_keeps_the_last_samples():
+    h = metrics.Histogram()
+    for i in range(metrics.RECENT + 100):
+        h.observe(float(i))
+    qs = h.quantiles((0.0, 1.0))
+    assert qs == {0.0: 100.0, 1.0: float(metrics.RECENT + 99)}
+    assert h.snapshot()["count"] == metrics.RECENT + 100
+
+
+def test_prometheus_text_format():
+    reg = metrics.Registry()
+    for x in (0.00002, 0.003, 0.003, 0.7, 120.0):
+        reg.observe("ai_call", x)
+    reg.observe("prompt", 0.0001)
+    reg.inc("ai_cache_total", result="hit")
+    reg.inc("ai_cache_total", 2, result="miss")
+    reg.inc("ai_errors_total", kind='bad "quote"\\n')
+    text = reg.prometheus()
+    samples = parse(text)
+
+    assert "# TYPE bggovai_stage_seconds histogram" in text
+    assert text.count("# TYPE bggovai_ai_cache_total counter") == 1
+    buckets = [(le, v) for (n, lb), v in samples.items()
+               if n == "bggovai_stage_seconds_bucket" and 'stage="ai_call"' in lb
+               for le in re.findall(r'le="([^"]+)"', lb)]
+    assert [le for le, _ in buckets][-1] == "+Inf" and len(buckets) == len(metrics.BUCKETS) + 1
+    counts = [v for _, v in buckets]
+    assert counts == sorted(counts)                       # cumulative
+    assert counts[-1] == samples[("bggovai_stage_seconds_count", 'stage="ai_call"')] == 5
+    assert dict(buckets)["0.005"] == 3 and dict(buckets)["60.0"] == 4
+    assert samples[("bggovai_stage_seconds_sum", 'stage="ai_call"')] == pytest.approx(120.70602)
+    assert samples[("bggovai_stage_recent_seconds", 'quantile="0.5",stage="ai_call"')] == pytest.approx(0.003)
+    assert samples[("bggovai_ai_cache_total", 'result="miss"')] == 2
+    assert samples[("bggovai_ai_errors_total", r'kind="bad \"quote\"\\n"')] == 1
+
+
+def test_stages_are_recorded_only_inside_a_trace():
+    h = metrics.REGISTRY.histogram("test_stage")
+    before = h.snapshot()["count"]
+    with metrics.stage("test_stage") as span:
+        assert span == {}
+    assert h.snapshot()["count"] == before
+
+    trace = metrics.begin("test_trace", who="pytest")
+    with metrics.stage("test_stage") as span:
+        span["cache"] = "hit"
+        with metrics.stage("test_inner"):
+            metrics.annotate(rows=3)
+    out = metrics.finish(trace)
+    assert metrics.current() is None
+    assert h.snapshot()["count"] == before + 1
+    assert out["event"] == "test_trace" and out["who"] == "pytest"
+    assert [(s["stage"], s["depth"]) for s in out["stages"]] == [("test_stage", 0), ("test_inner", 1)]
+    assert out["stages"][0]["cache"] == "hit" and out["stages"][1]["rows"] == 3
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+import core
+
+
+@pytest.mark.parametrize("policy", ["VAT_REST_9", "PENSIONS_10", "BASE"])
+@pytest.mark.parametrize("intensity", [0.0, 0.333, 0.4567, 0.995, 1.0])
+def test_paths_match_the_exact_projection_between_grid_points(policy, intensity):
+    version = core.dataset().version
+    model, macro = core.budget_model(version), core.dataset(version).macro
+    exact = model.project([policy], [intensity], core.PROJECTION_YEARS, macro.growth, macro.inflation)
+    s = core.scenario(policy, intensity, version, horizon=core.PROJECTION_YEARS)
+
+    np.testing.assert_allclose(s.debt_path, exact["debt_pct"][0, 0], rtol=1e-12)
+    np.testing.assert_allclose(s.deficit_path, exact["deficit_pct"][0, 0], rtol=1e-12)
+    assert s.debt == pytest.approx(exact["debt"][0, 0, 0], rel=1e-12)
+    assert s.debt_pct == pytest.approx(s.debt / model.gdp, rel=1e-12)
+    # Year 1 of the path is the year the categories describe.
+    assert s.deficit_path[0] == pytest.approx(s.def_pct, rel=1e-9)
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import core
+
+EPS = 1e-9
+
+
+@pytest.fixture(scope="module")
+def sens():
+    s = core.vat_sensitivity(core.dataset().version)
+    if s is None:
+        pytest.skip("no VAT scenario file")
+    return s
+
+
+@pytest.mark.parametrize("n", [2, 7, 50, 200])
+def test_axis_covers_an_unaligned_range(sens, n):
+    lo, hi = sens.span("passthrough")
+    step0 = sens.step("passthrough", 0)
+    lo, hi = lo + 0.37 * step0, hi - 12.61 * step0
+    axis = sens.axis("passthrough", lo, hi, n)
+    assert len(axis) >= n
+    assert axis[0] <= lo + EPS and axis[-1] >= hi - EPS
+    step = axis[1] - axis[0]
+    assert lo - axis[0] < step and axis[-1] - hi < step
+
+
+def test_grid_on_an_unaligned_range(sens):
+    lo, hi = sens.span("elasticity")
+    lo, hi = lo + 0.123, hi - 0.4567
+    grid = sens.grid({"elasticity": (lo, hi, 30), "share": (None, None, 20)})
+    assert grid.values.shape == tuple(len(a) for a in grid.axes)
+    assert grid.axes[0][0] <= lo + EPS and grid.axes[0][-1] >= hi - EPS and len(grid.axes[0]) >= 30
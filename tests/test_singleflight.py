@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import core
+import llm
+from ai_cache import cache_key
+from singleflight import FLIGHTS, Abandoned, Group
+from stub_llm import StubServer, reply_for
+
+N = 8
+
+
+def settings(srv):
+    return {"OPENAI_API_KEY": "sk-test", "OPENAI_BASE_URL": srv.base_url, "OPENAI_MAX_RETRIES": "0",
+            "OPENAI_HEDGE_AFTER": "off"}.get
+
+
+def fallback(why):
+    return f"ШАБЛОН {why}"
+
+
+@pytest.fixture
+def user():
+    return f"контекст {time.time_ns()}"
+
+
+def concurrently(fn, n=N):
+    start = threading.Barrier(n)
+
+    def run(_):
+        start.wait()
+        return fn()
+
+    with ThreadPoolExecutor(n) as pool:
+        return list(pool.map(run, range(n)))
+
+
+def wait_for(cond, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_one_leader_and_every_follower_gets_its_result():
+    group = Group()
+
+    def call():
+        flight, leader = group.join("k")
+        if leader:
+            wait_for(lambda: flight.followers == N - 1)
+            group.land("k", flight, "отговор")
+            return "leader"
+        return flight.wait(2.0)
+
+    outcomes = concurrently(call)
+    assert sorted(outcomes) == ["leader"] + ["отговор"] * (N - 1)
+    assert group.stats() == {"in_flight": 0, "leaders": 1, "coalesced": N - 1, "abandoned": 0}
+    assert group.join("k")[1]           # a landed flight is gone: the next caller leads again
+
+
+def test_leader_error_reaches_waiting_and_following_callers():
+    group = Group()
+    flight, _ = group.join("k")
+    error = RuntimeError("upstream 500")
+    got = []
+
+    def waiter():
+        try:
+            flight.wait(2.0)
+        except Exception as e:
+            got.append(e)
+
+    def follower():
+        deltas = []
+        try:
+            for delta in flight.follow(2.0):
+                deltas.append(delta)
+        except Exception as e:
+            got.append((deltas, e))
+
+    threads = [threading.Thread(target=waiter), threading.Thread(target=follower)]
+    for t in threads:
+        t.start()
+    flight.publish("Частичен ")
+    time.sleep(0.05)
+    group.land("k", flight, error=error)
+    for t in threads:
+        t.join(2.0)
+    assert error in got and (["Частичен "], error) in got
+
+
+def test_concurrent_calls_make_one_upstream_request(user):
+    with StubServer(latency=0.3) as srv:
+        answers = concurrently(lambda: core.ai_call(core.SYSTEM_PROMPT, user, "m", settings(srv), fallback))
+        assert srv.requests == 1
+    assert answers == [reply_for("m", llm.messages(core.SYSTEM_PROMPT, user)).strip()] * N
+    assert cache_key(core.SYSTEM_PROMPT, user, "m") not in FLIGHTS._flights
+
+
+def test_followers_share_the_leader_failure(user):
+    with StubServer(latency=0.3, fail_rate=1.0) as srv:
+        answers = concurrently(lambda: core.ai_call(core.SYSTEM_PROMPT, user, "m", settings(srv), fallback))
+        assert srv.requests == 1
+    assert answers == ["ШАБЛОН error"] * N
+    assert core.RESPONSES.get(cache_key(core.SYSTEM_PROMPT, user, "m")) is None
+
+
+def test_follower_takes_over_an_abandoned_stream(user):
+    key = cache_key(core.SYSTEM_PROMPT, user, "m")
+    abandoned = FLIGHTS.stats()["abandoned"]
+    with StubServer(latency=0.1, token_delay=0.01) as srv:
+        stream = core.ai_stream(core.SYSTEM_PROMPT, user, "m", settings(srv), fallback)
+        assert next(stream)
+        flight = FLIGHTS._flights[key]
+        with ThreadPoolExecutor(4) as pool:
+            calls = [pool.submit(core.ai_call, core.SYSTEM_PROMPT, user, "m", settings(srv), fallback)
+                     for _ in range(4)]
+            wait_for(lambda: flight.followers == 4)
+            stream.close()                  # the session went away mid-answer
+            answers = [c.result(5.0) for c in calls]
+        assert srv.requests == 2            # the stream, then one follower as the new leader
+    assert answers == [reply_for("m", llm.messages(core.SYSTEM_PROMPT, user)).strip()] * 4
+    assert flight.done and isinstance(flight.error, Abandoned)
+    assert FLIGHTS.stats()["abandoned"] == abandoned + 1
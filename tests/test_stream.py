@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+
+import core
+import llm
+import metrics
+from ai_cache import cache_key
+from singleflight import FLIGHTS
+from stub_llm import StubServer, reply_for
+
+
+def settings(srv):
+    return {"OPENAI_API_KEY": "sk-test", "OPENAI_BASE_URL": srv.base_url, "OPENAI_MAX_RETRIES": "0",
+            "OPENAI_HEDGE_AFTER": "off"}.get
+
+
+def fallback(why):
+    return f"ШАБЛОН {why}"
+
+
+@pytest.fixture
+def user():
+    return f"контекст {time.time_ns()}"
+
+
+def test_chunks_arrive_incrementally_and_the_answer_is_cached(user):
+    with StubServer(token_delay=0.005) as srv:
+        arrivals, deltas = [], []
+        for delta in core.ai_stream(core.SYSTEM_PROMPT, user, "m", settings(srv), fallback):
+            arrivals.append(time.perf_counter())
+            deltas.append(delta)
+        assert len(deltas) > 20
+        # One token every ~5 ms, not one block at the end.
+        assert arrivals[-1] - arrivals[0] > 0.1
+        assert "".join(deltas) == reply_for("m", llm.messages(core.SYSTEM_PROMPT, user))
+
+        again = list(core.ai_stream(core.SYSTEM_PROMPT, user, "m", settings(srv), fallback))
+        assert again == ["".join(deltas).strip()]
+        assert srv.requests == 1
+
+
+def test_closing_the_stream_stops_upstream_and_caches_nothing(user):
+    key = cache_key(core.SYSTEM_PROMPT, user, "m")
+    with StubServer(token_delay=0.02) as srv:
+        stream = core.ai_stream(core.SYSTEM_PROMPT, user, "m", settings(srv), fallback)
+        head = [next(stream) for _ in range(3)]
+        stream.close()
+        deadline = time.monotonic() + 2.0
+        while not srv.aborted and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert srv.aborted == 1
+        assert core.RESPONSES.get(key) is None
+        # The abandoned flight is gone: the next caller leads a fresh request.
+        flight, leader = FLIGHTS.join(key)
+        assert leader
+        FLIGHTS.land(key, flight, "")
+        assert all(head)
+
+
+def test_stream_failing_mid_way_falls_back_without_caching(monkeypatch, user):
+    real = llm.stream
+
+    def breaks_off(*args):
+        for i, delta in enumerate(real(*args)):
+            if i == 5:
+                raise ConnectionResetError("connection reset by peer")
+            yield delta
+
+    monkeypatch.setattr(llm, "stream", breaks_off)
+    before = metrics.REGISTRY.counter("ai_fallbacks_total", reason="error")
+    with StubServer(token_delay=0.01) as srv:
+        deltas = list(core.ai_stream(core.SYSTEM_PROMPT, user, "m", settings(srv), fallback))
+    assert len(deltas) == 6 and deltas[-1] == "\n\nШАБЛОН error"
+    assert reply_for("m", llm.messages(core.SYSTEM_PROMPT, user)).startswith("".join(deltas[:5]))
+    assert core.RESPONSES.get(cache_key(core.SYSTEM_PROMPT, user, "m")) is None
+    assert metrics.REGISTRY.counter("ai_fallbacks_total", reason="error") == before + 1
+
+
+def test_stream_failing_before_the_first_token_falls_back(user):
+    with StubServer(fail_rate=1.0) as srv:
+        deltas = list(core.ai_stream(core.SYSTEM_PROMPT, user, "m", settings(srv), fallback))
+        # The stream and then the blocking call both got HTTP 500.
+        assert srv.requests == 2
+    assert deltas == ["ШАБЛОН error"]
+    assert core.RESPONSES.get(cache_key(core.SYSTEM_PROMPT, user, "m")) is None
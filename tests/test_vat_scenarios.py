@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+import vat_scenarios as vs
+
+
+@pytest.fixture(scope="module")
+def module():
+    return vs.load_module()
+
+
+def test_revenue_impact_worked_example():
+    # 1000 BGN turnover, half of it in scope, 20% -> 9%, half passed through, elasticity -1, +2% compliance:
+    # net 416.67 -> 416.67 * 1.04583 * 0.95417 * 1.2 / 1.09 = 457.75; 0.09 * 457.75 * 1.02 - 0.2 * 416.67.
+    assert vs.revenue_impact(1000.0, 0.20, 0.09, 0.5, 0.5, -1.0, 0.02) == pytest.approx(-41.3117, abs=1e-4)
+
+
+@pytest.mark.parametrize("rate_old, rate_new", [(0.20, 0.09), (0.09, 0.20)])
+def test_revenue_impact_limits(rate_old, rate_new):
+    gross = 1000.0 * 0.4
+    net_old = gross / (1.0 + rate_old)
+    # No pass-through: shelf prices stay, so the base shrinks or grows with the rate.
+    no_pass = vs.revenue_impact(1000.0, rate_old, rate_new, 0.4, 0.0, -1.5, 0.0)
+    assert no_pass == pytest.approx(rate_new * gross / (1.0 + rate_new) - rate_old * net_old)
+    # Full pass-through with inelastic demand: the net base is unchanged.
+    full = vs.revenue_impact(1000.0, rate_old, rate_new, 0.4, 1.0, 0.0, 0.0)
+    assert full == pytest.approx((rate_new - rate_old) * net_old)
+    # Unchanged rate: only compliance moves revenue.
+    assert vs.revenue_impact(1000.0, rate_old, rate_old, 0.4, 0.7, -1.0, 0.0) == pytest.approx(0.0)
+    assert vs.revenue_impact(1000.0, rate_old, rate_old, 0.4, 0.7, -1.0, 0.05) == pytest.approx(
+        0.05 * rate_old * net_old)
+
+
+def test_revenue_impact_broadcasts():
+    share = np.array([0.3, 0.5])[:, None]
+    elasticity = np.array([-0.5, -1.0, -1.5])[None, :]
+    out = vs.revenue_impact(1000.0, 0.20, 0.09, share, 0.5, elasticity, 0.0)
+    assert out.shape == (2, 3)
+    for i in range(2):
+        for j in range(3):
+            assert out[i, j] == pytest.approx(
+                vs.revenue_impact(1000.0, 0.20, 0.09, float(share[i, 0]), 0.5, float(elasticity[0, j]), 0.0))
+
+
+def test_presets_are_in_billion_eur(module):
+    impacts = vs.preset_impacts(module)
+    for name, p in module.presets.items():
+        bgn = vs.revenue_impact(module.turnover_bgn, module.vat_from, module.vat_to, p["share"],
+                                p["passthrough"], p["elasticity"], p["compliance"])
+        assert impacts[name] == pytest.approx(bgn / vs.BGN_PER_EUR / 1e9)
+    back = vs.preset_impacts(module, reverse=True)
+    assert all(np.sign(back[k]) == -np.sign(impacts[k]) for k in impacts if impacts[k])
+
+
+def test_simulate_band_is_ordered_and_reproducible(module):
+    band = vs.simulate(module, n=20_000, chunk=3_000, seed=1)
+    assert band.n == 20_000
+    assert band.p5 <= band.p50 <= band.p95
+    lo, hi = min(vs.preset_impacts(module).values()), max(vs.preset_impacts(module).values())
+    assert lo - 1e-6 <= band.p5 and band.p95 <= hi + 1e-6
+    again = vs.simulate(module, n=20_000, chunk=3_000, seed=1)
+    assert (again.p5, again.p50, again.p95) == (band.p5, band.p50, band.p95)
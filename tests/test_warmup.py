@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import core
+import warmup
+
+SETTINGS = {"OPENAI_API_KEY": "sk-test", "OPENAI_BASE_URL": "http://127.0.0.1:9/v1"}
+
+
+def keyed(name, default=None):
+    return SETTINGS.get(name, default)
+
+
+@pytest.mark.parametrize("value, mode", [("", "data"), ("bogus", "data"), ("data", "data"), ("ALL", "all"),
+                                         ("off", "off"), ("0", "off")])
+def test_mode_from_env(monkeypatch, value, mode):
+    monkeypatch.setenv("BGGOVAI_WARMUP", value)
+    assert warmup.mode_from_env() == mode
+
+
+def test_ai_answers_are_opt_in():
+    version = core.dataset().version
+    assert warmup.Warmer().mode == "data"
+    kinds = {kind for kind, _ in warmup.Warmer(lookup=keyed).tasks(version)}
+    assert "ai" not in kinds and {"scenario", "compensation"} <= kinds
+    assert "ai" in {kind for kind, _ in warmup.Warmer(mode="all", lookup=keyed).tasks(version)}
+    assert warmup.Warmer(mode="off").ensure(version) is False
+
+
+def test_one_pass_per_version():
+    version = core.dataset().version
+    w = warmup.Warmer(intensities=(0.0, 1.0), workers=2)
+    assert w.ensure(version) is True
+    assert w.ensure(version) is False
+    assert w.wait(30)
+    assert w.runs == 1 and w.last["version"] == version and w.last["failed"] == 0
+    assert w.last["done"] == w.last["tasks"] > 0
+
+
+def test_pass_for_an_old_version_skips_its_tasks():
+    version = core.dataset().version
+    w = warmup.Warmer(intensities=(0.0, 1.0))
+    w.version = "newer"
+    last = w.run(version)
+    assert last["skipped"] == last["tasks"] > 0 and last["done"] == 0
+
+
+def test_stop_ends_the_watcher_and_further_passes():
+    w = warmup.Warmer(intensities=(0.5,)).watch(interval=0.01)
+    assert w.wait(30)
+    assert w.stop(timeout=5)
+    assert not w._watcher.is_alive()
+    assert w.ensure("another-version") is False
+    last = w.run(core.dataset().version)
+    assert last["skipped"] == last["tasks"]
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""Monte Carlo scenario model for the VAT restaurants/catering module (data.json).
+
+Sector I turnover x restaurant share is the gross (VAT-inclusive) base. A rate
+change moves consumer prices by `passthrough` of the tax wedge, demand reacts
+with `elasticity` and collection on the new rate scales with `compliance`.
+Parameters are drawn from triangular distributions spanning the
+Optimistic/Pessimistic presets with the Base preset as mode.
+"""
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+BGN_PER_EUR = 1.95583
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data.json")
+PARAMS = ("share", "passthrough", "elasticity", "compliance")
+
+
+@dataclass(frozen=True)
+class ParamRange:
+    low: float
+    mode: float
+    high: float
+
+
+@dataclass(frozen=True)
+class VatModule:
+    vat_from: float
+    vat_to: float
+    turnover_bgn: float
+    employment: int
+    presets: Dict[str, Dict[str, float]]
+    ranges: Dict[str, ParamRange]
+
+
+@dataclass(frozen=True)
+class ScenarioBand:
+    p5: float        # млрд. €
+    p50: float
+    p95: float
+    mean: float
+    n: int
+    seconds: float
+
+    def scaled(self, k: float) -> "ScenarioBand":
+        return ScenarioBand(self.p5 * k, self.p50 * k, self.p95 * k, self.mean * k, self.n, self.seconds)
+
+
+def load_module(path: str = DATA_PATH) -> VatModule:
+    with open(path, encoding="utf-8") as f:
+        return module_from_dict(json.load(f))
+
+
+def module_from_dict(data: dict) -> VatModule:
+    d = data["inputs_defaults"]
+    presets = data["scenario_presets"]
+    base = presets.get("Base") or {
+        "share": d["share_restaurants_in_sector_I"],
+        "passthrough": d["passthrough"],
+        "elasticity": d["price_elasticity"],
+        "compliance": d["compliance_change"],
+    }
+    ranges = {}
+    for p in PARAMS:
+        vals = [v[p] for v in presets.values()]
+        ranges[p] = ParamRange(min(vals), base[p], max(vals))
+    return VatModule(
+        vat_from=d["vat_from"],
+        vat_to=d["vat_to"],
+        turnover_bgn=float(data["real_data"]["turnover_sector_I_bgn"]),
+        employment=int(data["real_data"]["employment_sector_I"]),
+        presets=presets,
+        ranges=ranges,
+    )
+
+
+def revenue_impact(turnover, rate_old, rate_new, share, passthrough, elasticity, compliance):
+    """Change in collected VAT (BGN); all parameters broadcast as NumPy arrays."""
+    gross = turnover * share
+    net_old = gross / (1.0 + rate_old)
+    wedge = (1.0 + rate_new) / (1.0 + rate_old) - 1.0
+    price = passthrough * wedge
+    quantity = elasticity * price
+    net_new = net_old * (1.0 + quantity) * (1.0 + price) * (1.0 + rate_old) / (1.0 + rate_new)
+    return rate_new * net_new * (1.0 + compliance) - rate_old * net_old
+
+
+def _rates(module: VatModule, reverse: bool) -> Tuple[float, float]:
+    # data.json describes the move vat_from -> vat_to; reverse=True models going back.
+    return (module.vat_to, module.vat_from) if reverse else (module.vat_from, module.vat_to)
+
+
+def preset_impacts(module: VatModule, reverse: bool = False) -> Dict[str, float]:
+    rate_old, rate_new = _rates(module, reverse)
+    return {
+        name: float(revenue_impact(module.turnover_bgn, rate_old, rate_new, p["share"], p["passthrough"],
+                                   p["elasticity"], p["compliance"])) / BGN_PER_EUR / 1e9
+        for name, p in module.presets.items()
+    }
+
+
+def simulate(module: VatModule, n: int = 1_000_000, chunk: int = 1 << 18, seed: Optional[int] = 0,
+             reverse: bool = False) -> ScenarioBand:
+    """Draw `n` parameter samples in chunks of `chunk`; peak memory is O(n) float32 outputs plus O(chunk)."""
+    t0 = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    rate_old, rate_new = _rates(module, reverse)
+    out = np.empty(n, dtype=np.float32)
+    scale = 1.0 / BGN_PER_EUR / 1e9
+    for start in range(0, n, chunk):
+        m = min(chunk, n - start)
+        draws = {}
+        for p in PARAMS:
+            r = module.ranges[p]
+            draws[p] = rng.triangular(r.low, r.mode, r.high, m) if r.high > r.low else np.full(m, r.mode)
+        out[start:start + m] = revenue_impact(module.turnover_bgn, rate_old, rate_new, **draws) * scale
+    p5, p50, p95 = np.quantile(out, [0.05, 0.5, 0.95])
+    return ScenarioBand(float(p5), float(p50), float(p95), float(out.mean(dtype=np.float64)), n,
+                        time.perf_counter() - t0)
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""Background cache warm-up for the validated demo topics.
+
+    python warmup.py [--mode data|all] [--workers 4]     # one pass, e.g. to fill the shared SQLite cache
+    BGGOVAI_WARMUP=data|all|off                          # app.py: at process start and per data version
+
+app.py and streamlit_app.py advertise a fixed set of validated topics (ДДС 9%
+ресторанти, смяна на МОЛ на ЕООД, закон за гражданството, дефицит/дълг/AIC).
+Without a warm-up, the first user to ask one of them pays for every cold
+cache on the way, including the upstream AI latency. For every data version
+the Warmer fills, in a bounded pool of worker threads:
+
+- the per-version tables: budget model, projection cube, compensator;
+- scenario and compensation results for each FISCAL question x the
+  intensity slider's steps (0..100% by 5) at the default horizon;
+- the data.json presets: the Monte Carlo band between the
+  Optimistic/Pessimistic presets (around Base) and the sensitivity grid of
+  the default heatmap view. Both are per version, and the UI only scales
+  them by intensity;
+- the AI answer to each CANONICAL question (mode "all" only, opt-in: it
+  costs paid completions on every start and data version), through
+  core.ai_call. A user asking while that call is still upstream joins it
+  (singleflight.py) instead of sending a second request. Failed calls are
+  counted, never cached.
+
+The default mode is "data", also for an unknown BGGOVAI_WARMUP value.
+stop() ends the watcher and skips the tasks a pass has not started.
+
+A warmed AI answer lives as long as any other cache entry (BGGOVAI_CACHE_TTL).
+Only the exact canonical wording hits it (whitespace and case are
+normalised). The deterministic results serve every phrasing of the same
+policy. A pass for a version that is no longer current skips what it has not
+started yet.
+"""
+import argparse
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import core
+import data_loader
+import metrics
+from router import route
+
+log = logging.getLogger("bggovai.warmup")
+
+# The validated topics, as streamlit_app.py suggests them (placeholder and hint texts).
+CANONICAL = (
+    "Какъв е ефектът ако върнем ДДС 9% за ресторанти?",
+    "Как се сменя МОЛ на ЕООД?",
+    "ДДС 9% ресторанти",
+    "смяна на МОЛ на ЕООД",
+    "закон за гражданството",
+    "дефицит/дълг/AIC",
+)
+INTENSITIES = tuple(p / 100.0 for p in range(0, 101, 5))    # app.py slider: 0..100 step 5, divided by 100
+# Default heatmap of app.render_sensitivity: param -> points (x, y at their padded preset span; z at 50).
+SENSITIVITY_VIEW = (("passthrough", 200), ("elasticity", 200), ("share", 50))
+WORKERS = 4
+WATCH_INTERVAL = 5.0        # seconds between data version checks
+MODES = ("data", "all", "off")
+DEFAULT_MODE = "data"       # AI answers are opt-in (BGGOVAI_WARMUP=all)
+
+
+def mode_from_env() -> str:
+    mode = os.getenv("BGGOVAI_WARMUP", "").strip().lower()
+    if mode in ("0", "false", "no"):
+        return "off"
+    if mode and mode not in MODES:
+        log.warning("BGGOVAI_WARMUP=%r is not one of %s; using %r", mode, "|".join(MODES), DEFAULT_MODE)
+    return mode if mode in MODES else DEFAULT_MODE
+
+
+def workers_from_env() -> int:
+    try:
+        return max(1, int(os.getenv("BGGOVAI_WARMUP_WORKERS", "") or WORKERS))
+    except ValueError:
+        return WORKERS
+
+
+Task = Tuple[str, Callable[[], Optional[bool]]]     # (kind, fn); fn returns False for a failed AI call
+
+
+def _sensitivity_grid(version: str) -> None:
+    sens = core.vat_sensitivity(version)
+    if sens is not None:
+        sens.grid({p: (*sens.span(p), n) if i < 2 else (None, None, n) for i, (p, n) in enumerate(SENSITIVITY_VIEW)})
+
+
+def _ai_answer(q: str, model: str, lookup: core.Lookup) -> bool:
+    answer = core.ai_call(core.SYSTEM_PROMPT, core.build_context(q), model, lookup)
+    return not answer.startswith("❌")
+
+
+class Warmer:
+    def __init__(self, questions: Iterable[str] = CANONICAL, intensities: Iterable[float] = INTENSITIES,
+                 workers: int = WORKERS, mode: str = DEFAULT_MODE, lookup: core.Lookup = core.env_setting):
+        self.questions = tuple(questions)
+        self.intensities = tuple(intensities)
+        self.workers = workers
+        self.mode = mode
+        self.lookup = lookup
+        self.version: Optional[str] = None      # latest version asked for; a pass for another one winds down
+        self.runs = 0
+        self.last: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    # ---- tasks ----
+    def tasks(self, version: str) -> List[Task]:
+        """Everything to warm for `version`: AI calls first (they wait on upstream), then local results."""
+        out: List[Task] = []
+        if self.mode == "all" and core.get_openai_client(self.lookup) is not None:
+            model = self.lookup("OPENAI_MODEL") or core.DEFAULT_MODEL
+            out += [("ai", lambda q=q: _ai_answer(q, model, self.lookup)) for q in self.questions]
+        policies = dict.fromkeys(route(q).policy for q in self.questions if route(q).intent == "FISCAL")
+        for policy in policies:
+            for x in self.intensities:
+                out.append(("scenario", lambda p=policy, x=x: core.scenario(p, x, version, core.DEFAULT_HORIZON)))
+                out.append(("compensation", lambda p=policy, x=x: core.compensation(p, x, version)))
+        if "VAT_REST_9" in policies:
+            out.append(("presets", lambda: core.vat_band(version)))
+            out.append(("presets", lambda: _sensitivity_grid(version)))
+        return out
+
+    # ---- running ----
+    def ensure(self, version: Optional[str] = None) -> bool:
+        """Start a background pass for `version` (default: current) unless it is already warm or warming."""
+        if self.mode == "off" or self._stop.is_set():
+            return False
+        version = version or core.dataset().version
+        with self._lock:
+            if version == self.version:
+                return False
+            self.version = version
+            self._idle.clear()
+        threading.Thread(target=self.run, args=(version,), name="bggovai-warmup", daemon=True).start()
+        return True
+
+    def run(self, version: str) -> Dict[str, object]:
+        """One pass, blocking: per-version tables inline, then the tasks on `workers` threads."""
+        t0 = time.perf_counter()
+        counts = {"done": 0, "failed": 0, "skipped": 0, "ai": 0}
+        try:
+            # Every scenario below reads these; build them once before fanning out.
+            core.projection(version)
+            core.compensator(version)
+            tasks = self.tasks(version)
+        except Exception as e:
+            log.warning("warm-up of data version %s failed: %s", version, e)
+            tasks = []
+            counts["failed"] += 1
+        jobs: "queue.SimpleQueue[Task]" = queue.SimpleQueue()
+        for task in tasks:
+            jobs.put(task)
+        lock = threading.Lock()
+
+        def worker() -> None:
+            while True:
+                try:
+                    kind, fn = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                if self.version not in (None, version) or self._stop.is_set():
+                    result = "skipped"
+                else:
+                    trace = metrics.begin("warmup", kind=kind, data=version)
+                    try:
+                        result = "failed" if fn() is False else "done"
+                    except Exception as e:
+                        log.warning("warm-up %s task failed: %s", kind, e)
+                        result = "failed"
+                    trace.attrs["result"] = result
+                    metrics.finish(trace)
+                metrics.REGISTRY.inc("warmup_tasks_total", kind=kind, result=result)
+                with lock:
+                    counts[result] += 1
+                    if kind == "ai" and result == "done":
+                        counts["ai"] += 1
+
+        threads = [threading.Thread(target=worker, name=f"bggovai-warmup-{i}", daemon=True)
+                   for i in range(min(self.workers, len(tasks)))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        last = {"version": version, "tasks": len(tasks), **counts, "seconds": time.perf_counter() - t0}
+        with self._lock:
+            self.runs += 1
+            self.last = last
+            if self.version == version:
+                self._idle.set()
+        log.info("warm-up of data version %s: %d/%d tasks, %d AI answers, %.2f s", version, counts["done"],
+                 len(tasks), counts["ai"], last["seconds"])
+        return last
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """True once the pass for the latest version has finished."""
+        return self._idle.wait(timeout)
+
+    def watch(self, interval: float = WATCH_INTERVAL) -> "Warmer":
+        """Warm now, then again whenever the data version changes (one daemon thread per Warmer)."""
+        if self.mode == "off" or self._watcher is not None:
+            return self
+
+        def loop() -> None:
+            while not self._stop.is_set():
+                try:
+                    self.ensure(data_loader.current().version)
+                except data_loader.DataError as e:
+                    log.warning("warm-up: no data to warm: %s", e)
+                self._stop.wait(interval)
+
+        self._watcher = threading.Thread(target=loop, name="bggovai-warmup-watch", daemon=True)
+        self._watcher.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> bool:
+        """Stop watching and skip what a running pass has not started; True once everything has wound down."""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout)
+        return self._idle.wait(timeout) and not (self._watcher is not None and self._watcher.is_alive())
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {"mode": self.mode, "version": self.version, "running": not self._idle.is_set(),
+                    "runs": self.runs, **self.last}
+
+
+def start(lookup: core.Lookup = core.env_setting) -> Warmer:
+    """The process-wide warmer (BGGOVAI_WARMUP / BGGOVAI_WARMUP_WORKERS), watching the data version."""
+    return Warmer(workers=workers_from_env(), mode=mode_from_env(), lookup=lookup).watch()
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--mode", choices=MODES[:2], default=DEFAULT_MODE, help="all: also the AI answers (paid calls)")
+    ap.add_argument("--workers", type=int, default=workers_from_env())
+    args = ap.parse_args(argv)
+    warmer = Warmer(workers=args.workers, mode=args.mode)
+    last = warmer.run(core.dataset().version)
+    print(f"data {last['version']}: {last['done']}/{last['tasks']} tasks, {last['ai']} AI answers, "
+          f"{last['failed']} failed, {last['seconds']:.2f} s")
+    return 1 if last["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())